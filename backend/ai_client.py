@@ -0,0 +1,280 @@
+"""Async client for the OpenAI-compatible chat completions API.
+
+One httpx.AsyncClient is shared by every request so connections to the
+provider are kept alive and reused instead of re-negotiating TLS per chat.
+Point OPENAI_BASE_URL at another server (e.g. benchmarks/ai_stub.py) to use a
+different provider or a local stub.
+
+Replies are cached for AI_CACHE_TTL_SECONDS, and identical prompts that arrive
+while the first is still being answered share its upstream call.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import time
+from typing import AsyncIterator
+
+import httpx
+
+from cache import LRUCache
+from instrumentation import ai_upstream_errors, ai_upstream_seconds
+
+BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1").rstrip("/")
+MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+TIMEOUT_SECONDS = float(os.getenv("AI_TIMEOUT_SECONDS", "60"))
+MAX_CONNECTIONS = int(os.getenv("AI_MAX_CONNECTIONS", "20"))
+# Replies remembered per prompt; 0 disables the cache (in-flight calls are still shared).
+CACHE_SIZE = int(os.getenv("AI_CACHE_SIZE", "512"))
+CACHE_TTL_SECONDS = float(os.getenv("AI_CACHE_TTL_SECONDS", "3600"))
+MAX_TOKENS = 500
+
+
+class AiError(Exception):
+    pass
+
+
+_client: httpx.AsyncClient | None = None
+
+
+def get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            base_url=BASE_URL,
+            timeout=httpx.Timeout(TIMEOUT_SECONDS, connect=10.0),
+            limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS),
+        )
+    return _client
+
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def _request(messages: list[dict], stream: bool) -> dict:
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise AiError("OpenAI API key not configured")
+    return {
+        "url": "/chat/completions",
+        "headers": {"Authorization": f"Bearer {api_key}"},
+        "json": {"model": MODEL, "messages": messages, "max_tokens": MAX_TOKENS, "stream": stream},
+    }
+
+
+def _error_message(response: httpx.Response, body: bytes) -> str:
+    try:
+        return json.loads(body)["error"]["message"]
+    except Exception:
+        return f"AI provider returned HTTP {response.status_code}"
+
+
+async def chat_completion(messages: list[dict]) -> str:
+    """The assistant's reply to ``messages``; raises AiError on failure."""
+    start = time.perf_counter()
+    try:
+        response = await get_client().post(**_request(messages, stream=False))
+        if response.status_code != 200:
+            raise AiError(_error_message(response, response.content))
+        reply = response.json()["choices"][0]["message"].get("content", "") or ""
+    except (AiError, httpx.HTTPError):
+        ai_upstream_errors.inc(mode="chat")
+        raise
+    ai_upstream_seconds.observe(time.perf_counter() - start, mode="chat", phase="total")
+    return reply
+
+
+async def stream_chat_completion(messages: list[dict]) -> AsyncIterator[str]:
+    """Yield the reply to ``messages`` piece by piece as the provider sends it.
+
+    Closing the generator (e.g. because the browser went away) closes the
+    upstream response, which stops generation on the provider's side.
+    """
+    start = time.perf_counter()
+    first = True
+    try:
+        async with get_client().stream("POST", **_request(messages, stream=True)) as response:
+            if response.status_code != 200:
+                raise AiError(_error_message(response, await response.aread()))
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                choices = json.loads(data).get("choices") or [{}]
+                content = choices[0].get("delta", {}).get("content")
+                if content:
+                    if first:
+                        first = False
+                        ai_upstream_seconds.observe(time.perf_counter() - start, mode="stream", phase="first_token")
+                    yield content
+    except (AiError, httpx.HTTPError):
+        ai_upstream_errors.inc(mode="stream")
+        raise
+    ai_upstream_seconds.observe(time.perf_counter() - start, mode="stream", phase="total")
+
+
+response_cache = LRUCache(CACHE_SIZE, ttl=CACHE_TTL_SECONDS) if CACHE_SIZE > 0 else None
+_in_flight: dict[str, "_SharedCall"] = {}
+_counters = {"upstream_calls": 0, "upstream_seconds": 0.0, "coalesced": 0, "cache_hits": 0}
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def chat_cache_key(task_title: str, task_description: str, code: str | None, messages: list[dict]) -> str:
+    """Cache key for a chat: the task, a hash of the editor contents and the
+    conversation with case and whitespace differences ignored."""
+    code_hash = hashlib.sha256((code or "").encode()).hexdigest()
+    conversation = "\n".join(f"{m['role']}:{_normalize(m['content'])}" for m in messages)
+    parts = [MODEL, task_title, task_description, code_hash, conversation]
+    return hashlib.sha256("\0".join(parts).encode()).hexdigest()
+
+
+class _SharedCall:
+    def __init__(self, task: asyncio.Task | None = None, pieces: list[str] | None = None):
+        self.task = task
+        self.waiters = 0
+        # For a streamed reply, the pieces received so far; ``progress`` is set
+        # (and replaced) whenever one arrives or the stream ends.
+        self.pieces = pieces
+        self.progress = asyncio.Event()
+
+
+def _cached_reply(key: str) -> str | None:
+    if response_cache is None:
+        return None
+    reply = response_cache.get(key)
+    if reply is not None:
+        _counters["cache_hits"] += 1
+    return reply
+
+
+def _remember(key: str, reply: str, elapsed: float):
+    _counters["upstream_calls"] += 1
+    _counters["upstream_seconds"] += elapsed
+    if response_cache is not None:
+        response_cache.set(key, reply)
+
+
+async def _timed_completion(key: str, messages: list[dict]) -> str:
+    start = time.perf_counter()
+    reply = await chat_completion(messages)
+    _remember(key, reply, time.perf_counter() - start)
+    return reply
+
+
+async def _timed_stream(key: str, messages: list[dict], call: _SharedCall) -> str:
+    start = time.perf_counter()
+    try:
+        async for piece in stream_chat_completion(messages):
+            call.pieces.append(piece)
+            call.progress.set()
+            call.progress = asyncio.Event()
+    finally:
+        call.progress.set()
+    reply = "".join(call.pieces)
+    _remember(key, reply, time.perf_counter() - start)
+    return reply
+
+
+def _start_stream(key: str, messages: list[dict]) -> _SharedCall:
+    call = _SharedCall(pieces=[])
+    call.task = asyncio.ensure_future(_timed_stream(key, messages, call))
+    return call
+
+
+def _join(key: str, start) -> _SharedCall:
+    """The in-flight call for ``key``, or a new one from ``start()``."""
+    call = _in_flight.get(key)
+    if call is None:
+        call = start()
+        _in_flight[key] = call
+
+        def finished(_):
+            if _in_flight.get(key) is call:
+                del _in_flight[key]
+
+        call.task.add_done_callback(finished)
+    else:
+        _counters["coalesced"] += 1
+    call.waiters += 1
+    return call
+
+
+def _leave(call: _SharedCall):
+    call.waiters -= 1
+    # The last caller to give up cancels the upstream request.
+    if call.waiters == 0 and not call.task.done():
+        call.task.cancel()
+
+
+async def _shared_completion(key: str, messages: list[dict]) -> str:
+    call = _join(key, lambda: _SharedCall(asyncio.ensure_future(_timed_completion(key, messages))))
+    try:
+        return await asyncio.shield(call.task)
+    finally:
+        _leave(call)
+
+
+async def cached_chat_completion(key: str, messages: list[dict]) -> str:
+    """chat_completion through the reply cache, sharing in-flight calls."""
+    reply = _cached_reply(key)
+    if reply is not None:
+        return reply
+    return await _shared_completion(key, messages)
+
+
+async def cached_stream_chat_completion(key: str, messages: list[dict]) -> AsyncIterator[str]:
+    """stream_chat_completion through the reply cache, sharing in-flight calls.
+
+    A cached reply comes back as a single piece. Identical prompts streamed at
+    the same time share one upstream stream: later callers are sent the pieces
+    received so far, then each new one as it arrives. A prompt already being
+    answered without streaming is sent whole once that reply is in.
+    """
+    reply = _cached_reply(key)
+    if reply is not None:
+        if reply:
+            yield reply
+        return
+    call = _join(key, lambda: _start_stream(key, messages))
+    try:
+        if call.pieces is None:
+            reply = await asyncio.shield(call.task)
+            if reply:
+                yield reply
+            return
+        sent = 0
+        while True:
+            progress = call.progress
+            while sent < len(call.pieces):
+                yield call.pieces[sent]
+                sent += 1
+            if call.task.done():
+                break
+            await progress.wait()
+        # Raises the upstream error, if the stream ended with one.
+        call.task.result()
+    finally:
+        _leave(call)
+
+
+def cache_stats() -> dict:
+    calls = _counters["upstream_calls"]
+    average = _counters["upstream_seconds"] / calls if calls else 0.0
+    return {
+        "enabled": response_cache is not None,
+        **(response_cache.stats() if response_cache is not None else {}),
+        "upstream_calls": calls,
+        "coalesced": _counters["coalesced"],
+        "average_upstream_seconds": average,
+        # Each cache hit would otherwise have waited about one average call.
+        "estimated_seconds_saved": _counters["cache_hits"] * average,
+    }
@@ -1,17 +1,148 @@
+import asyncio
+import base64
 import hashlib
+import hmac
+import json
+import multiprocessing
+import os
 import secrets
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any
+
+HASH_SCHEME = "pbkdf2_sha256"
+# Raising this upgrades stored hashes as users log in (see needs_rehash).
+HASH_ITERATIONS = int(os.getenv("AUTH_HASH_ITERATIONS", "100000"))
+# Processes that run password hashing; 0 hashes on a thread of the event loop's executor.
+HASH_WORKERS = int(os.getenv("AUTH_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Where a generated secret is kept when SESSION_SECRET isn't set, so tokens
+# outlive a restart and every process on the machine signs them the same way.
+SESSION_SECRET_FILE = os.getenv("SESSION_SECRET_FILE", "./.session_secret")
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", str(12 * 3600)))
+
+
+def _load_session_secret(path: str = SESSION_SECRET_FILE) -> str:
+    """The secret stored at ``path``, generating it on first use.
+
+    The new secret is written to a private file and linked into place, so
+    processes starting together all end up with whichever was linked first.
+    """
+    if not os.path.exists(path):
+        fd, tmp = tempfile.mkstemp(prefix=".session_secret-", dir=os.path.dirname(os.path.abspath(path)))
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(secrets.token_hex(32))
+            try:
+                os.link(tmp, path)
+            except FileExistsError:
+                pass
+        finally:
+            os.unlink(tmp)
+    with open(path) as f:
+        secret = f.read().strip()
+    if not secret:
+        raise RuntimeError(f"{path} is empty; delete it or set SESSION_SECRET")
+    return secret
+
+
+SESSION_SECRET = os.getenv("SESSION_SECRET") or _load_session_secret()
+
+# Hashes written before the scheme was versioned: "salt:hash", 100,000 iterations.
+LEGACY_ITERATIONS = 100000
+
+
+def _pbkdf2(password: str, salt: str, iterations: int) -> str:
+    return hashlib.pbkdf2_hmac('sha256', password.encode(), salt.encode(), iterations).hex()
 
 
 def hash_password(password: str) -> str:
     salt = secrets.token_hex(16)
-    hash_obj = hashlib.pbkdf2_hmac('sha256', password.encode(), salt.encode(), 100000)
-    return f"{salt}:{hash_obj.hex()}"
+    return f"{HASH_SCHEME}${HASH_ITERATIONS}${salt}${_pbkdf2(password, salt, HASH_ITERATIONS)}"
 
 
 def verify_password(plain: str, hashed: str) -> bool:
     try:
-        salt, stored_hash = hashed.split(':')
-        hash_obj = hashlib.pbkdf2_hmac('sha256', plain.encode(), salt.encode(), 100000)
-        return hash_obj.hex() == stored_hash
-    except:
+        if hashed.startswith(HASH_SCHEME + "$"):
+            _, iterations, salt, stored_hash = hashed.split('$')
+            iterations = int(iterations)
+        else:
+            salt, stored_hash = hashed.split(':')
+            iterations = LEGACY_ITERATIONS
+        return hmac.compare_digest(_pbkdf2(plain, salt, iterations), stored_hash)
+    except Exception:
         return False
+
+
+def needs_rehash(hashed: str) -> bool:
+    """True if ``hashed`` predates the current scheme or iteration count."""
+    return not hashed.startswith(f"{HASH_SCHEME}${HASH_ITERATIONS}$")
+
+
+_hash_pool: ProcessPoolExecutor | None = None
+_hash_pool_lock = threading.Lock()
+
+
+def get_hash_pool() -> ProcessPoolExecutor | None:
+    global _hash_pool
+    if HASH_WORKERS <= 0:
+        return None
+    with _hash_pool_lock:
+        if _hash_pool is None:
+            # spawn, not fork: the API process has threads of its own by now.
+            _hash_pool = ProcessPoolExecutor(HASH_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _hash_pool
+
+
+def shutdown_hash_pool():
+    global _hash_pool
+    with _hash_pool_lock:
+        if _hash_pool is not None:
+            _hash_pool.shutdown(cancel_futures=True)
+            _hash_pool = None
+
+
+async def hash_password_async(password: str) -> str:
+    """hash_password off the event loop, on the hashing process pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_hash_pool(), hash_password, password)
+
+
+async def verify_password_async(plain: str, hashed: str) -> bool:
+    """verify_password off the event loop, on the hashing process pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_hash_pool(), verify_password, plain, hashed)
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _sign(payload: str) -> str:
+    return _b64encode(hmac.new(SESSION_SECRET.encode(), payload.encode(), hashlib.sha256).digest())
+
+
+def create_session_token(role: str, email: str, candidate_id: int | None = None) -> str:
+    """Signed token identifying a logged-in user until SESSION_TTL_SECONDS pass."""
+    claims = {"role": role, "email": email, "candidate_id": candidate_id, "exp": int(time.time()) + SESSION_TTL_SECONDS}
+    payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode())
+    return f"{payload}.{_sign(payload)}"
+
+
+def verify_session_token(token: str) -> dict[str, Any] | None:
+    """Claims of a valid, unexpired token; None for anything else."""
+    try:
+        payload, signature = token.split(".")
+        if not hmac.compare_digest(_sign(payload), signature):
+            return None
+        claims = json.loads(_b64decode(payload))
+    except Exception:
+        return None
+    if claims.get("exp", 0) < time.time():
+        return None
+    return claims
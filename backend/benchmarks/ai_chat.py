@@ -0,0 +1,108 @@
+"""Time to first token for /ai/chat vs /ai/chat/stream, against the local stub.
+
+Starts benchmarks.ai_stub and the API on free local ports, then sends
+--concurrency chats at once through each endpoint while probing GET / to show
+the event loop stays responsive. Every chat asks a different question, so
+replies come from the provider rather than the reply cache or another
+in-flight call. Run from the backend directory:
+
+    python -m benchmarks.ai_chat --concurrency 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import tempfile
+import threading
+import time
+
+
+def _chat_body(question: str) -> dict:
+    return {"task_title": "FizzBuzz", "task_description": "fizzbuzz(n)", "messages": [{"role": "user", "content": question}]}
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _serve(app, port: int):
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+async def _chat(client, stream: bool, question: str) -> tuple[float, float]:
+    """(seconds to first content, seconds to complete reply)"""
+    start = time.perf_counter()
+    if not stream:
+        res = await client.post("/ai/chat", json=_chat_body(question))
+        assert res.json()["content"], res.text
+        elapsed = time.perf_counter() - start
+        return elapsed, elapsed
+    first = None
+    async with client.stream("POST", "/ai/chat/stream", json=_chat_body(question)) as res:
+        async for line in res.aiter_lines():
+            if first is None and line.startswith("data:") and "content" in line:
+                assert json.loads(line[5:])["content"]
+                first = time.perf_counter() - start
+    return first, time.perf_counter() - start
+
+
+async def run(base_url: str, stream: bool, concurrency: int):
+    import httpx
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=None) as client:
+        probes: list[float] = []
+        done = asyncio.Event()
+
+        async def probe():
+            while not done.is_set():
+                start = time.perf_counter()
+                await client.get("/")
+                probes.append(time.perf_counter() - start)
+                await asyncio.sleep(0.01)
+
+        prober = asyncio.create_task(probe())
+        leg = "stream" if stream else "chat"
+        results = await asyncio.gather(*(_chat(client, stream, f"hint {i} for the {leg} run?") for i in range(concurrency)))
+        done.set()
+        await prober
+    return [r[0] for r in results], [r[1] for r in results], probes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--delay", type=float, default=0.02, help="stub seconds between words")
+    args = parser.parse_args()
+
+    stub_port, api_port = _free_port(), _free_port()
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{stub_port}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "stub")
+    os.environ.setdefault("RUNNER_POOL_SIZE", "0")
+    os.environ.setdefault("AUTH_HASH_WORKERS", "0")
+    os.chdir(tempfile.mkdtemp(prefix="hirewithai-bench-"))
+
+    from benchmarks.ai_stub import create_app
+    import main as api
+
+    _serve(create_app(args.delay), stub_port)
+    server = _serve(api.app, api_port)
+    for label, stream in (("/ai/chat", False), ("/ai/chat/stream", True)):
+        first, total, probes = asyncio.run(run(f"http://127.0.0.1:{api_port}", stream, args.concurrency))
+        print(f"{label:<16} first token p50 {statistics.median(first) * 1000:6.0f} ms  "
+              f"full reply p50 {statistics.median(total) * 1000:6.0f} ms  "
+              f"GET / max during chats {max(probes) * 1000:5.1f} ms")
+    server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Stand-in for the OpenAI chat completions API, for local testing.
+
+Replies with a canned answer, one word every --delay seconds, either streamed
+(``"stream": true``) or all at once. Run it from the backend directory and
+point the API at it:
+
+    python -m benchmarks.ai_stub --port 9100
+    OPENAI_BASE_URL=http://127.0.0.1:9100/v1 OPENAI_API_KEY=stub uvicorn main:app
+"""
+import argparse
+import asyncio
+import json
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+REPLY = ("Think about which numbers are divisible by both 3 and 5, and check that case "
+         "before the individual ones. A loop from 1 to n with the modulo operator is all you need.")
+
+
+def create_app(delay: float = 0.02) -> FastAPI:
+    app = FastAPI(title="AI stub")
+    words = REPLY.split(" ")
+
+    @app.post("/v1/chat/completions")
+    async def completions(request: Request):
+        body = await request.json()
+        if not body.get("stream"):
+            await asyncio.sleep(delay * len(words))
+            return {"choices": [{"index": 0, "message": {"role": "assistant", "content": REPLY}, "finish_reason": "stop"}]}
+
+        async def chunks():
+            for i, word in enumerate(words):
+                await asyncio.sleep(delay)
+                delta = {"content": word if i == 0 else " " + word}
+                yield f"data: {json.dumps({'choices': [{'index': 0, 'delta': delta}]})}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(chunks(), media_type="text/event-stream")
+
+    return app
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--delay", type=float, default=0.02, help="seconds between words")
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.delay), host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
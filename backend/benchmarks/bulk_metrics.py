@@ -0,0 +1,80 @@
+"""Benchmark compute_metrics_bulk against per-pair compute_metrics.
+
+Generates a synthetic cohort in memory, checks both engines agree on every
+pair and reports the time each takes. Run from the backend directory:
+
+    python -m benchmarks.bulk_metrics --events 1000000
+"""
+import argparse
+import random
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from event_schema import EVENT_CODES
+from metrics import compute_metrics, compute_metrics_bulk, event_columns
+
+EVENT_WEIGHTS = {
+    "code_edit": 70, "code_run": 8, "ai_used": 3, "tab_hidden": 4, "tab_visible": 4,
+    "large_paste": 1, "task_started": 1, "task_submitted": 1,
+}
+
+
+def synthetic_events(n_events: int, n_pairs: int, seed: int = 7) -> list[SimpleNamespace]:
+    rng = random.Random(seed)
+    types, weights = zip(*EVENT_WEIGHTS.items())
+    clocks = [datetime(2026, 1, 1) + timedelta(seconds=rng.randint(0, 86400)) for _ in range(n_pairs)]
+    events = []
+    for event_type in rng.choices(types, weights, k=n_events):
+        pair = rng.randrange(n_pairs)
+        clocks[pair] += timedelta(microseconds=rng.randint(1, 5_000_000))
+        chars_added = chars = None
+        if event_type == "code_edit":
+            chars_added, chars = rng.choice([-4, 0, 1, 1, 2, 3, 5, 8, 60]), 100
+        events.append(SimpleNamespace(
+            candidate_id=pair // 4 + 1, task_id=pair % 4 + 1, event_code=EVENT_CODES[event_type],
+            timestamp=clocks[pair], chars_added=chars_added, chars=chars, metadata_=None,
+            edit_count=None, linear_edits=None, ended_at=None,
+        ))
+    return events
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=1_000_000)
+    parser.add_argument("--pairs", type=int, default=5000)
+    args = parser.parse_args()
+
+    events = synthetic_events(args.events, args.pairs)
+    print(f"{len(events):,} events across {args.pairs:,} candidate/task pairs")
+
+    start = time.perf_counter()
+    by_pair = defaultdict(list)
+    for e in events:
+        by_pair[(e.candidate_id, e.task_id)].append(e)
+    expected = {}
+    for key, pair_events in by_pair.items():
+        pair_events.sort(key=lambda e: e.timestamp)
+        metrics = compute_metrics(pair_events)
+        expected[key] = {k: v for k, v in metrics.items() if k not in ("ai_prompts", "paste_events")}
+    per_pair = time.perf_counter() - start
+    print(f"compute_metrics per pair: {per_pair:.2f}s")
+
+    start = time.perf_counter()
+    columns = event_columns(events)
+    loaded = time.perf_counter() - start
+    start = time.perf_counter()
+    bulk = compute_metrics_bulk(columns)
+    computed = time.perf_counter() - start
+    print(f"compute_metrics_bulk:     {computed:.2f}s (+{loaded:.2f}s loading columns)")
+    print(f"speedup: {per_pair / computed:.0f}x compute, {per_pair / (computed + loaded):.1f}x end to end")
+
+    mismatched = [key for key in expected if expected[key] != bulk.get(key)]
+    if mismatched or len(bulk) != len(expected):
+        raise SystemExit(f"results differ for {len(mismatched)} pairs, e.g. {mismatched[:3]}")
+    print("results identical for every pair")
+
+
+if __name__ == "__main__":
+    main()
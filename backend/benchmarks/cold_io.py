@@ -0,0 +1,73 @@
+"""Per-run disk I/O saved by handing cold-start runs their job on stdin.
+
+Before, every run without the worker pool made a temporary directory, wrote
+solution.py, test_cases.json and the harness into it, and removed it again
+afterwards. Runs now get their job on stdin and write no files, but each
+still gets an empty working directory of its own, removed afterwards, so one
+candidate's files can't reach the next run: some directory work was kept for
+isolation. This times the old file work and the remaining directory work on
+their own (in --dir, so they can be pointed at a slow overlay filesystem),
+then times whole cold runs. Run from the backend directory:
+
+    python -m benchmarks.cold_io --runs 50 --dir /var/tmp
+"""
+import argparse
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+import runner
+from benchmarks.runner_pool import SOLUTION, SPEC
+
+
+def temp_dir_files(directory: str | None) -> tuple[float, int]:
+    """(seconds, bytes written) for the per-run file work the old cold path did."""
+    start = time.perf_counter()
+    tmpdir = tempfile.mkdtemp(dir=directory)
+    written = 0
+    for name, content in (("solution.py", SOLUTION), ("test_cases.json", SPEC.cases_json), ("runner.py", runner.WORKER_SCRIPT)):
+        with open(os.path.join(tmpdir, name), "w", encoding="utf-8") as f:
+            written += f.write(content)
+    shutil.rmtree(tmpdir)
+    return time.perf_counter() - start, written
+
+
+def empty_dir(directory: str | None) -> float:
+    """Seconds for the per-run directory work the cold path still does."""
+    start = time.perf_counter()
+    shutil.rmtree(tempfile.mkdtemp(dir=directory))
+    return time.perf_counter() - start
+
+
+def cold_run() -> float:
+    start = time.perf_counter()
+    data = runner._run_cold(runner._tests_job(SOLUTION, SPEC, 10), 12)
+    assert data and not data.get("error"), data
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--dir", default=None, help="filesystem the old temp directories lived on")
+    args = parser.parse_args()
+
+    files = [temp_dir_files(args.dir) for _ in range(args.runs)]
+    dirs = [empty_dir(args.dir) for _ in range(args.runs)]
+    runs = [cold_run() for _ in range(args.runs)]
+    runner.shutdown_pool()
+
+    io_ms = statistics.median(seconds for seconds, _ in files) * 1000
+    dir_ms = statistics.median(dirs) * 1000
+    run_ms = statistics.median(runs) * 1000
+    print(f"temp dir + 3 files + rmtree  p50 {io_ms:7.2f} ms  ({files[0][1]} bytes written per run)")
+    print(f"empty dir + rmtree           p50 {dir_ms:7.2f} ms  (0 files, still done per run for isolation)")
+    print(f"cold run over stdin          p50 {run_ms:7.2f} ms  (includes the empty dir, in RUNNER_SANDBOX_DIR)")
+    print(f"I/O saved per run: {io_ms - dir_ms:.2f} ms, {(io_ms - dir_ms) / (run_ms - dir_ms + io_ms):.1%} "
+          f"of a cold run that still wrote the files")
+
+
+if __name__ == "__main__":
+    main()
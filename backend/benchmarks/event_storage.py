@@ -0,0 +1,181 @@
+"""On-disk size and metric time of the compact events layout vs the old one.
+
+Builds a throwaway SQLite database in the old layout (event_type text, every
+payload as JSON in metadata_) with synthetic events shaped like the editor's,
+times the migration to event codes and numeric columns, and compares file size
+after VACUUM and the time to load every event and compute the bulk metrics
+(the old loader had to json.loads each code_edit). Figures are scaled to one
+million events. Run from the backend directory:
+
+    python -m benchmarks.event_storage --events 200000
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks.bulk_metrics import EVENT_WEIGHTS
+from database import Base, create_db_engine, migrate
+from event_schema import EVENT_CODES
+from metrics import compute_metrics_bulk
+from metrics_store import load_event_columns
+from models import Candidate, Task
+
+LEGACY_EVENTS_DDL = (
+    "CREATE TABLE events (id INTEGER NOT NULL PRIMARY KEY, candidate_id INTEGER NOT NULL REFERENCES candidates (id), "
+    "task_id INTEGER NOT NULL REFERENCES tasks (id), event_type VARCHAR(64) NOT NULL, metadata_ TEXT, timestamp DATETIME)",
+    "CREATE INDEX ix_events_id ON events (id)",
+    "CREATE INDEX ix_events_candidate_task_timestamp ON events (candidate_id, task_id, timestamp)",
+)
+PROMPTS = ["how do I check divisibility?", "why does my loop never end", "what does enumerate return"]
+
+
+def legacy_payloads(n_events: int, n_pairs: int, seed: int = 7):
+    rng = random.Random(seed)
+    types, weights = zip(*EVENT_WEIGHTS.items())
+    clocks = [datetime(2026, 1, 1) + timedelta(seconds=rng.randint(0, 86400)) for _ in range(n_pairs)]
+    chars = [0] * n_pairs
+    for event_type in rng.choices(types, weights, k=n_events):
+        pair = rng.randrange(n_pairs)
+        clocks[pair] += timedelta(microseconds=rng.randint(1, 5_000_000))
+        meta = None
+        if event_type == "code_edit":
+            added = rng.choice([-4, -1, 1, 1, 1, 2, 3, 5, 8])
+            chars[pair] = max(chars[pair] + added, 0)
+            meta = {"chars_added": added, "chars": chars[pair]}
+        elif event_type == "large_paste":
+            meta = {"chars_added": 120, "content_preview": "def solve(n):\n    return n " * 4}
+        elif event_type == "ai_used":
+            meta = {"prompt": rng.choice(PROMPTS)}
+        yield {
+            "candidate_id": pair // 4 + 1, "task_id": pair % 4 + 1, "event_type": event_type,
+            "metadata_": json.dumps(meta) if meta else None, "timestamp": clocks[pair],
+        }
+
+
+def build_legacy(path: str, n_events: int, n_pairs: int):
+    engine = create_db_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE events"))
+        conn.execute(text("DROP TABLE event_types"))
+        for ddl in LEGACY_EVENTS_DDL:
+            conn.execute(text(ddl))
+    with sessionmaker(bind=engine)() as db:
+        db.add_all(Candidate(email=f"c{i}@bench", password_hash="x") for i in range(n_pairs // 4 + 1))
+        db.add_all(Task(title=f"Task {i}", description="", expected_time=1) for i in range(4))
+        db.commit()
+    insert = text("INSERT INTO events (candidate_id, task_id, event_type, metadata_, timestamp) "
+                  "VALUES (:candidate_id, :task_id, :event_type, :metadata_, :timestamp)")
+    rows = list(legacy_payloads(n_events, n_pairs))
+    with engine.begin() as conn:
+        conn.execute(insert, rows)
+    engine.dispose()
+
+
+def vacuumed_size(path: str) -> int:
+    engine = create_db_engine(f"sqlite:///{path}", journal_mode="DELETE")
+    with engine.connect() as conn:
+        conn.execute(text("VACUUM"))
+    engine.dispose()
+    return os.path.getsize(path)
+
+
+def legacy_columns(engine) -> dict[str, np.ndarray]:
+    """The pre-migration loader: type names mapped in Python, JSON parsed per edit."""
+    epoch, microsecond = datetime(1970, 1, 1), timedelta(microseconds=1)
+    candidate_ids, task_ids, codes, timestamps, chars_added = [], [], [], [], []
+    edit_code = EVENT_CODES["code_edit"]
+    with sessionmaker(bind=engine)() as db:
+        rows = db.execute(
+            text("SELECT candidate_id, task_id, event_type, timestamp, metadata_ FROM events ORDER BY id")
+            .columns(timestamp=Base.metadata.tables["events"].c.timestamp.type)
+            .execution_options(yield_per=10000)
+        )
+        for e in rows:
+            code = EVENT_CODES.get(e.event_type, -1)
+            chars = np.nan
+            if code == edit_code and e.metadata_:
+                value = json.loads(e.metadata_).get("chars_added", 0)
+                if isinstance(value, (int, float)):
+                    chars = float(value)
+            candidate_ids.append(e.candidate_id)
+            task_ids.append(e.task_id)
+            codes.append(code)
+            timestamps.append((e.timestamp - epoch) // microsecond)
+            chars_added.append(chars)
+    return {
+        "candidate_id": np.array(candidate_ids, dtype=np.int64),
+        "task_id": np.array(task_ids, dtype=np.int64),
+        "type_code": np.array(codes, dtype=np.int16),
+        "timestamp": np.array(timestamps, dtype=np.int64),
+        "chars_added": np.array(chars_added, dtype=np.float64),
+        # The old layout had no rollups.
+        "edit_count": np.zeros(len(codes), dtype=np.int64),
+        "linear_edits": np.zeros(len(codes), dtype=np.int64),
+        "ended_at": np.array(timestamps, dtype=np.int64),
+    }
+
+
+def compact_columns(engine) -> dict[str, np.ndarray]:
+    with sessionmaker(bind=engine)() as db:
+        return load_event_columns(db)
+
+
+def timed_metrics(path: str, load) -> tuple[float, dict]:
+    engine = create_db_engine(f"sqlite:///{path}")
+    start = time.perf_counter()
+    result = compute_metrics_bulk(load(engine))
+    elapsed = time.perf_counter() - start
+    engine.dispose()
+    return elapsed, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=200_000)
+    parser.add_argument("--pairs", type=int, default=2000)
+    args = parser.parse_args()
+    scale = 1_000_000 / args.events
+
+    workdir = tempfile.mkdtemp(prefix="hirewithai-bench-")
+    try:
+        legacy_path = os.path.join(workdir, "legacy.db")
+        compact_path = os.path.join(workdir, "compact.db")
+        build_legacy(legacy_path, args.events, args.pairs)
+        legacy_size = vacuumed_size(legacy_path)
+        legacy_seconds, expected = timed_metrics(legacy_path, legacy_columns)
+
+        shutil.copyfile(legacy_path, compact_path)
+        engine = create_db_engine(f"sqlite:///{compact_path}")
+        start = time.perf_counter()
+        migrate(engine)
+        migrate_seconds = time.perf_counter() - start
+        engine.dispose()
+        compact_size = vacuumed_size(compact_path)
+        compact_seconds, result = timed_metrics(compact_path, compact_columns)
+    finally:
+        shutil.rmtree(workdir)
+
+    if result != expected:
+        raise SystemExit("metrics differ between the old and compact layouts")
+    mb = 1024 * 1024
+    print(f"{args.events:,} events, figures per million events")
+    print(f"on disk (after VACUUM)  old {legacy_size * scale / mb:7.1f} MB   compact {compact_size * scale / mb:7.1f} MB"
+          f"   saved {(legacy_size - compact_size) * scale / mb:.1f} MB ({1 - compact_size / legacy_size:.0%})")
+    print(f"load + bulk metrics     old {legacy_seconds * scale:7.2f} s    compact {compact_seconds * scale:7.2f} s"
+          f"    saved {(legacy_seconds - compact_seconds) * scale:.2f} s ({1 - compact_seconds / legacy_seconds:.0%})")
+    print(f"migration               {migrate_seconds * scale:.1f} s")
+    print("metrics identical")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""Compare sustained event ingestion: one commit per event vs the write-behind buffer.
+
+Run from the backend directory (uses a throwaway SQLite database):
+
+    python -m benchmarks.events_ingest --events 5000 --batch 20
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=5000)
+    parser.add_argument("--batch", type=int, default=20, help="events per client batch")
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp(prefix="hirewithai-bench-"))
+    from database import SessionLocal, init_db
+    from event_buffer import EventBuffer
+    from event_schema import CODE_EDIT
+    from models import Event
+
+    init_db()
+
+    db = SessionLocal()
+    start = time.perf_counter()
+    for _ in range(args.events):
+        db.add(Event(candidate_id=1, task_id=1, event_code=CODE_EDIT, chars_added=1, chars=42))
+        db.commit()
+    per_event = args.events / (time.perf_counter() - start)
+    db.close()
+    print(f"commit per event: {per_event:,.0f} events/sec")
+
+    buffer = EventBuffer()
+    buffer.start()
+    start = time.perf_counter()
+    for offset in range(0, args.events, args.batch):
+        now = datetime.utcnow()
+        buffer.add([
+            {"candidate_id": 2, "task_id": 1, "event_type": "code_edit", "chars_added": 1, "chars": 42, "timestamp": now}
+            for _ in range(min(args.batch, args.events - offset))
+        ])
+    buffer.stop()
+    buffered = args.events / (time.perf_counter() - start)
+    print(f"buffered:         {buffered:,.0f} events/sec ({buffered / per_event:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""Telemetry ingestion over the /ws/events socket vs HTTP POSTs.
+
+Starts the API with uvicorn on a throwaway SQLite database and has --clients
+simulated editor tabs send --events events each, one transport at a time:
+
+    http        POST /events, one request per event
+    http-batch  POST /events/batch, --batch events per request
+    ws          /ws/events, one frame per event
+    ws-batch    /ws/events, --batch events per frame
+
+HTTP clients keep their connection alive and send one request at a time, as a
+tab does; socket clients send frames without waiting and collect the acks.
+Reports events/sec (until every event is acknowledged) and the server's CPU
+time per event, read from /proc (so Linux only) once the write-behind buffer
+has stored them all. Run from the backend directory:
+
+    python -m benchmarks.events_socket --clients 20 --events 500
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.ai_chat import _free_port
+from benchmarks.load_test import BACKEND_DIR, synthetic_events, wait_until_up
+
+MODES = ("http", "http-batch", "ws", "ws-batch")
+
+
+def server_cpu_seconds(pid: int) -> float:
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    # utime and stime, fields 14 and 15 of the whole line
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def stored_events(db_path: str) -> int:
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute("SELECT COUNT(*) FROM events").fetchone()[0]
+
+
+async def http_client(client, events: list[dict], batch: int | None):
+    if batch is None:
+        for e in events:
+            (await client.post("/events", json=e)).raise_for_status()
+        return
+    for offset in range(0, len(events), batch):
+        (await client.post("/events/batch", json={"events": events[offset:offset + batch]})).raise_for_status()
+
+
+async def ws_client(url: str, events: list[dict], batch: int):
+    import websockets
+
+    frames = [json.dumps({"seq": seq, "events": events[offset:offset + batch]})
+              for seq, offset in enumerate(range(0, len(events), batch))]
+    async with websockets.connect(url) as ws:
+        async def acks():
+            for _ in frames:
+                reply = json.loads(await ws.recv())
+                if "error" in reply:
+                    raise RuntimeError(reply["error"])
+
+        receiver = asyncio.ensure_future(acks())
+        for frame in frames:
+            await ws.send(frame)
+        await receiver
+
+
+async def send_all(mode: str, base_url: str, payloads: list[list[dict]], batch: int) -> float:
+    import httpx
+
+    start = time.perf_counter()
+    if mode.startswith("ws"):
+        url = base_url.replace("http://", "ws://") + "/ws/events"
+        await asyncio.gather(*(ws_client(url, events, batch if mode == "ws-batch" else 1) for events in payloads))
+    else:
+        limits = httpx.Limits(max_connections=len(payloads), max_keepalive_connections=len(payloads))
+        async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits) as client:
+            await asyncio.gather(*(http_client(client, events, batch if mode == "http-batch" else None)
+                                   for events in payloads))
+    return time.perf_counter() - start
+
+
+def signup(base_url: str, count: int) -> list[int]:
+    import httpx
+
+    stamp = int(time.time())
+    return [
+        httpx.post(f"{base_url}/auth/signup", json={"email": f"socket-{stamp}-{i}@bench", "password": "benchmark1"})
+        .json()["candidate_id"]
+        for i in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=20, help="editor tabs sending at once")
+    parser.add_argument("--events", type=int, default=500, help="events per client and transport")
+    parser.add_argument("--batch", type=int, default=20, help="events per request or frame in the batch modes")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="hirewithai-bench-")
+    db_path = os.path.join(workdir, "socket.db")
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    env = {
+        **os.environ,
+        "PYTHONPATH": BACKEND_DIR,
+        "DATABASE_URL": f"sqlite:///{db_path}",
+        # Nothing but ingestion should use the server's CPU.
+        "RUNNER_POOL_SIZE": "0", "AUTH_HASH_WORKERS": "0", "GRADING_WORKERS": "0", "PROFILE_SAMPLE_RATE": "0",
+    }
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=workdir, env=env,
+    )
+    results = {}
+    try:
+        wait_until_up(base_url, proc)
+        rng = random.Random(7)
+        candidates = signup(base_url, args.clients)
+        for mode in args.modes:
+            payloads = [synthetic_events(candidate_id, 1, args.events, rng) for candidate_id in candidates]
+            total = sum(len(events) for events in payloads)
+            expected = stored_events(db_path) + total
+            cpu_before = server_cpu_seconds(proc.pid)
+            elapsed = asyncio.run(send_all(mode, base_url, payloads, args.batch))
+            deadline = time.monotonic() + 30
+            while stored_events(db_path) < expected and time.monotonic() < deadline:
+                time.sleep(0.1)
+            results[mode] = (total, elapsed, server_cpu_seconds(proc.pid) - cpu_before)
+    finally:
+        proc.terminate()
+        proc.wait()
+        shutil.rmtree(workdir)
+
+    print(f"{args.clients} clients, {args.events} events each, batch {args.batch}")
+    print(f"{'transport':<12} {'events':>8} {'seconds':>8} {'events/s':>10} {'server CPU s':>13} {'CPU us/event':>13}")
+    for mode, (total, elapsed, cpu) in results.items():
+        print(f"{mode:<12} {total:>8} {elapsed:>8.2f} {total / elapsed:>10,.0f} {cpu:>13.2f} {cpu / total * 1e6:>13.1f}")
+    if "http" in results:
+        base_total, base_elapsed, base_cpu = results["http"]
+        for mode, (total, elapsed, cpu) in results.items():
+            if mode != "http":
+                print(f"{mode} vs http: {(total / elapsed) / (base_total / base_elapsed):.1f}x events/s, "
+                      f"{(base_cpu / base_total) / (cpu / total):.1f}x less CPU per event")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+"""End-to-end load test: synthetic candidates and a recruiter against a local server.
+
+Each synthetic candidate signs up, lists the tasks, sends batches of editor
+events, runs their code, submits it and polls until it is graded; once they
+are done a recruiter logs in
+and browses the candidate list and individual reports. Latency and req/s are
+reported per endpoint and saved as JSON, so runs on different commits can be
+compared. Run from the backend directory:
+
+    python -m benchmarks.load_test run --candidates 100 --concurrency 20
+    python -m benchmarks.load_test compare results/before.json results/after.json
+
+Without --url a server is started with uvicorn on a free port, against a
+throwaway SQLite database.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(BACKEND_DIR, "benchmarks", "results")
+
+SOLUTION = """def fizzbuzz(n):
+    # candidate {i}
+    return [("Fizz" * (i % 3 == 0) + "Buzz" * (i % 5 == 0)) or str(i) for i in range(1, n + 1)]
+"""
+RECRUITER = {"email": "recruiter@hirewithai.com", "password": "recruiter123"}
+# How often a candidate polls its grading job after submitting.
+GRADING_POLL_SECONDS = 0.5
+
+
+def percentile(values: list[float], pct: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def synthetic_candidates(count: int, run_id: str) -> list[dict]:
+    return [{"email": f"load-{run_id}-{i}@bench.test", "password": f"pw-{i}-{run_id}"} for i in range(count)]
+
+
+def synthetic_events(candidate_id: int, task_id: int, count: int, rng: random.Random) -> list[dict]:
+    """Editor events shaped like the frontend's: mostly typing, some pastes,
+    AI prompts and tab switches."""
+    events, chars = [], 0
+    for _ in range(count):
+        roll = rng.random()
+        if roll < 0.85:
+            added = rng.choice((1, 1, 1, 2, 5, -1))
+            chars = max(0, chars + added)
+            events.append({"event_type": "code_edit", "metadata": {"chars_added": added, "chars": chars}})
+        elif roll < 0.9:
+            added = rng.randint(60, 400)
+            chars += added
+            events.append({"event_type": "large_paste", "metadata": {"chars_added": added, "content_preview": "x" * 40}})
+        elif roll < 0.95:
+            events.append({"event_type": "ai_used", "metadata": {"prompt": "how do I check divisibility?"}})
+        else:
+            events.append({"event_type": "tab_hidden"})
+            events.append({"event_type": "tab_visible"})
+    return [{"candidate_id": candidate_id, "task_id": task_id, "age_ms": 0, **e} for e in events]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = {}
+        self.statuses: dict[str, dict[str, int]] = {}
+
+    async def call(self, client, label: str, method: str, url: str, **kwargs):
+        start = time.perf_counter()
+        res = await client.request(method, url, **kwargs)
+        self.latencies.setdefault(label, []).append(time.perf_counter() - start)
+        statuses = self.statuses.setdefault(label, {})
+        statuses[str(res.status_code)] = statuses.get(str(res.status_code), 0) + 1
+        return res
+
+    def summary(self, elapsed: float) -> dict:
+        endpoints = {}
+        for label, times in sorted(self.latencies.items()):
+            statuses = self.statuses[label]
+            endpoints[label] = {
+                "count": len(times),
+                "errors": sum(n for code, n in statuses.items() if not code.startswith("2")),
+                "statuses": statuses,
+                "requests_per_second": len(times) / elapsed,
+                "mean_ms": statistics.fmean(times) * 1000,
+                "p50_ms": percentile(times, 50) * 1000,
+                "p95_ms": percentile(times, 95) * 1000,
+                "p99_ms": percentile(times, 99) * 1000,
+                "max_ms": max(times) * 1000,
+            }
+        return endpoints
+
+
+async def candidate_session(client, rec: Recorder, creds: dict, index: int, args, rng: random.Random) -> tuple[int, int] | None:
+    res = await rec.call(client, "POST /auth/signup", "POST", "/auth/signup", json=creds)
+    if res.status_code != 200:
+        return None
+    candidate_id = res.json()["candidate_id"]
+    tasks = (await rec.call(client, "GET /tasks", "GET", "/tasks", params={"candidate_id": candidate_id})).json()
+    task_id = tasks[0]["id"]
+    await rec.call(client, "GET /tasks/{id}", "GET", f"/tasks/{task_id}")
+
+    events = synthetic_events(candidate_id, task_id, args.events, rng)
+    for offset in range(0, len(events), args.batch):
+        await rec.call(client, "POST /events/batch", "POST", "/events/batch", json={"events": events[offset:offset + args.batch]})
+        await asyncio.sleep(args.think)
+
+    code = SOLUTION.format(i=index) if args.unique_code else SOLUTION.format(i=0)
+    for _ in range(args.runs):
+        await rec.call(client, "POST /run", "POST", "/run", json={"candidate_id": candidate_id, "task_id": task_id, "code": code})
+        await asyncio.sleep(args.think)
+    res = await rec.call(client, "POST /submit", "POST", "/submit", json={
+        "candidate_id": candidate_id, "task_id": task_id, "final_code": code, "reflection": "load test",
+    })
+    # Grading is queued; poll like the editor does until the results are in.
+    job = res.json() if res.status_code in (200, 202) else {"status": "failed"}
+    while job["status"] in ("queued", "running"):
+        await asyncio.sleep(GRADING_POLL_SECONDS)
+        job = (await rec.call(client, "GET /grading/jobs/{id}", "GET", f"/grading/jobs/{job['job_id']}")).json()
+    return candidate_id, task_id
+
+
+async def recruiter_session(client, rec: Recorder, reports: list[tuple[int, int]], views: int, rng: random.Random):
+    await rec.call(client, "POST /auth/login/recruiter", "POST", "/auth/login/recruiter", json=RECRUITER)
+    for page in range(0, max(1, len(reports)), 50):
+        await rec.call(client, "GET /recruiter/candidates", "GET", "/recruiter/candidates",
+                       params={"sort": "candidate", "limit": 50, "offset": page})
+    for candidate_id, task_id in rng.sample(reports, min(views, len(reports))):
+        await rec.call(client, "GET /employer/{candidate_id}/{task_id}", "GET", f"/employer/{candidate_id}/{task_id}")
+
+
+async def scenario(base_url: str, args) -> dict:
+    import httpx
+
+    rng = random.Random(args.seed)
+    rec = Recorder()
+    run_id = f"{args.seed}-{int(time.time())}"
+    limits = httpx.Limits(max_connections=args.concurrency + 1, max_keepalive_connections=args.concurrency + 1)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        gate = asyncio.Semaphore(args.concurrency)
+
+        async def one(index, creds):
+            async with gate:
+                return await candidate_session(client, rec, creds, index, args, random.Random(rng.random()))
+
+        start = time.perf_counter()
+        sessions = await asyncio.gather(*(one(i, c) for i, c in enumerate(synthetic_candidates(args.candidates, run_id))))
+        candidates_elapsed = time.perf_counter() - start
+        await recruiter_session(client, rec, [s for s in sessions if s], args.recruiter_views, rng)
+        elapsed = time.perf_counter() - start
+
+    total = sum(len(times) for times in rec.latencies.values())
+    return {
+        "elapsed_seconds": elapsed,
+        "candidate_phase_seconds": candidates_elapsed,
+        "requests": total,
+        "requests_per_second": total / elapsed,
+        "completed_candidates": sum(1 for s in sessions if s),
+        "endpoints": rec.summary(elapsed),
+    }
+
+
+def start_server(port: int) -> subprocess.Popen:
+    workdir = tempfile.mkdtemp(prefix="hirewithai-load-")
+    env = {
+        **os.environ,
+        "PYTHONPATH": BACKEND_DIR,
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'load.db')}",
+    }
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=workdir, env=env,
+    )
+
+
+def wait_until_up(base_url: str, proc: subprocess.Popen | None, timeout: float = 60):
+    import httpx
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc is not None and proc.poll() is not None:
+            raise SystemExit("Server exited during start-up")
+        try:
+            if httpx.get(base_url + "/", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise SystemExit(f"Server at {base_url} did not come up")
+
+
+def git_revision() -> dict:
+    def git(*cmd):
+        return subprocess.run(["git", *cmd], cwd=BACKEND_DIR, capture_output=True, text=True).stdout.strip()
+
+    try:
+        return {"commit": git("rev-parse", "--short", "HEAD") or None, "dirty": bool(git("status", "--porcelain", "--", "."))}
+    except OSError:
+        return {"commit": None, "dirty": None}
+
+
+def print_report(report: dict):
+    print(f"{'endpoint':<38} {'count':>6} {'err':>5} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for label, s in report["endpoints"].items():
+        print(f"{label:<38} {s['count']:>6} {s['errors']:>5} {s['requests_per_second']:>7.1f} "
+              f"{s['p50_ms']:>8.1f} {s['p95_ms']:>8.1f} {s['p99_ms']:>8.1f}")
+    print(f"{report['requests']} requests in {report['elapsed_seconds']:.1f}s "
+          f"({report['requests_per_second']:.1f} req/s), {report['completed_candidates']} candidates completed")
+
+
+def cmd_run(args):
+    from benchmarks.ai_chat import _free_port
+
+    proc = None
+    base_url = args.url
+    if base_url is None:
+        port = _free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        proc = start_server(port)
+    try:
+        wait_until_up(base_url, proc)
+        report = asyncio.run(scenario(base_url, args))
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+
+    settings = {k: v for k, v in vars(args).items() if k not in ("func", "output")}
+    report = {
+        **git_revision(),
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "settings": settings,
+        **report,
+    }
+    print_report(report)
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        output = os.path.join(RESULTS_DIR, f"{stamp}-{report['commit'] or 'nogit'}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"saved {output}")
+
+
+def cmd_compare(args):
+    with open(args.baseline, encoding="utf-8") as f:
+        before = json.load(f)
+    with open(args.candidate, encoding="utf-8") as f:
+        after = json.load(f)
+
+    def change(old: float, new: float) -> float:
+        return (new - old) / old * 100 if old else 0.0
+
+    print(f"{before.get('commit')} -> {after.get('commit')}")
+    print(f"{'endpoint':<38} {'p50 ms':>18} {'p95 ms':>18} {'p99 ms':>18} {'p95 change':>11}")
+    regressions = []
+    for label in sorted(set(before["endpoints"]) | set(after["endpoints"])):
+        old, new = before["endpoints"].get(label), after["endpoints"].get(label)
+        if old is None or new is None:
+            print(f"{label:<38} only in {'candidate' if old is None else 'baseline'}")
+            continue
+        cells = " ".join(f"{old[k]:>7.1f} -> {new[k]:>7.1f}" for k in ("p50_ms", "p95_ms", "p99_ms"))
+        p95_change = change(old["p95_ms"], new["p95_ms"])
+        print(f"{label:<38} {cells} {p95_change:>+10.1f}%")
+        if args.threshold is not None and p95_change > args.threshold:
+            regressions.append(label)
+    rps_change = change(before["requests_per_second"], after["requests_per_second"])
+    print(f"overall {before['requests_per_second']:.1f} -> {after['requests_per_second']:.1f} req/s ({rps_change:+.1f}%)")
+    if regressions:
+        print(f"p95 regressed more than {args.threshold:g}% on: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="run the scenario and save the results")
+    run.add_argument("--url", default=None, help="server to test (default: start one locally)")
+    run.add_argument("--candidates", type=int, default=50)
+    run.add_argument("--concurrency", type=int, default=10, help="candidates active at once")
+    run.add_argument("--events", type=int, default=200, help="editor events per candidate")
+    run.add_argument("--batch", type=int, default=20, help="events per /events/batch request")
+    run.add_argument("--runs", type=int, default=3, help="/run calls per candidate before submitting")
+    run.add_argument("--think", type=float, default=0.0, help="seconds to pause between a candidate's requests")
+    run.add_argument("--recruiter-views", type=int, default=20, help="candidate reports the recruiter opens")
+    run.add_argument("--unique-code", action=argparse.BooleanOptionalAction, default=True,
+                     help="give every candidate different code so runs miss the result cache")
+    run.add_argument("--seed", type=int, default=1)
+    run.add_argument("--output", default=None, help=f"JSON file to write (default: {os.path.relpath(RESULTS_DIR)}/)")
+    run.set_defaults(func=cmd_run)
+
+    compare = sub.add_parser("compare", help="compare two saved results")
+    compare.add_argument("baseline")
+    compare.add_argument("candidate")
+    compare.add_argument("--threshold", type=float, default=None,
+                         help="exit with status 1 if any endpoint's p95 grew by more than this many percent")
+    compare.set_defaults(func=cmd_compare)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Login burst: password hashing on threads vs the hashing process pool.
+
+Simulates the start of a scheduled assessment: every candidate logs in at once
+while a probe keeps calling GET /tasks, and reports login latency and how slow
+the rest of the API gets in the meantime. Run from the backend directory (uses
+a throwaway SQLite database):
+
+    python -m benchmarks.login_burst --logins 200
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+async def burst(app, logins: int) -> tuple[list[float], list[float], float]:
+    import httpx
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        login_times: list[float] = []
+        probe_times: list[float] = []
+        done = asyncio.Event()
+
+        async def login(i):
+            start = time.perf_counter()
+            res = await client.post("/auth/login/candidate", json={"email": f"c{i}@bench", "password": "password"})
+            res.raise_for_status()
+            login_times.append(time.perf_counter() - start)
+
+        async def probe():
+            while not done.is_set():
+                start = time.perf_counter()
+                await client.get("/tasks")
+                probe_times.append(time.perf_counter() - start)
+                await asyncio.sleep(0.01)
+
+        prober = asyncio.create_task(probe())
+        start = time.perf_counter()
+        await asyncio.gather(*(login(i) for i in range(logins)))
+        elapsed = time.perf_counter() - start
+        done.set()
+        await prober
+    return login_times, probe_times, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="hashing processes")
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp(prefix="hirewithai-bench-"))
+    import auth
+    import main as api
+    from database import SessionLocal, init_db
+    from models import Candidate
+
+    init_db()
+    db = SessionLocal()
+    api.seed_task(db)
+    password_hash = auth.hash_password("password")
+    db.add_all(Candidate(email=f"c{i}@bench", password_hash=password_hash) for i in range(args.logins))
+    db.commit()
+    db.close()
+
+    for label, workers in (("threads", 0), (f"{args.workers} processes", args.workers)):
+        auth.HASH_WORKERS = workers
+        if auth.get_hash_pool() is not None:
+            # Warm the pool so process start-up isn't billed to the first logins.
+            auth.get_hash_pool().submit(auth.hash_password, "warm-up").result()
+        logins, probes, elapsed = asyncio.run(burst(api.app, args.logins))
+        auth.shutdown_hash_pool()
+        print(f"{label:<14} {args.logins / elapsed:6.1f} logins/sec  "
+              f"login p50 {statistics.median(logins) * 1000:7.0f} ms  p95 {_percentile(logins, 95) * 1000:7.0f} ms  "
+              f"GET /tasks p95 during burst {_percentile(probes, 95) * 1000:6.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
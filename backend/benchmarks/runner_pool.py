@@ -0,0 +1,68 @@
+"""Compare submissions/sec for cold-start subprocess runs vs the warm worker pool.
+
+Run from the backend directory:
+
+    python -m benchmarks.runner_pool --submissions 200 --concurrency 4
+"""
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import runner
+from task_registry import TaskSpec
+from worker_pool import WorkerPool
+
+SOLUTION = """def fizzbuzz(n):
+    out = []
+    for i in range(1, n + 1):
+        if i % 15 == 0:
+            out.append("FizzBuzz")
+        elif i % 3 == 0:
+            out.append("Fizz")
+        elif i % 5 == 0:
+            out.append("Buzz")
+        else:
+            out.append(str(i))
+    return out
+"""
+
+TEST_CASES = [
+    {"args": [n], "expected": [("Fizz" * (i % 3 == 0) + "Buzz" * (i % 5 == 0)) or str(i) for i in range(1, n + 1)]}
+    for n in (1, 3, 5, 15, 16)
+]
+SPEC = TaskSpec(1, ("fizzbuzz",), json.dumps(TEST_CASES), len(TEST_CASES), "bench")
+
+
+def measure(label: str, submit, submissions: int, concurrency: int) -> float:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as ex:
+        results = list(ex.map(lambda _: submit(), range(submissions)))
+    elapsed = time.perf_counter() - start
+    failed = sum(1 for r in results if r.get("error"))
+    rate = submissions / elapsed
+    print(f"{label:<6} {submissions} submissions in {elapsed:.2f}s -> {rate:.1f} submissions/sec ({failed} failed)")
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--submissions", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--pool-size", type=int, default=4)
+    args = parser.parse_args()
+
+    cold = measure("cold", lambda: runner._run_cold(runner._tests_job(SOLUTION, SPEC, 10), 12), args.submissions, args.concurrency)
+
+    pool = WorkerPool(runner.HARNESS_COMMAND, size=args.pool_size, max_jobs=runner.POOL_MAX_JOBS,
+                      sandbox_dir=runner.SANDBOX_DIR)
+    try:
+        job = runner._tests_job(SOLUTION, SPEC, 10)
+        warm = measure("pool", lambda: pool.execute(job, 10), args.submissions, args.concurrency)
+    finally:
+        pool.shutdown()
+    print(f"speedup: {warm / cold:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
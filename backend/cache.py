@@ -0,0 +1,111 @@
+"""Small in-process caches shared by the API modules."""
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+
+class LRUCache:
+    """Thread-safe least-recently-used cache with hit/miss counters.
+
+    With a ``directory`` the cache gets a second, on-disk tier: every value is
+    also written there as JSON (so values must be JSON-serializable and keys
+    strings safe to use as file names), and memory misses fall back to it. The
+    disk tier is never evicted by the cache itself.
+
+    With a ``ttl`` (seconds), in-memory entries also expire that long after
+    they were stored.
+    """
+
+    def __init__(self, max_entries: int = 1024, directory: str | None = None, ttl: float | None = None):
+        self.max_entries = max_entries
+        self.directory = directory
+        self.ttl = ttl
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        # key -> (value, expiry on the monotonic clock or None)
+        self._data: OrderedDict[Hashable, tuple[Any, float | None]] = OrderedDict()
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            if key in self._data:
+                value, expires = self._data[key]
+                if expires is None or expires > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+        if self.directory:
+            try:
+                with open(self._path(key), encoding="utf-8") as f:
+                    value = json.load(f)
+            except (OSError, ValueError):
+                pass
+            else:
+                with self._lock:
+                    self.disk_hits += 1
+                    self._store(key, value)
+                return value
+        with self._lock:
+            self.misses += 1
+        return default
+
+    def set(self, key: Hashable, value: Any):
+        with self._lock:
+            self._store(key, value)
+        if self.directory:
+            path = self._path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temp file and rename so readers never see half a value.
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(value, f)
+                os.replace(tmp, path)
+            except BaseException:
+                os.unlink(tmp)
+                raise
+
+    def _store(self, key: Hashable, value: Any):
+        self._data[key] = (value, time.monotonic() + self.ttl if self.ttl else None)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable):
+        with self._lock:
+            self._data.pop(key, None)
+        if self.directory:
+            try:
+                os.unlink(self._path(key))
+            except OSError:
+                pass
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._data),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            }
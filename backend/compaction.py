@@ -0,0 +1,333 @@
+"""Roll up old keystroke events and move the raw rows to compressed archives.
+
+Most rows in the events table are code_edit events, one per editor change.
+Once events are older than EVENT_COMPACT_AFTER_DAYS, every run of two or more
+consecutive code_edit events of a candidate/task pair is replaced by one
+code_edit_rollup row. The rollup keeps the edit count, how many edits were
+linear typing, and the first and last timestamps, which is everything the
+workflow metrics read from them. Each pair's metrics state is computed before
+and after, and a pair is left alone if the two would differ. The raw rows are
+written to a gzipped JSON-lines file in EVENT_ARCHIVE_DIR before they are
+deleted.
+
+Run it with ``python manage.py compact-events``; ``--dry-run`` reports the
+rows and bytes that would be reclaimed without changing anything. It also
+runs in the background every EVENT_COMPACTION_INTERVAL_SECONDS when that is
+set. Only run one compactor per database.
+"""
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from itertools import groupby
+from types import SimpleNamespace
+
+from sqlalchemy import bindparam, delete, func, insert, select, text, tuple_
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from event_schema import CODE_EDIT, CODE_EDIT_ROLLUP, column_int
+from metrics import MetricsState, apply_row, edit_chars, is_linear_edit
+from models import CandidateTaskMetrics, Event
+
+logger = logging.getLogger(__name__)
+
+COMPACT_AFTER_DAYS = float(os.getenv("EVENT_COMPACT_AFTER_DAYS", "7"))
+ARCHIVE_DIR = os.getenv("EVENT_ARCHIVE_DIR", "./event_archive")
+INTERVAL_SECONDS = float(os.getenv("EVENT_COMPACTION_INTERVAL_SECONDS", "0"))
+# Candidate/task pairs compacted per transaction.
+PAIR_BATCH = 200
+# Row ids per DELETE statement, well under SQLite's bound-parameter limit.
+DELETE_CHUNK = 1000
+
+_COLUMNS = (
+    Event.id, Event.candidate_id, Event.task_id, Event.event_code, Event.timestamp, Event.chars_added,
+    Event.chars, Event.metadata_, Event.edit_count, Event.linear_edits, Event.ended_at,
+)
+
+
+class CompactionReport:
+    def __init__(self, cutoff: datetime, dry_run: bool, bytes_per_row: float, bytes_measured: bool):
+        self.cutoff = cutoff
+        self.dry_run = dry_run
+        self.pairs = 0
+        self.skipped_pairs = 0
+        self.runs = 0
+        self.events_rolled_up = 0
+        self.bytes_per_row = bytes_per_row
+        self.bytes_measured = bytes_measured
+        self.archive_path: str | None = None
+        self.archive_bytes = 0
+        self.seconds = 0.0
+
+    @property
+    def rows_reclaimed(self) -> int:
+        # Each run leaves one rollup row behind.
+        return self.events_rolled_up - self.runs
+
+    @property
+    def bytes_reclaimed(self) -> int:
+        return int(self.rows_reclaimed * self.bytes_per_row)
+
+    def report(self) -> str:
+        verb = "Would roll up" if self.dry_run else "Rolled up"
+        estimate = "" if self.bytes_measured else " (estimated from row contents)"
+        lines = [
+            f"{verb} {self.events_rolled_up:,} code_edit events older than {self.cutoff:%Y-%m-%d %H:%M} "
+            f"into {self.runs:,} rollup rows across {self.pairs:,} candidate/task pairs",
+            f"  rows reclaimed:  {self.rows_reclaimed:,}",
+            f"  bytes reclaimed: ~{self.bytes_reclaimed:,} at {self.bytes_per_row:.0f} bytes per row{estimate}",
+            f"  archive:         {self.archive_bytes:,} bytes gzipped"
+            + (f" in {self.archive_path}" if self.archive_path else ""),
+        ]
+        if self.skipped_pairs:
+            lines.append(f"  skipped {self.skipped_pairs} pairs whose metrics would have changed")
+        return "\n".join(lines)
+
+
+class _CountingWriter:
+    """File-like sink that counts the bytes written, passing them on to ``target`` if given."""
+
+    def __init__(self, target=None):
+        self.target = target
+        self.written = 0
+
+    def write(self, data: bytes) -> int:
+        self.written += len(data)
+        if self.target is not None:
+            self.target.write(data)
+        return len(data)
+
+    def flush(self):
+        if self.target is not None:
+            self.target.flush()
+
+
+def stored_bytes_per_event(db: Session) -> float | None:
+    """Average on-disk bytes of an events row, its share of the indexes included.
+
+    None when the database can't tell (SQLite built without dbstat, other backends).
+    """
+    rows = db.scalar(select(func.count()).select_from(Event))
+    if not rows:
+        return None
+    dialect = db.get_bind().dialect.name
+    try:
+        if dialect == "sqlite":
+            names = ["events", *(index.name for index in Event.__table__.indexes)]
+            size = db.scalar(
+                text("SELECT SUM(pgsize) FROM dbstat WHERE name IN :names").bindparams(bindparam("names", expanding=True)),
+                {"names": names},
+            )
+        elif dialect == "postgresql":
+            size = db.scalar(text("SELECT pg_total_relation_size('events')"))
+        else:
+            return None
+    except DBAPIError:
+        return None
+    return size / rows if size else None
+
+
+def _runs(events) -> list[list]:
+    """Runs of consecutive code_edit events worth rolling up, from one pair's
+    events in (timestamp, id) order.
+
+    A run never starts at the timestamp of the event before it: readers order
+    events by timestamp alone, so the rollup could otherwise sort ahead of it.
+    """
+    runs, current, previous = [], [], None
+    for e in events:
+        if e.event_code == CODE_EDIT and (current or previous is None or e.timestamp > previous.timestamp):
+            current.append(e)
+        else:
+            if len(current) > 1:
+                runs.append(current)
+            current = []
+        previous = e
+    if len(current) > 1:
+        runs.append(current)
+    return runs
+
+
+def _rollup(run) -> dict:
+    first, last = run[0], run[-1]
+    # A long run can add up to more than the 32-bit column holds; like any
+    # event value that doesn't fit, the total then stays in the JSON.
+    chars_added = sum(e.chars_added or 0 for e in run)
+    return {
+        "candidate_id": first.candidate_id,
+        "task_id": first.task_id,
+        "event_code": CODE_EDIT_ROLLUP,
+        "timestamp": first.timestamp,
+        "ended_at": last.timestamp,
+        "edit_count": len(run),
+        "linear_edits": sum(is_linear_edit(edit_chars(e.chars_added, e.metadata_)) for e in run),
+        # Net change and final length, for anyone reading the rollup itself.
+        "chars_added": column_int(chars_added),
+        "chars": last.chars,
+        "metadata_": None if column_int(chars_added) is not None else json.dumps({"chars_added": chars_added}),
+    }
+
+
+def _state(events) -> dict:
+    state = MetricsState()
+    for e in sorted(events, key=lambda e: e.timestamp):
+        apply_row(state, e)
+    return {name: getattr(state, name) for name in MetricsState.__slots__}
+
+
+def _archive_line(e) -> bytes:
+    return json.dumps({
+        "id": e.id,
+        "candidate_id": e.candidate_id,
+        "task_id": e.task_id,
+        "event_type": "code_edit",
+        "timestamp": e.timestamp.isoformat(),
+        "chars_added": e.chars_added,
+        "chars": e.chars,
+        "metadata": json.loads(e.metadata_) if e.metadata_ else None,
+    }).encode() + b"\n"
+
+
+def compact_events(db: Session, older_than: timedelta | None = None, archive_dir: str = ARCHIVE_DIR,
+                   dry_run: bool = False, now: datetime | None = None) -> CompactionReport:
+    """Roll up code_edit runs older than ``older_than`` (default
+    EVENT_COMPACT_AFTER_DAYS), archiving and deleting the raw rows.
+
+    Commits once per PAIR_BATCH pairs. An archive line is written before its
+    row is deleted, so a failed batch can leave rows both archived and in the
+    table (archive lines carry the row id for that reason).
+    """
+    start = time.perf_counter()
+    if older_than is None:
+        older_than = timedelta(days=COMPACT_AFTER_DAYS)
+    cutoff = (now or datetime.utcnow()) - older_than
+    bytes_per_row = stored_bytes_per_event(db)
+    report = CompactionReport(cutoff, dry_run, bytes_per_row or 0.0, bytes_per_row is not None)
+    # Pairs from the metrics summaries (one row per pair), each checked with a
+    # search of the events index rather than a scan of every old event.
+    summary = CandidateTaskMetrics
+    old_edits = select(Event.id).where(
+        Event.candidate_id == summary.candidate_id, Event.task_id == summary.task_id,
+        Event.timestamp < cutoff, Event.event_code == CODE_EDIT,
+    ).exists()
+    pairs = db.execute(
+        select(summary.candidate_id, summary.task_id)
+        .where(summary.first_event_at < cutoff, old_edits)
+        .order_by(summary.candidate_id, summary.task_id)
+    ).all()
+
+    file = sink = archive = None
+    estimated_bytes = 0
+    try:
+        for i in range(0, len(pairs), PAIR_BATCH):
+            events = db.execute(
+                select(*_COLUMNS)
+                .where(tuple_(Event.candidate_id, Event.task_id).in_(pairs[i:i + PAIR_BATCH]), Event.timestamp < cutoff)
+                .order_by(Event.candidate_id, Event.task_id, Event.timestamp, Event.id)
+            ).all()
+            rollups, rolled_ids, lines = [], [], []
+            for _, group in groupby(events, key=lambda e: (e.candidate_id, e.task_id)):
+                group = list(group)
+                runs = _runs(group)
+                if not runs:
+                    continue
+                ids = {e.id for run in runs for e in run}
+                pair_rollups = [_rollup(run) for run in runs]
+                kept = [e for e in group if e.id not in ids]
+                if _state(group) != _state(kept + [SimpleNamespace(**r) for r in pair_rollups]):
+                    logger.warning("Not compacting candidate %s task %s: metrics would change",
+                                   group[0].candidate_id, group[0].task_id)
+                    report.skipped_pairs += 1
+                    continue
+                report.pairs += 1
+                report.runs += len(runs)
+                report.events_rolled_up += len(ids)
+                rollups.extend(pair_rollups)
+                rolled_ids.extend(sorted(ids))
+                lines.extend(_archive_line(e) for run in runs for e in run)
+            if not rollups:
+                continue
+
+            if archive is None:
+                if not dry_run:
+                    os.makedirs(archive_dir, exist_ok=True)
+                    # Two runs can start in the same second; never reuse an archive.
+                    name = f"events-{datetime.utcnow():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}.jsonl.gz"
+                    report.archive_path = os.path.join(archive_dir, name)
+                    file = open(report.archive_path, "xb")
+                # A dry run compresses into the counter alone.
+                sink = _CountingWriter(file)
+                archive = gzip.GzipFile(fileobj=sink, mode="wb")
+            for line in lines:
+                archive.write(line)
+                # Rough size of the row in the table, used when the database can't say.
+                estimated_bytes += len(line)
+            if dry_run:
+                continue
+            archive.flush()
+            os.fsync(file.fileno())
+            for j in range(0, len(rolled_ids), DELETE_CHUNK):
+                db.execute(delete(Event).where(Event.id.in_(rolled_ids[j:j + DELETE_CHUNK])))
+            db.execute(insert(Event), rollups)
+            db.commit()
+    finally:
+        if archive is not None:
+            archive.close()
+        if file is not None:
+            file.close()
+
+    if sink is not None:
+        report.archive_bytes = sink.written
+    if not report.bytes_measured and report.events_rolled_up:
+        report.bytes_per_row = estimated_bytes / report.events_rolled_up
+    report.seconds = time.perf_counter() - start
+    return report
+
+
+class CompactionJob:
+    """Runs compact_events every ``interval_seconds`` on a background thread (0 disables it)."""
+
+    def __init__(self, interval_seconds: float = INTERVAL_SECONDS):
+        self.interval_seconds = interval_seconds
+        self._stopping = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def run_once(self) -> CompactionReport:
+        db = SessionLocal()
+        try:
+            return compact_events(db)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _run(self):
+        while not self._stopping.wait(self.interval_seconds):
+            try:
+                report = self.run_once()
+                if report.events_rolled_up:
+                    logger.info(report.report())
+            except Exception:
+                logger.exception("Event compaction failed")
+
+    def start(self):
+        if self.interval_seconds > 0 and self._thread is None:
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="event-compaction", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+compaction_job = CompactionJob()
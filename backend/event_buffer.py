@@ -0,0 +1,145 @@
+"""Write-behind buffer for telemetry events.
+
+Events are queued in memory and written in bulk by a background thread, either
+every EVENT_BUFFER_FLUSH_SECONDS or as soon as EVENT_BUFFER_MAX_SIZE rows are
+waiting, so a burst of keystrokes costs one transaction instead of one each.
+"""
+import logging
+import os
+import threading
+from typing import Any
+
+from sqlalchemy import insert
+from sqlalchemy.exc import DisconnectionError, InterfaceError, OperationalError
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from event_schema import encode_rows
+from instrumentation import db_commit_seconds, events_rejected, events_written
+from metrics_store import update_metrics
+from models import Event
+
+logger = logging.getLogger(__name__)
+
+MAX_SIZE = int(os.getenv("EVENT_BUFFER_MAX_SIZE", "500"))
+FLUSH_SECONDS = float(os.getenv("EVENT_BUFFER_FLUSH_SECONDS", "1.0"))
+# Failures that say nothing about the rows themselves (database down, locked,
+# connection dropped); the batch is kept and retried on the next flush.
+TRANSIENT_ERRORS = (OperationalError, InterfaceError, DisconnectionError)
+
+
+def store_events(db: Session, rows: list[dict[str, Any]]):
+    """Bulk-insert event rows (one executemany) and fold them into the
+    candidate_task_metrics summaries, inside the caller's transaction.
+
+    Rows may name their type with ``event_type``; it is swapped for the
+    ``event_code`` column here.
+    """
+    if rows:
+        encode_rows(db, rows)
+        db.execute(insert(Event), rows)
+        update_metrics(db, rows)
+
+
+class EventBuffer:
+    def __init__(self, max_size: int = MAX_SIZE, flush_seconds: float = FLUSH_SECONDS):
+        self.max_size = max_size
+        self.flush_seconds = flush_seconds
+        self._rows: list[dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = False
+        self._thread: threading.Thread | None = None
+
+    def add(self, rows: list[dict[str, Any]]):
+        with self._lock:
+            self._rows.extend(rows)
+            full = len(self._rows) >= self.max_size
+        if full:
+            self._wake.set()
+
+    def flush(self):
+        """Write everything queued so far; safe to call from any thread.
+
+        A batch the database rejects is split in halves until the offending
+        rows are isolated; those are logged and dropped so they can't hold up
+        the rest. Connection problems put the unwritten rows back and raise.
+        """
+        with self._flush_lock:
+            with self._lock:
+                rows, self._rows = self._rows, []
+            # Chunks still to write; the next one is at the end.
+            pending = [rows] if rows else []
+            try:
+                while pending:
+                    chunk = pending.pop()
+                    try:
+                        self._store(chunk)
+                    except TRANSIENT_ERRORS:
+                        pending.append(chunk)
+                        raise
+                    except Exception:
+                        if len(chunk) > 1:
+                            middle = len(chunk) // 2
+                            pending += [chunk[middle:], chunk[:middle]]
+                        else:
+                            logger.exception("Dropping an event the database rejected: %r", chunk[0])
+                            events_rejected.inc()
+            except TRANSIENT_ERRORS:
+                with self._lock:
+                    self._rows[:0] = [row for chunk in reversed(pending) for row in chunk]
+                raise
+
+    def try_flush(self) -> bool:
+        """flush() for readers that want buffered events included: a failure
+        is logged rather than raised, as slightly stale data beats an error."""
+        try:
+            self.flush()
+            return True
+        except Exception:
+            logger.exception("Failed to flush buffered events before a read")
+            return False
+
+    def _store(self, rows: list[dict[str, Any]]):
+        db = SessionLocal()
+        try:
+            # New event types are registered (and committed) first, so a
+            # rejected batch can't roll back a code that is already cached.
+            encode_rows(db, rows)
+            db.commit()
+            with db_commit_seconds.time(operation="event_flush"):
+                store_events(db, rows)
+                db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        events_written.inc(len(rows))
+
+    def _run(self):
+        while not self._stopping:
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Failed to flush %d buffered events", len(self._rows))
+
+    def start(self):
+        if self._thread is None:
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="event-buffer", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopping = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+
+event_buffer = EventBuffer()
@@ -0,0 +1,191 @@
+"""Compact storage format for telemetry events.
+
+Events are stored with a small-integer ``event_code`` (names live in the
+event_types lookup table), the hot numeric payload fields ``chars_added`` and
+``chars`` as their own columns, and JSON in ``metadata_`` only for what is left
+over, such as AI prompts and paste previews. Metrics read the integer columns
+and never parse JSON.
+
+The built-in event types have fixed codes. Any other type a client sends is
+added to event_types the first time it is stored, with a code from
+DYNAMIC_CODES_START up so built-in types can still be added below it. At most
+EVENT_MAX_DYNAMIC_TYPES such types are registered; events of further new
+types are rejected when the buffer writes them.
+"""
+import json
+import math
+import os
+import threading
+from typing import Any
+
+from sqlalchemy import MetaData, Table, func, insert, inspect, select, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from models import Event, EventType
+
+EVENT_TYPES = (
+    "task_started", "code_edit", "code_run", "ai_used",
+    "tab_hidden", "tab_visible", "large_paste", "task_submitted",
+    # Written by compaction in place of a run of code_edit rows.
+    "code_edit_rollup",
+)
+# Stored in every event row; never renumber these, only append.
+EVENT_CODES = {name: code for code, name in enumerate(EVENT_TYPES, start=1)}
+(TASK_STARTED, CODE_EDIT, CODE_RUN, AI_USED, TAB_HIDDEN, TAB_VISIBLE, LARGE_PASTE, TASK_SUBMITTED,
+ CODE_EDIT_ROLLUP) = (EVENT_CODES[name] for name in EVENT_TYPES)
+DYNAMIC_CODES_START = 1000
+MAX_DYNAMIC_TYPES = int(os.getenv("EVENT_MAX_DYNAMIC_TYPES", "100"))
+# Payload integers must fit a 32-bit Integer column on every backend.
+INT_MIN, INT_MAX = -2**31, 2**31 - 1
+# Payload keys with their own integer columns.
+NUMERIC_FIELDS = ("chars_added", "chars")
+# Legacy rows copied per round trip by migrate_events.
+MIGRATION_BATCH = 10000
+
+_codes = dict(EVENT_CODES)
+_lock = threading.Lock()
+
+
+def column_int(value: Any) -> int | None:
+    """``value`` as a numeric column value, or None unless it is a whole number
+    in the column's range (5.0 fits, 5.5 doesn't)."""
+    if not isinstance(value, (int, float)) or isinstance(value, bool):
+        return None
+    if isinstance(value, float) and not (math.isfinite(value) and value.is_integer()):
+        return None
+    return int(value) if INT_MIN <= value <= INT_MAX else None
+
+
+def split_metadata(metadata: dict[str, Any] | None) -> dict[str, Any]:
+    """Column values for an event payload: the numeric fields as integers and
+    everything else as JSON text (or None when nothing is left). Numeric fields
+    the columns can't hold exactly stay in the JSON as they were sent."""
+    values = {"chars_added": None, "chars": None, "metadata_": None}
+    if not metadata:
+        return values
+    rest = dict(metadata)
+    for field in NUMERIC_FIELDS:
+        value = column_int(rest.get(field))
+        if value is not None:
+            values[field] = value
+            del rest[field]
+    if rest:
+        values["metadata_"] = json.dumps(rest)
+    return values
+
+
+def seed_event_types(conn):
+    """Make sure every built-in type is in event_types."""
+    present = set(conn.scalars(select(EventType.id)))
+    missing = [{"id": code, "name": name} for name, code in EVENT_CODES.items() if code not in present]
+    if missing:
+        conn.execute(insert(EventType), missing)
+
+
+class TooManyEventTypes(ValueError):
+    pass
+
+
+def _register(db: Session | Connection, name: str, capped: bool) -> int:
+    while True:
+        code = db.scalar(select(EventType.id).where(EventType.name == name))
+        if code is not None:
+            return code
+        if capped:
+            registered = db.scalar(select(func.count()).where(EventType.id >= DYNAMIC_CODES_START))
+            if registered >= MAX_DYNAMIC_TYPES:
+                raise TooManyEventTypes(f"Not registering event type {name!r}: {registered} custom types already exist")
+        highest = db.scalar(select(EventType.id).order_by(EventType.id.desc()).limit(1)) or 0
+        code = max(highest + 1, DYNAMIC_CODES_START)
+        try:
+            with db.begin_nested():
+                db.execute(insert(EventType).values(id=code, name=name))
+            return code
+        except IntegrityError:
+            # Another process registered the name or took the code first; look again.
+            continue
+
+
+def event_code(db: Session | Connection, name: str, capped: bool = True) -> int:
+    """The code for an event type name, registering the name if it's new.
+
+    Raises TooManyEventTypes when MAX_DYNAMIC_TYPES are registered already,
+    unless ``capped`` is false (migrating existing rows).
+    """
+    code = _codes.get(name)
+    if code is None:
+        code = _register(db, name, capped)
+        with _lock:
+            _codes[name] = code
+    return code
+
+
+def encode_rows(db: Session | Connection, rows: list[dict[str, Any]]):
+    """Replace the ``event_type`` name in each row with its ``event_code``, in place."""
+    for row in rows:
+        if "event_type" in row:
+            row["event_code"] = event_code(db, row["event_type"])
+            del row["event_type"]
+
+
+def _legacy_row(row, codes: dict[str, int]) -> dict[str, Any]:
+    try:
+        metadata = json.loads(row.metadata_) if row.metadata_ else None
+    except ValueError:
+        metadata = None
+    values = split_metadata(metadata if isinstance(metadata, dict) else None)
+    if row.metadata_ and values["metadata_"] is None and not isinstance(metadata, dict):
+        # Keep payloads that weren't JSON objects as they were.
+        values["metadata_"] = row.metadata_
+    return {
+        "id": row.id, "candidate_id": row.candidate_id, "task_id": row.task_id,
+        "event_code": codes[row.event_type], "timestamp": row.timestamp, **values,
+    }
+
+
+def migrate_events(bind) -> int:
+    """Rewrite an events table from the old layout (event_type text, all
+    payload in metadata_ JSON) into the compact one; returns rows migrated.
+
+    The table is rebuilt rather than altered, so the old columns go away.
+    SQLite only returns the freed space to the file system after a VACUUM.
+    """
+    existing = inspect(bind)
+    if not existing.has_table("events"):
+        return 0
+    columns = {column["name"] for column in existing.get_columns("events")}
+    if "event_type" not in columns or "event_code" in columns:
+        return 0
+
+    migrated = 0
+    with bind.begin() as conn:
+        EventType.__table__.create(conn, checkfirst=True)
+        seed_event_types(conn)
+        legacy = Table("events", MetaData(), autoload_with=conn)
+        codes = {name: event_code(conn, name, capped=False) for name in conn.scalars(select(legacy.c.event_type).distinct())}
+
+        # The copy needs the tables its foreign keys point at in its metadata.
+        scratch = MetaData()
+        for referenced in {fk.column.table for fk in Event.__table__.foreign_keys}:
+            referenced.to_metadata(scratch)
+        new = Event.__table__.to_metadata(scratch, name="events_new")
+        # Indexes are created under their real names once the table is renamed.
+        new.indexes.clear()
+        new.create(conn)
+        last_id = 0
+        while True:
+            batch = conn.execute(select(legacy).where(legacy.c.id > last_id).order_by(legacy.c.id).limit(MIGRATION_BATCH)).all()
+            if not batch:
+                break
+            conn.execute(insert(new), [_legacy_row(row, codes) for row in batch])
+            last_id = batch[-1].id
+            migrated += len(batch)
+
+        legacy.drop(conn)
+        conn.execute(text("ALTER TABLE events_new RENAME TO events"))
+        if conn.dialect.name == "postgresql":
+            # Rows were copied with their ids; move the id sequence past them.
+            conn.execute(text("SELECT setval(pg_get_serial_sequence('events', 'id'), COALESCE(MAX(id), 1)) FROM events"))
+    return migrated
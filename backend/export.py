@@ -0,0 +1,337 @@
+"""Streaming exports of candidates, per-task metrics and raw events.
+
+Rows are read through server-side cursors (``yield_per``) and encoded as they
+arrive, so memory stays flat however large the cohort is. Each dataset can be
+written as NDJSON, CSV, Parquet or an Arrow IPC stream; the columnar formats
+need pyarrow, which is optional. Used by the /export endpoints and by
+``python manage.py export``.
+"""
+import csv
+import io
+import json
+from datetime import datetime, timezone
+from typing import Any, Callable, Iterable, Iterator, NamedTuple
+
+from sqlalchemy import and_, case, func, select, tuple_
+from sqlalchemy.orm import Session, aliased
+
+from database import SessionLocal
+from metrics import generate_conclusion, generate_insight, metrics_from_state
+from models import Candidate, CandidateTaskMetrics, Event, EventType, Submission, Task
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+# Rows fetched per round trip from the database cursor.
+FETCH_SIZE = 2000
+# Text formats are sent in pieces of about this many bytes.
+CHUNK_BYTES = 64 * 1024
+# Rows per Parquet row group / Arrow record batch.
+COLUMNAR_BATCH = 10000
+
+FORMATS = ("ndjson", "csv", "parquet", "arrow")
+COLUMNAR_FORMATS = ("parquet", "arrow")
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+EXTENSIONS = {"ndjson": "ndjson", "csv": "csv", "parquet": "parquet", "arrow": "arrows"}
+
+
+class ExportFilters(NamedTuple):
+    task_id: int | None = None
+    # Activity window: events in [since, until), or pairs active in it.
+    since: datetime | None = None
+    until: datetime | None = None
+    submitted: bool | None = None
+
+
+def _naive_utc(value: datetime | None) -> datetime | None:
+    """Timestamps are stored as naive UTC; convert aware filter values to match."""
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+class Dataset(NamedTuple):
+    # (name, type) with type one of int, float, bool, str, datetime
+    columns: tuple[tuple[str, str], ...]
+    rows: Callable[[Session, ExportFilters], Iterable[dict[str, Any]]]
+
+
+def _has_submission(candidate_id, task_id):
+    # Aliased so it doesn't correlate with a Submission joined by the outer query.
+    submission = aliased(Submission)
+    return select(submission.id).where(submission.candidate_id == candidate_id, submission.task_id == task_id).exists()
+
+
+def _pair_conditions(filters: ExportFilters) -> list:
+    summary = CandidateTaskMetrics
+    conditions = []
+    if filters.task_id is not None:
+        conditions.append(summary.task_id == filters.task_id)
+    if filters.since is not None:
+        conditions.append(summary.last_event_at >= _naive_utc(filters.since))
+    if filters.until is not None:
+        conditions.append(summary.first_event_at < _naive_utc(filters.until))
+    if filters.submitted is not None:
+        has_submission = _has_submission(summary.candidate_id, summary.task_id)
+        conditions.append(has_submission if filters.submitted else ~has_submission)
+    return conditions
+
+
+def _stream(db: Session, query):
+    return db.execute(query.execution_options(yield_per=FETCH_SIZE))
+
+
+METRIC_FIELDS = (
+    ("total_time_seconds", "float"), ("edit_count", "int"), ("run_count", "int"), ("refine_cycles", "int"),
+    ("edits_per_run", "float"), ("linear_typing_ratio", "float"), ("linear_typing_edits", "int"),
+    ("ai_usage_count", "int"), ("context_switch_seconds", "float"), ("large_paste_count", "int"),
+)
+
+
+def _metrics_rows(db: Session, filters: ExportFilters) -> Iterator[dict[str, Any]]:
+    summary = CandidateTaskMetrics
+    # Looked up per pair, so a filtered export doesn't group every submission.
+    submission = aliased(Submission)
+    latest = (
+        select(func.max(submission.id))
+        .where(submission.candidate_id == summary.candidate_id, submission.task_id == summary.task_id)
+        .scalar_subquery()
+    )
+    query = (
+        select(summary, Candidate.email, Task.title, Submission.tests_passed, Submission.tests_total,
+               Submission.created_at.label("submitted_at"))
+        .join(Candidate, Candidate.id == summary.candidate_id)
+        .join(Task, Task.id == summary.task_id)
+        .outerjoin(Submission, and_(
+            Submission.candidate_id == summary.candidate_id,
+            Submission.task_id == summary.task_id,
+            Submission.id == latest,
+        ))
+        .where(*_pair_conditions(filters))
+        .order_by(summary.candidate_id, summary.task_id)
+    )
+    for row in _stream(db, query):
+        state = row.CandidateTaskMetrics
+        metrics = metrics_from_state(state)
+        yield {
+            "candidate_id": state.candidate_id,
+            "email": row.email,
+            "task_id": state.task_id,
+            "task_title": row.title,
+            "submitted": row.submitted_at is not None,
+            "submitted_at": row.submitted_at,
+            "tests_passed": row.tests_passed,
+            "tests_total": row.tests_total,
+            "first_event_at": state.first_event_at,
+            "last_event_at": state.last_event_at,
+            **metrics,
+            "insight": generate_insight(metrics),
+            "conclusion": generate_conclusion(metrics, row.email, row.title),
+        }
+
+
+def _candidate_rows(db: Session, filters: ExportFilters) -> Iterator[dict[str, Any]]:
+    summary = CandidateTaskMetrics
+    submitted = _has_submission(summary.candidate_id, summary.task_id)
+    pairs = (
+        select(
+            summary.candidate_id,
+            func.count().label("tasks_started"),
+            func.sum(case((submitted, 1), else_=0)).label("tasks_submitted"),
+            func.min(summary.first_event_at).label("first_event_at"),
+            func.max(summary.last_event_at).label("last_event_at"),
+        )
+        .where(*_pair_conditions(filters))
+        .group_by(summary.candidate_id)
+        .subquery()
+    )
+    query = (
+        select(Candidate.id, Candidate.email, Candidate.created_at, pairs.c.tasks_started, pairs.c.tasks_submitted,
+               pairs.c.first_event_at, pairs.c.last_event_at)
+        .join(pairs, pairs.c.candidate_id == Candidate.id)
+        .order_by(Candidate.id)
+    )
+    for row in _stream(db, query):
+        yield {
+            "candidate_id": row.id,
+            "email": row.email,
+            "signed_up_at": row.created_at,
+            "tasks_started": row.tasks_started,
+            "tasks_submitted": row.tasks_submitted or 0,
+            "first_event_at": row.first_event_at,
+            "last_event_at": row.last_event_at,
+        }
+
+
+def _event_rows(db: Session, filters: ExportFilters) -> Iterator[dict[str, Any]]:
+    names = dict(db.execute(select(EventType.id, EventType.name)).all())
+    query = select(
+        Event.id, Event.candidate_id, Event.task_id, Event.event_code, Event.timestamp, Event.chars_added,
+        Event.chars, Event.edit_count, Event.linear_edits, Event.ended_at, Event.metadata_,
+    )
+    if filters != ExportFilters():
+        # Matching pairs come from the summaries, so the events index on
+        # (candidate_id, task_id, timestamp) is searched instead of the table.
+        summary = CandidateTaskMetrics
+        pairs = select(summary.candidate_id, summary.task_id).where(*_pair_conditions(filters))
+        query = query.where(tuple_(Event.candidate_id, Event.task_id).in_(pairs))
+    if filters.since is not None:
+        query = query.where(Event.timestamp >= _naive_utc(filters.since))
+    if filters.until is not None:
+        query = query.where(Event.timestamp < _naive_utc(filters.until))
+    for e in _stream(db, query.order_by(Event.id)):
+        yield {
+            "id": e.id,
+            "candidate_id": e.candidate_id,
+            "task_id": e.task_id,
+            "event_type": names.get(e.event_code, str(e.event_code)),
+            "timestamp": e.timestamp,
+            "chars_added": e.chars_added,
+            "chars": e.chars,
+            "edit_count": e.edit_count,
+            "linear_edits": e.linear_edits,
+            "ended_at": e.ended_at,
+            "metadata": e.metadata_,
+        }
+
+
+DATASETS = {
+    "candidates": Dataset(
+        (("candidate_id", "int"), ("email", "str"), ("signed_up_at", "datetime"), ("tasks_started", "int"),
+         ("tasks_submitted", "int"), ("first_event_at", "datetime"), ("last_event_at", "datetime")),
+        _candidate_rows,
+    ),
+    "metrics": Dataset(
+        (("candidate_id", "int"), ("email", "str"), ("task_id", "int"), ("task_title", "str"), ("submitted", "bool"),
+         ("submitted_at", "datetime"), ("tests_passed", "int"), ("tests_total", "int"),
+         ("first_event_at", "datetime"), ("last_event_at", "datetime"),
+         *METRIC_FIELDS, ("insight", "str"), ("conclusion", "str")),
+        _metrics_rows,
+    ),
+    "events": Dataset(
+        (("id", "int"), ("candidate_id", "int"), ("task_id", "int"), ("event_type", "str"),
+         ("timestamp", "datetime"), ("chars_added", "int"), ("chars", "int"), ("edit_count", "int"),
+         ("linear_edits", "int"), ("ended_at", "datetime"), ("metadata", "str")),
+        _event_rows,
+    ),
+}
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _ndjson(rows: Iterable[dict], columns) -> Iterator[bytes]:
+    lines, size = [], 0
+    for row in rows:
+        line = json.dumps(row, default=_json_default, ensure_ascii=False) + "\n"
+        lines.append(line)
+        size += len(line)
+        if size >= CHUNK_BYTES:
+            yield "".join(lines).encode()
+            lines, size = [], 0
+    if lines:
+        yield "".join(lines).encode()
+
+
+def _csv(rows: Iterable[dict], columns) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(name for name, _ in columns)
+    for row in rows:
+        values = (row[name] for name, _ in columns)
+        writer.writerow(value.isoformat() if isinstance(value, datetime) else value for value in values)
+        if buffer.tell() >= CHUNK_BYTES:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+class _Chunks:
+    """Write-only file object that collects what pyarrow writes until drained."""
+
+    closed = False
+
+    def __init__(self):
+        self._parts: list[bytes] = []
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data, self._parts = b"".join(self._parts), []
+        return data
+
+
+def _arrow_schema(columns):
+    types = {"int": pa.int64(), "float": pa.float64(), "bool": pa.bool_(), "str": pa.string(),
+             "datetime": pa.timestamp("us")}
+    return pa.schema([(name, types[kind]) for name, kind in columns])
+
+
+def _columnar(rows: Iterable[dict], columns, fmt: str) -> Iterator[bytes]:
+    schema = _arrow_schema(columns)
+    sink = _Chunks()
+    stream = pa.PythonFile(sink, mode="w")
+    writer = pq.ParquetWriter(stream, schema) if fmt == "parquet" else pa.ipc.new_stream(stream, schema)
+    batch = []
+
+    def write():
+        writer.write_batch(pa.RecordBatch.from_pylist(batch, schema=schema))
+        batch.clear()
+        return sink.drain()
+
+    try:
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= COLUMNAR_BATCH:
+                yield write()
+        if batch:
+            yield write()
+    finally:
+        # Parquet's footer (or Arrow's end-of-stream marker) is written on close.
+        writer.close()
+    yield sink.drain()
+
+
+def columnar_available() -> bool:
+    return pa is not None
+
+
+def export(dataset: str, fmt: str, filters: ExportFilters = ExportFilters(),
+           session_factory: Callable[[], Session] = SessionLocal) -> Iterator[bytes]:
+    """The encoded export, in pieces; opens (and closes) its own session so it
+    can outlive the request that started it."""
+    if fmt in COLUMNAR_FORMATS and not columnar_available():
+        raise RuntimeError(f"{fmt} exports need pyarrow (pip install pyarrow)")
+    spec = DATASETS[dataset]
+    db = session_factory()
+    try:
+        rows = spec.rows(db, filters)
+        if fmt == "ndjson":
+            yield from _ndjson(rows, spec.columns)
+        elif fmt == "csv":
+            yield from _csv(rows, spec.columns)
+        else:
+            yield from _columnar(rows, spec.columns, fmt)
+    finally:
+        db.close()
@@ -0,0 +1,282 @@
+"""Durable grading queue for submissions.
+
+POST /submit stores the submission and a grading_jobs row in one transaction
+and returns straight away; workers claim queued jobs, run the tests and write
+the results back to the submission. Clients poll GET /grading/jobs/{id} or
+follow its server-sent events.
+
+The queue is the database, so workers can run in the API process
+(GRADING_WORKERS threads each) or on their own with ``python manage.py
+grading-worker``, on any machine that reaches the database. A job is claimed
+with one conditional UPDATE (``FOR UPDATE SKIP LOCKED`` on PostgreSQL), which
+takes a lease of GRADING_LEASE_SECONDS. A worker that dies leaves its lease to
+expire and the job is claimed again, up to GRADING_MAX_ATTEMPTS times. Results
+are only written by the worker still holding the lease, and there is one job
+per submission, so every submission is graded once.
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import threading
+from datetime import datetime, timedelta
+from typing import Any
+
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from instrumentation import db_commit_seconds, grading_jobs_finished, grading_queue_seconds
+from models import GradingJob, Submission
+from runner import run_tests
+
+logger = logging.getLogger(__name__)
+
+# Worker threads started with the API; 0 leaves grading to `manage.py grading-worker`.
+WORKERS = int(os.getenv("GRADING_WORKERS", "2"))
+# How long a claimed job is reserved before another worker may take it over.
+# Comfortably above the runner's own timeout.
+LEASE_SECONDS = float(os.getenv("GRADING_LEASE_SECONDS", "60"))
+MAX_ATTEMPTS = int(os.getenv("GRADING_MAX_ATTEMPTS", "3"))
+# How often idle workers look for jobs, and how often push streams re-read a
+# job that is graded in another process.
+POLL_SECONDS = float(os.getenv("GRADING_POLL_SECONDS", "0.5"))
+
+FINISHED = ("done", "failed")
+
+
+def enqueue(db: Session, candidate_id: int, task_id: int, final_code: str | None, reflection: str | None,
+            idempotency_key: str | None = None) -> tuple[int, bool]:
+    """Store a submission and its grading job; returns (job id, created).
+
+    With an idempotency key already used by this candidate, nothing is stored
+    and the original job is returned instead.
+    """
+    if idempotency_key:
+        job_id = _job_for_key(db, candidate_id, idempotency_key)
+        if job_id is not None:
+            return job_id, False
+    submission = Submission(
+        candidate_id=candidate_id,
+        task_id=task_id,
+        final_code=final_code,
+        reflection=reflection,
+        idempotency_key=idempotency_key,
+    )
+    db.add(submission)
+    try:
+        db.flush()
+        job = GradingJob(submission_id=submission.id)
+        db.add(job)
+        with db_commit_seconds.time(operation="submission"):
+            db.commit()
+    except IntegrityError:
+        # A concurrent retry with the same key got there first.
+        db.rollback()
+        job_id = _job_for_key(db, candidate_id, idempotency_key) if idempotency_key else None
+        if job_id is None:
+            raise
+        return job_id, False
+    return job.id, True
+
+
+def _job_for_key(db: Session, candidate_id: int, idempotency_key: str) -> int | None:
+    return db.scalar(
+        select(GradingJob.id)
+        .join(Submission, Submission.id == GradingJob.submission_id)
+        .where(Submission.candidate_id == candidate_id, Submission.idempotency_key == idempotency_key)
+    )
+
+
+def job_result(db: Session, job_id: int) -> dict[str, Any] | None:
+    """The job's status and, once done, the test results; None if there is no such job."""
+    row = db.execute(
+        select(GradingJob.id, GradingJob.submission_id, GradingJob.status, GradingJob.attempts, GradingJob.error,
+               Submission.tests_passed, Submission.tests_total, Submission.test_results)
+        .join(Submission, Submission.id == GradingJob.submission_id)
+        .where(GradingJob.id == job_id)
+    ).one_or_none()
+    if row is None:
+        return None
+    return {
+        "job_id": row.id,
+        "submission_id": row.submission_id,
+        "status": row.status,
+        "attempts": row.attempts,
+        "tests_passed": row.tests_passed,
+        "tests_total": row.tests_total,
+        "run_error": row.error,
+        "results": json.loads(row.test_results) if row.test_results else [],
+    }
+
+
+def _expired(now: datetime):
+    return and_(GradingJob.status == "running", GradingJob.locked_until < now)
+
+
+def claim_job(db: Session, worker: str, now: datetime | None = None) -> int | None:
+    """Take the oldest queued job (or one whose lease ran out) for ``worker``.
+
+    Jobs whose lease ran out MAX_ATTEMPTS times are failed instead.
+    """
+    now = now or datetime.utcnow()
+    gave_up = db.execute(
+        update(GradingJob)
+        .where(_expired(now), GradingJob.attempts >= MAX_ATTEMPTS)
+        .values(status="failed", finished_at=now, locked_until=None,
+                error=f"Grading did not finish after {MAX_ATTEMPTS} attempts")
+        .returning(GradingJob.id)
+    ).scalars().all()
+    claimable = or_(GradingJob.status == "queued", _expired(now))
+    # The subquery and the update run as one statement, so two workers can't
+    # both see the same job as free.
+    oldest = (
+        select(GradingJob.id)
+        .where(claimable)
+        .order_by(GradingJob.id)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    claimed = db.execute(
+        update(GradingJob)
+        .where(GradingJob.id == oldest, claimable)
+        .values(status="running", worker=worker, attempts=GradingJob.attempts + 1,
+                locked_until=now + timedelta(seconds=LEASE_SECONDS), started_at=now)
+        .returning(GradingJob.id, GradingJob.created_at)
+    ).one_or_none()
+    db.commit()
+    for job_id in gave_up:
+        grading_jobs_finished.inc(outcome="failed")
+        _notify(job_id)
+    if claimed is None:
+        return None
+    grading_queue_seconds.observe((now - claimed.created_at).total_seconds())
+    _notify(claimed.id)
+    return claimed.id
+
+
+def grade(db: Session, job_id: int, worker: str) -> bool:
+    """Run a claimed job's tests and store the results.
+
+    Returns False if the lease was lost meanwhile, in which case the results
+    are dropped and whoever took the job over writes theirs.
+    """
+    submission = db.execute(
+        select(Submission.id, Submission.task_id, Submission.final_code)
+        .join(GradingJob, GradingJob.submission_id == Submission.id)
+        .where(GradingJob.id == job_id)
+    ).one()
+    # Don't hold a transaction open while the tests run.
+    db.commit()
+    result = run_tests(submission.task_id, submission.final_code or "")
+
+    finished = db.execute(
+        update(GradingJob)
+        .where(GradingJob.id == job_id, GradingJob.status == "running", GradingJob.worker == worker)
+        .values(status="done", finished_at=datetime.utcnow(), locked_until=None, error=result.get("run_error"))
+    ).rowcount
+    if not finished:
+        db.rollback()
+        return False
+    db.execute(
+        update(Submission)
+        .where(Submission.id == submission.id)
+        .values(tests_passed=result.get("tests_passed", 0), tests_total=result.get("tests_total", 0),
+                test_results=json.dumps(result.get("results", [])))
+    )
+    with db_commit_seconds.time(operation="grading"):
+        db.commit()
+    grading_jobs_finished.inc(outcome="done")
+    _notify(job_id)
+    return True
+
+
+def work_once(worker: str) -> bool:
+    """Claim and grade one job; False when the queue was empty."""
+    db = SessionLocal()
+    try:
+        job_id = claim_job(db, worker)
+        if job_id is None:
+            return False
+        grade(db, job_id, worker)
+        return True
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+class GradingWorkers:
+    """``count`` threads pulling jobs off the queue until stopped (0 disables them)."""
+
+    def __init__(self, count: int = WORKERS, poll_seconds: float = POLL_SECONDS):
+        self.count = count
+        self.poll_seconds = poll_seconds
+        self._stopping = threading.Event()
+        self._threads: list[threading.Thread] = []
+
+    def _run(self, worker: str):
+        while not self._stopping.is_set():
+            try:
+                busy = work_once(worker)
+            except Exception:
+                logger.exception("Grading worker %s failed", worker)
+                busy = False
+            if not busy:
+                self._stopping.wait(self.poll_seconds)
+
+    def start(self):
+        if self._threads:
+            return
+        self._stopping.clear()
+        prefix = f"{socket.gethostname()}:{os.getpid()}"
+        for i in range(self.count):
+            thread = threading.Thread(target=self._run, args=(f"{prefix}:{i}",), name=f"grading-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """Wait for in-flight jobs to finish; queued ones stay queued."""
+        self._stopping.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+
+grading_workers = GradingWorkers()
+
+
+# Push streams in this process wait here for the local workers to move a job
+# along; jobs graded elsewhere are noticed by re-reading every POLL_SECONDS.
+_waiters: dict[int, set[tuple[asyncio.AbstractEventLoop, asyncio.Event]]] = {}
+_waiters_lock = threading.Lock()
+
+
+def _notify(job_id: int):
+    with _waiters_lock:
+        waiters = _waiters.pop(job_id, ())
+    for loop, changed in waiters:
+        loop.call_soon_threadsafe(changed.set)
+
+
+async def wait_for_change(job_id: int, timeout: float = POLL_SECONDS):
+    """Return when a local worker updates the job, or after ``timeout``."""
+    changed = asyncio.Event()
+    waiter = (asyncio.get_running_loop(), changed)
+    with _waiters_lock:
+        _waiters.setdefault(job_id, set()).add(waiter)
+    try:
+        await asyncio.wait_for(changed.wait(), timeout)
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        with _waiters_lock:
+            waiters = _waiters.get(job_id)
+            if waiters is not None:
+                waiters.discard(waiter)
+                if not waiters:
+                    del _waiters[job_id]
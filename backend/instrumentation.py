@@ -0,0 +1,218 @@
+"""Prometheus-style counters and histograms for the API's hot paths.
+
+Metrics live in process memory and are rendered in the Prometheus text
+exposition format by GET /metrics. Recording one observation is a dict lookup
+and a few additions under a lock, and nothing at all with METRICS_ENABLED=false.
+With several uvicorn worker processes, each reports its own numbers.
+"""
+import bisect
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Seconds; from a cached lookup (well under a millisecond) to a slow AI reply.
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels: dict[str, str]) -> tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str):
+        if not ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> Iterator[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_labels(self.labelnames, key)} {_number(value)}"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts (last is +Inf), sum, count]
+        self._series: dict[tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels: str):
+        if not ENABLED:
+            return
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels: str):
+        """Observe how long the block takes, whether or not it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def timed(self, **labels: str):
+        """Decorator form of time()."""
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.time(**labels):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def count(self, **labels: str) -> int:
+        series = self._series.get(self._key(labels))
+        return series[2] if series else 0
+
+    def _samples(self) -> Iterator[str]:
+        with self._lock:
+            items = sorted((key, ([*s[0]], s[1], s[2])) for key, s in self._series.items())
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip((*self.buckets, float("inf")), counts):
+                cumulative += n
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{_number(bound)}"'
+                yield f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}"
+            yield f"{self.name}_count{_labels(self.labelnames, key)} {count}"
+
+
+REGISTRY: list[_Metric] = []
+
+
+def render() -> str:
+    """Every registered metric in the Prometheus text format."""
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+
+http_request_seconds = Histogram(
+    "http_request_duration_seconds", "Time to answer an HTTP request, by route template.",
+    ("method", "route", "status"),
+)
+db_commit_seconds = Histogram("db_commit_duration_seconds", "Time spent in database commits.", ("operation",))
+events_written = Counter("events_written_total", "Telemetry events written to the database.")
+events_rejected = Counter("events_rejected_total", "Telemetry events dropped because the database rejected them.")
+events_received = Counter(
+    "events_received_total", "Telemetry events accepted, by transport (http, websocket).", ("transport",),
+)
+runner_spawn_seconds = Histogram(
+    "runner_spawn_duration_seconds", "Time to start a sandbox interpreter.", ("kind",),
+)
+runner_execution_seconds = Histogram(
+    "runner_execution_duration_seconds", "Time to execute code in the sandbox, excluding cache hits.",
+    ("mode", "path"),
+)
+runner_results = Counter(
+    "runner_results_total", "Code executions by outcome (cached, ok, timeout, error).", ("mode", "outcome"),
+)
+grading_queue_seconds = Histogram(
+    "grading_queue_duration_seconds", "Time a grading job waited in the queue before a worker claimed it.",
+)
+grading_jobs_finished = Counter("grading_jobs_total", "Grading jobs finished, by outcome (done, failed).", ("outcome",))
+metrics_compute_seconds = Histogram(
+    "workflow_metrics_duration_seconds", "Time to compute workflow metrics from raw events.", ("kind",),
+)
+ai_upstream_seconds = Histogram(
+    "ai_upstream_duration_seconds", "Time the AI provider took to send the first token or the whole reply.",
+    ("mode", "phase"),
+)
+ai_upstream_errors = Counter("ai_upstream_errors_total", "Failed calls to the AI provider.", ("mode",))
+
+
+class TimingMiddleware:
+    """ASGI middleware recording http_request_seconds for every HTTP request.
+
+    Requests are labelled with the matched route's path template (e.g.
+    ``/tasks/{task_id}``), so the number of series stays bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not ENABLED:
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = "500"
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            http_request_seconds.observe(
+                time.perf_counter() - start,
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),
+                status=status,
+            )
@@ -1,53 +1,105 @@
 from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from itertools import groupby
 from pathlib import Path
+from typing import Literal
+import asyncio
+import hashlib
 import json
-import os
 
 from dotenv import load_dotenv
 load_dotenv(Path(__file__).parent / ".env")
 
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, Header, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import TypeAdapter, ValidationError
 from sqlalchemy.orm import Session
-from sqlalchemy import distinct
+from sqlalchemy import func, select, tuple_, update
 
-from auth import hash_password, verify_password
-from database import get_db, init_db, SessionLocal
-from models import Candidate, Recruiter, Task, Event, Submission
+from ai_client import cached_chat_completion, cached_stream_chat_completion, chat_cache_key, cache_stats, close_client
+from auth import (
+    hash_password, hash_password_async, verify_password_async, needs_rehash,
+    create_session_token, verify_session_token, get_hash_pool, shutdown_hash_pool,
+)
+from database import engine, get_db, init_db, SessionLocal
+from models import Candidate, Recruiter, Task, Event, Submission, CandidateTaskMetrics
+from compaction import compaction_job
+from event_buffer import event_buffer
+import export
+from event_schema import AI_USED, LARGE_PASTE, split_metadata
+import grading
+from grading import grading_workers
+import instrumentation
+from instrumentation import TimingMiddleware, events_received
+import profiling
+from profiling import ProfiledRoute, ProfilingMiddleware
 from schemas import (
-    LoginRequest, LoginResponse, SignupRequest, EventRequest,
-    SubmitRequest, SubmitResponse, RunRequest, RunResponse,
+    LoginRequest, LoginResponse, SignupRequest, EventRequest, EventBatchRequest, EventStreamFrame,
+    SubmitRequest, GradingJobResponse, RunRequest, RunResponse, TaskRequest,
     EmployerResponse, EmployerMetrics, AiChatRequest, AiChatResponse,
 )
-from metrics import compute_metrics, generate_insight, generate_conclusion
-from runner import run_tests, run_code
+from metrics import (
+    compute_metrics, metrics_from_state, extract_ai_prompts, extract_paste_events,
+    generate_insight, generate_conclusion,
+)
+from metrics_store import EVENT_METRIC_COLUMNS, rebuild_metrics
+import task_registry
+from runner import run_code_async, get_pool, shutdown_pool, result_cache, RunnerBusy
 
 
 def seed_task(db: Session):
-    if db.query(Task).count() >= 3:
-        return
-    
     tasks = [
         Task(
             title="FizzBuzz",
             description="Write a function fizzbuzz(n) that returns a list of strings from 1 to n. For multiples of 3 use 'Fizz', for multiples of 5 use 'Buzz', for both use 'FizzBuzz'. Otherwise return the number as a string.",
             expected_time=15,
+            entry_points="fizzbuzz,fizz_buzz",
+            test_cases=json.dumps([
+                {"args": [1], "expected": ["1"]},
+                {"args": [3], "expected": ["1", "2", "Fizz"]},
+                {"args": [5], "expected": ["1", "2", "Fizz", "4", "Buzz"]},
+                {"args": [15], "expected": ["1", "2", "Fizz", "4", "Buzz", "Fizz", "7", "8", "Fizz", "Buzz", "11", "Fizz", "13", "14", "FizzBuzz"]},
+                {"args": [16], "expected": ["1", "2", "Fizz", "4", "Buzz", "Fizz", "7", "8", "Fizz", "Buzz", "11", "Fizz", "13", "14", "FizzBuzz", "16"]},
+            ]),
         ),
         Task(
             title="Palindrome Checker",
             description="Write a function is_palindrome(s) that returns True if a string is a palindrome (reads the same forwards and backwards, ignoring case and non-alphanumeric characters), and False otherwise.",
             expected_time=10,
+            entry_points="is_palindrome,palindrome",
+            test_cases=json.dumps([
+                {"args": ["racecar"], "expected": True},
+                {"args": ["A man, a plan, a canal: Panama"], "expected": True},
+                {"args": ["hello"], "expected": False},
+                {"args": ["12321"], "expected": True},
+                {"args": ["not a palindrome"], "expected": False},
+            ]),
         ),
         Task(
             title="Fibonacci Sequence",
             description="Write a function fibonacci(n) that returns the nth number in the Fibonacci sequence (0, 1, 1, 2, 3, 5, ...). Assume n=0 returns 0 and n=1 returns 1.",
             expected_time=10,
+            entry_points="fibonacci,fib",
+            test_cases=json.dumps([
+                {"args": [0], "expected": 0},
+                {"args": [1], "expected": 1},
+                {"args": [2], "expected": 1},
+                {"args": [5], "expected": 5},
+                {"args": [10], "expected": 55},
+            ]),
         )
     ]
     
     for t in tasks:
-        if not db.query(Task).filter(Task.title == t.title).first():
+        existing = db.query(Task).filter(Task.title == t.title).first()
+        if not existing:
             db.add(t)
+        elif existing.test_cases is None:
+            # Seeded before test cases were stored with the task.
+            existing.entry_points = t.entry_points
+            existing.test_cases = t.test_cases
     db.commit()
 
 
@@ -62,6 +114,14 @@ def seed_recruiter(db: Session):
     db.commit()
 
 
+def backfill_metrics(db: Session):
+    """Build the metrics summaries once for databases that predate them."""
+    if db.query(CandidateTaskMetrics).first() or not db.query(Event).first():
+        return
+    rebuild_metrics(db)
+    db.commit()
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     init_db()
@@ -69,12 +129,26 @@ async def lifespan(app: FastAPI):
     try:
         seed_task(db)
         seed_recruiter(db)
+        backfill_metrics(db)
     finally:
         db.close()
+    get_pool()
+    get_hash_pool()
+    event_buffer.start()
+    compaction_job.start()
+    grading_workers.start()
     yield
+    grading_workers.stop()
+    compaction_job.stop()
+    event_buffer.stop()
+    shutdown_pool()
+    shutdown_hash_pool()
+    await close_client()
 
 
 app = FastAPI(title="HireWithAI", lifespan=lifespan)
+app.router.route_class = ProfiledRoute
+profiling.instrument_engine(engine)
 
 app.add_middleware(
     CORSMiddleware,
@@ -83,6 +157,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(TimingMiddleware)
+app.add_middleware(ProfilingMiddleware)
 
 
 @app.get("/")
@@ -90,116 +166,442 @@ def root():
     return {"status": "ok", "message": "HireWithAI API"}
 
 
+def _login_response(role: str, email: str, candidate_id: int | None = None) -> LoginResponse:
+    token = create_session_token(role, email, candidate_id)
+    return LoginResponse(candidate_id=candidate_id, email=email, role=role, token=token)
+
+
+def _find_user(model: type[Candidate] | type[Recruiter], email: str, db: Session):
+    user = db.execute(select(model.id, model.email, model.password_hash).where(model.email == email)).first()
+    db.rollback()
+    return user
+
+
+def _store_password_hash(model: type[Candidate] | type[Recruiter], user_id: int, password_hash: str, db: Session):
+    db.execute(update(model).where(model.id == user_id).values(password_hash=password_hash))
+    db.commit()
+
+
+async def _check_password(model: type[Candidate] | type[Recruiter], email: str, password: str, db: Session):
+    """The (id, email) of the user if ``password`` is right, else None.
+
+    Queries run on the thread pool and hashing on the process pool, so neither
+    holds up the event loop; the read transaction is closed first so a burst
+    of logins waiting on hashing doesn't hold every pooled connection.
+    """
+    user = await run_in_threadpool(_find_user, model, email, db)
+    if not user or not await verify_password_async(password, user.password_hash):
+        return None
+    if needs_rehash(user.password_hash):
+        new_hash = await hash_password_async(password)
+        await run_in_threadpool(_store_password_hash, model, user.id, new_hash, db)
+    return user
+
+
+def _email_registered(email: str, db: Session) -> bool:
+    registered = db.query(Candidate.id).filter(Candidate.email == email).first() is not None
+    db.rollback()
+    return registered
+
+
+def _create_candidate(email: str, password_hash: str, db: Session) -> Candidate:
+    candidate = Candidate(email=email, password_hash=password_hash)
+    db.add(candidate)
+    db.commit()
+    db.refresh(candidate)
+    return candidate
+
+
 @app.post("/auth/signup", response_model=LoginResponse)
-def signup(req: SignupRequest, db: Session = Depends(get_db)):
+async def signup(req: SignupRequest, db: Session = Depends(get_db)):
     email = req.email.strip().lower()
     if not email:
         raise HTTPException(400, "Email required")
     if len(req.password) < 6:
         raise HTTPException(400, "Password must be at least 6 characters")
-    if db.query(Candidate).filter(Candidate.email == email).first():
+    if await run_in_threadpool(_email_registered, email, db):
         raise HTTPException(400, "Email already registered")
-    candidate = Candidate(email=email, password_hash=hash_password(req.password))
-    db.add(candidate)
-    db.commit()
-    db.refresh(candidate)
-    return LoginResponse(candidate_id=candidate.id, email=candidate.email, role="candidate")
+    candidate = await run_in_threadpool(_create_candidate, email, await hash_password_async(req.password), db)
+    return _login_response("candidate", candidate.email, candidate.id)
 
 
 @app.post("/auth/login/candidate", response_model=LoginResponse)
-def login_candidate(req: LoginRequest, db: Session = Depends(get_db)):
+async def login_candidate(req: LoginRequest, db: Session = Depends(get_db)):
     email = req.email.strip().lower()
     if not email or not req.password:
         raise HTTPException(400, "Email and password required")
-    candidate = db.query(Candidate).filter(Candidate.email == email).first()
-    if not candidate or not verify_password(req.password, candidate.password_hash):
+    candidate = await _check_password(Candidate, email, req.password, db)
+    if not candidate:
         raise HTTPException(401, "Invalid email or password")
-    return LoginResponse(candidate_id=candidate.id, email=candidate.email, role="candidate")
+    return _login_response("candidate", candidate.email, candidate.id)
 
 
 @app.post("/auth/login/recruiter", response_model=LoginResponse)
-def login_recruiter(req: LoginRequest, db: Session = Depends(get_db)):
+async def login_recruiter(req: LoginRequest, db: Session = Depends(get_db)):
     email = req.email.strip().lower()
     if not email or not req.password:
         raise HTTPException(400, "Email and password required")
-    recruiter = db.query(Recruiter).filter(Recruiter.email == email).first()
-    if not recruiter or not verify_password(req.password, recruiter.password_hash):
+    recruiter = await _check_password(Recruiter, email, req.password, db)
+    if not recruiter:
         raise HTTPException(401, "Invalid email or password")
-    return LoginResponse(candidate_id=None, email=recruiter.email, role="recruiter")
+    return _login_response("recruiter", recruiter.email)
+
+
+def current_session(authorization: str | None = Header(None)) -> dict:
+    """Claims of the bearer token on the request; verifying it costs one HMAC."""
+    scheme, _, token = (authorization or "").partition(" ")
+    claims = verify_session_token(token) if scheme.lower() == "bearer" else None
+    if claims is None:
+        raise HTTPException(401, "Invalid or expired session", headers={"WWW-Authenticate": "Bearer"})
+    return claims
+
+
+def require_recruiter(session: dict = Depends(current_session)) -> dict:
+    if session.get("role") != "recruiter":
+        raise HTTPException(403, "Recruiter access required")
+    return session
+
+
+@app.get("/auth/me", response_model=LoginResponse)
+def me(session: dict = Depends(current_session)):
+    return LoginResponse(candidate_id=session.get("candidate_id"), email=session["email"], role=session["role"])
+
+
+MAX_EVENT_BATCH = 1000
+
+
+def _event_row(candidate_id: int, task_id: int, event_type: str, timestamp: datetime, metadata: dict | None = None) -> dict:
+    return {
+        "candidate_id": candidate_id,
+        "task_id": task_id,
+        "event_type": event_type,
+        "timestamp": timestamp,
+        **split_metadata(metadata),
+    }
+
+
+def _request_event_row(req: EventRequest, received_at: datetime) -> dict:
+    timestamp = received_at
+    if req.age_ms and req.age_ms > 0:
+        timestamp = received_at - timedelta(milliseconds=req.age_ms)
+    return _event_row(req.candidate_id, req.task_id, req.event_type, timestamp, req.metadata)
 
 
 @app.post("/events")
-def log_event(req: EventRequest, db: Session = Depends(get_db)):
-    event = Event(
-        candidate_id=req.candidate_id,
-        task_id=req.task_id,
-        event_type=req.event_type,
-        metadata_=json.dumps(req.metadata) if req.metadata else None,
-    )
-    db.add(event)
-    db.commit()
+def log_event(req: EventRequest):
+    event_buffer.add([_request_event_row(req, datetime.utcnow())])
+    events_received.inc(transport="http")
     return {"ok": True}
 
 
+_event_list = TypeAdapter(list[EventRequest])
+
+
+def _accept_events(events: list, transport: str) -> tuple[int, list[dict]]:
+    """Buffer the valid events of a batch; returns (accepted, rejected), where
+    each rejected event is reported as ``{"index": i, "error": ...}``."""
+    received_at = datetime.utcnow()
+    rows, rejected = [], []
+    try:
+        # Almost every batch is valid, and one call is cheaper than one per event
+        rows = [_request_event_row(e, received_at) for e in _event_list.validate_python(events)]
+    except ValidationError:
+        for i, event in enumerate(events):
+            try:
+                rows.append(_request_event_row(EventRequest.model_validate(event), received_at))
+            except ValidationError as e:
+                error = e.errors()[0]
+                field = ".".join(map(str, error["loc"]))
+                rejected.append({"index": i, "error": f"{field}: {error['msg']}" if field else error["msg"]})
+    event_buffer.add(rows)
+    events_received.inc(len(rows), transport=transport)
+    return len(rows), rejected
+
+
+@app.post("/events/batch")
+def log_events(req: EventBatchRequest):
+    """Store a batch of events. Invalid ones are skipped and listed in
+    ``rejected`` by index; the rest are stored all the same."""
+    if len(req.events) > MAX_EVENT_BATCH:
+        raise HTTPException(400, f"At most {MAX_EVENT_BATCH} events per batch")
+    accepted, rejected = _accept_events(req.events, "http")
+    return {"ok": True, "accepted": accepted, "rejected": rejected}
+
+
+def _stream_frame_reply(message: str) -> str:
+    try:
+        frame = EventStreamFrame.model_validate_json(message)
+    except ValidationError as e:
+        try:
+            seq = json.loads(message).get("seq")
+        except (ValueError, AttributeError):
+            seq = None
+        return json.dumps({"ack": seq, "error": f"Invalid frame: {e.errors()[0]['msg']}"})
+    if len(frame.events) > MAX_EVENT_BATCH:
+        return json.dumps({"ack": frame.seq, "error": f"At most {MAX_EVENT_BATCH} events per frame"})
+    accepted, rejected = _accept_events(frame.events, "websocket")
+    return json.dumps({"ack": frame.seq, "accepted": accepted, "rejected": rejected})
+
+
+@app.websocket("/ws/events")
+async def event_stream(websocket: WebSocket):
+    """Telemetry over one long-lived connection per editor tab.
+
+    Each text message is ``{"seq": n, "events": [...]}`` with events shaped as
+    for /events/batch, and is answered with ``{"ack": n, "accepted": k,
+    "rejected": [...]}`` once its valid events are in the write-behind buffer
+    (the same guarantee and reply as /events/batch), or ``{"ack": n, "error":
+    ...}`` if the frame as a whole was unreadable.
+    Clients resend unacknowledged frames over HTTP if the socket drops.
+    """
+    await websocket.accept()
+    try:
+        while True:
+            await websocket.send_text(_stream_frame_reply(await websocket.receive_text()))
+    except WebSocketDisconnect:
+        pass
+
+
 @app.post("/run", response_model=RunResponse)
-def run(req: RunRequest, db: Session = Depends(get_db)):
-    event = Event(candidate_id=req.candidate_id, task_id=req.task_id, event_type="code_run")
-    db.add(event)
-    db.commit()
-    out = run_code(req.task_id, req.code or "")
+async def run(req: RunRequest):
+    started_at = datetime.utcnow()
+    try:
+        out = await run_code_async(req.task_id, req.code or "")
+    except RunnerBusy as e:
+        raise HTTPException(429, str(e), headers={"Retry-After": "2"})
+    event_buffer.add([_event_row(req.candidate_id, req.task_id, "code_run", started_at)])
     return RunResponse(stdout=out.get("stdout", ""), stderr=out.get("stderr", ""), run_error=out.get("run_error"))
 
 
-@app.post("/submit", response_model=SubmitResponse)
-def submit(req: SubmitRequest, db: Session = Depends(get_db)):
-    event = Event(candidate_id=req.candidate_id, task_id=req.task_id, event_type="task_submitted")
-    db.add(event)
-    db.commit()
-
-    test_result = run_tests(req.task_id, req.final_code or "")
-    submission = Submission(
-        candidate_id=req.candidate_id,
-        task_id=req.task_id,
-        final_code=req.final_code,
-        reflection=req.reflection,
-        tests_passed=test_result.get("tests_passed", 0),
-        tests_total=test_result.get("tests_total", 0),
-        test_results=json.dumps(test_result.get("results", [])),
+@app.post("/submit", response_model=GradingJobResponse, status_code=202)
+def submit(
+    req: SubmitRequest,
+    response: Response,
+    idempotency_key: str | None = Header(None, max_length=64),
+    db: Session = Depends(get_db),
+):
+    """Queue the submission for grading and return its job (202) without
+    waiting for the tests. Poll the Location URL, or follow its /events
+    stream, for the results. Retries that send the same Idempotency-Key get
+    the original job back (200 once it has finished)."""
+    started_at = datetime.utcnow()
+    job_id, created = grading.enqueue(
+        db, req.candidate_id, req.task_id, req.final_code, req.reflection, idempotency_key,
     )
-    db.add(submission)
-    db.commit()
-    db.refresh(submission)
-
-    return SubmitResponse(
-        submission_id=submission.id,
-        tests_passed=test_result.get("tests_passed", 0),
-        tests_total=test_result.get("tests_total", 0),
-        run_error=test_result.get("run_error"),
-        results=test_result.get("results", []),
+    if created:
+        event_buffer.add([_event_row(req.candidate_id, req.task_id, "task_submitted", started_at)])
+    job = grading.job_result(db, job_id)
+    if job["status"] in grading.FINISHED:
+        response.status_code = 200
+    response.headers["Location"] = f"/grading/jobs/{job_id}"
+    return job
+
+
+@app.get("/grading/jobs/{job_id}", response_model=GradingJobResponse)
+def grading_job(job_id: int, db: Session = Depends(get_db)):
+    job = grading.job_result(db, job_id)
+    if job is None:
+        raise HTTPException(404, "Grading job not found")
+    return job
+
+
+@app.get("/grading/jobs/{job_id}/events")
+async def grading_job_events(job_id: int):
+    """Server-sent events: the job as JSON each time its status changes, then
+    ``[DONE]`` once it is done or failed. If the job is deleted while being
+    followed, a ``gone`` event is sent instead and the stream ends."""
+
+    def read():
+        db = SessionLocal()
+        try:
+            return grading.job_result(db, job_id)
+        finally:
+            db.close()
+
+    if await run_in_threadpool(read) is None:
+        raise HTTPException(404, "Grading job not found")
+
+    async def events():
+        status = None
+        while True:
+            job = await run_in_threadpool(read)
+            if job is None:
+                yield f"event: gone\ndata: {json.dumps({'detail': 'Grading job not found'})}\n\n"
+                return
+            if job["status"] != status:
+                status = job["status"]
+                yield f"data: {json.dumps(job)}\n\n"
+            if status in grading.FINISHED:
+                break
+            await grading.wait_for_change(job_id)
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.get("/runner/cache")
+def runner_cache_stats():
+    """Hit/miss counters of the execution result cache, for monitoring."""
+    if result_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **result_cache.stats()}
+
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    """Request timings and hot-path histograms in the Prometheus text format."""
+    return Response(instrumentation.render(), media_type=instrumentation.CONTENT_TYPE)
+
+
+def require_profile_token(x_profile_token: str | None = Header(None)):
+    if profiling.PROFILE_TOKEN is None:
+        raise HTTPException(404, "Profiling is not enabled")
+    if not profiling.token_matches(x_profile_token):
+        raise HTTPException(403, "Invalid profile token")
+
+
+def _stored_profile(profile_id: int) -> profiling.RequestProfile:
+    profile = profiling.get_profile(profile_id)
+    if profile is None:
+        raise HTTPException(404, "Profile not found")
+    return profile
+
+
+@app.get("/debug/profiles", include_in_schema=False, dependencies=[Depends(require_profile_token)])
+def list_profiles():
+    """Recently profiled requests, newest first."""
+    return profiling.list_profiles()
+
+
+@app.get("/debug/profiles/{profile_id:int}", include_in_schema=False, dependencies=[Depends(require_profile_token)])
+def profile_report(profile_id: int):
+    """SQL totals and the slowest functions of one profiled request, as text."""
+    profile = _stored_profile(profile_id)
+    s = profile.summary()
+    header = (f"{s['method']} {s['path']} -> {s['status']} in {s['duration_ms']:.1f} ms; "
+              f"{s['sql_count']} SQL statements in {s['sql_ms']:.1f} ms\n\n")
+    return PlainTextResponse(header + profile.report())
+
+
+@app.get("/debug/profiles/{profile_id}.prof", include_in_schema=False, dependencies=[Depends(require_profile_token)])
+def download_profile(profile_id: int):
+    """The raw profile, for pstats or snakeviz."""
+    return Response(
+        _stored_profile(profile_id).dump(),
+        media_type="application/octet-stream",
+        headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.prof"'},
     )
 
 
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in tags or etag in tags
+
+
+def _revalidated(body: bytes, etag: str, if_none_match: str | None, cache_control: str) -> Response:
+    """``body`` as JSON, or a 304 if the client already has this version."""
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+
 @app.get("/tasks")
-def list_tasks(candidate_id: int | None = None, db: Session = Depends(get_db)):
-    tasks = db.query(Task).all()
+def list_tasks(
+    candidate_id: int | None = None,
+    if_none_match: str | None = Header(None),
+    db: Session = Depends(get_db),
+):
+    catalog = task_registry.catalog(db)
+    if candidate_id is None:
+        return _revalidated(catalog.body, catalog.etag, if_none_match, "no-cache")
+
+    submissions = {}
+    rows = (
+        db.query(Submission.task_id, Submission.tests_passed, Submission.tests_total)
+        .filter(Submission.candidate_id == candidate_id)
+        .order_by(Submission.id)
+    )
+    for task_id, tests_passed, tests_total in rows:
+        submissions.setdefault(task_id, (tests_passed, tests_total))
     result = []
-    for t in tasks:
-        item = {"id": t.id, "title": t.title, "description": t.description, "expected_time": t.expected_time}
-        if candidate_id is not None:
-            sub = db.query(Submission).filter(Submission.candidate_id == candidate_id, Submission.task_id == t.id).first()
-            item["submitted"] = sub is not None
-            item["tests_passed"] = sub.tests_passed if sub else None
-            item["tests_total"] = sub.tests_total if sub else None
-        result.append(item)
-    return result
+    for task in catalog.tasks:
+        sub = submissions.get(task["id"])
+        result.append({
+            **task,
+            "submitted": sub is not None,
+            "tests_passed": sub[0] if sub else None,
+            "tests_total": sub[1] if sub else None,
+        })
+    # Depends on the candidate's submissions too, so it's hashed per response.
+    body = json.dumps(result, ensure_ascii=False, separators=(",", ":")).encode()
+    etag = f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+    return _revalidated(body, etag, if_none_match, "private, no-cache")
 
 
 @app.get("/tasks/{task_id}")
-def get_task(task_id: int, db: Session = Depends(get_db)):
-    task = db.query(Task).filter(Task.id == task_id).first()
+def get_task(task_id: int, if_none_match: str | None = Header(None), db: Session = Depends(get_db)):
+    entry = task_registry.catalog(db).by_id.get(task_id)
+    if entry is None:
+        raise HTTPException(404, "Task not found")
+    return _revalidated(entry.body, entry.etag, if_none_match, "no-cache")
+
+
+def _task_admin_view(task: Task) -> dict:
+    return {
+        "id": task.id,
+        "title": task.title,
+        "description": task.description,
+        "expected_time": task.expected_time,
+        "entry_points": list(task_registry.parse_entry_points(task.entry_points)),
+        "test_cases": json.loads(task.test_cases) if task.test_cases else [],
+        "test_cases_version": task.test_cases_version,
+    }
+
+
+def _apply_task_request(task: Task, req: TaskRequest):
+    entry_points = [name.strip() for name in req.entry_points if name.strip()]
+    if not all(name.isidentifier() for name in entry_points):
+        raise HTTPException(400, "Entry points must be Python function names")
+    if not req.test_cases:
+        raise HTTPException(400, "At least one test case is required")
+    task.title = req.title
+    task.description = req.description
+    task.expected_time = req.expected_time
+    task.entry_points = ",".join(entry_points)
+    task.test_cases = json.dumps([tc.model_dump() for tc in req.test_cases])
+
+
+@app.post("/tasks")
+def create_task(req: TaskRequest, db: Session = Depends(get_db), _: dict = Depends(require_recruiter)):
+    task = Task(test_cases_version=1)
+    _apply_task_request(task, req)
+    db.add(task)
+    db.commit()
+    db.refresh(task)
+    task_registry.invalidate(task.id)
+    return _task_admin_view(task)
+
+
+@app.put("/tasks/{task_id}")
+def update_task(task_id: int, req: TaskRequest, db: Session = Depends(get_db), _: dict = Depends(require_recruiter)):
+    task = db.get(Task, task_id)
     if not task:
         raise HTTPException(404, "Task not found")
-    return {"id": task.id, "title": task.title, "description": task.description, "expected_time": task.expected_time}
+    previous = (task.entry_points, task.test_cases)
+    _apply_task_request(task, req)
+    if (task.entry_points, task.test_cases) != previous:
+        task.test_cases_version = (task.test_cases_version or 0) + 1
+    db.commit()
+    db.refresh(task)
+    # Runs from now on use the new cases; cached results are keyed on the version.
+    task_registry.invalidate(task_id)
+    return _task_admin_view(task)
+
+
+EVENT_STREAM_BATCH = 1000
 
 
 @app.get("/employer/{candidate_id}/{task_id}", response_model=EmployerResponse)
@@ -210,10 +612,22 @@ def employer_view(candidate_id: int, task_id: int, db: Session = Depends(get_db)
     task = db.query(Task).filter(Task.id == task_id).first()
     if not task:
         raise HTTPException(404, "Task not found")
-    events = db.query(Event).filter(Event.candidate_id == candidate_id, Event.task_id == task_id).order_by(Event.timestamp).all()
+    event_buffer.try_flush()
+    summary = db.get(CandidateTaskMetrics, (candidate_id, task_id))
     submission = db.query(Submission).filter(Submission.candidate_id == candidate_id, Submission.task_id == task_id).first()
 
-    metrics_dict = compute_metrics(events)
+    if summary:
+        metrics_dict = metrics_from_state(summary)
+    else:
+        # No summary row yet (e.g. events written outside the ingestion path):
+        # stream the history through compute_metrics rather than loading it.
+        events = db.execute(
+            select(*EVENT_METRIC_COLUMNS, Event.metadata_)
+            .where(Event.candidate_id == candidate_id, Event.task_id == task_id)
+            .order_by(Event.timestamp)
+            .execution_options(yield_per=EVENT_STREAM_BATCH)
+        )
+        metrics_dict = compute_metrics(events)
     insight = generate_insight(metrics_dict)
     conclusion = generate_conclusion(metrics_dict, candidate.email, task.title)
 
@@ -231,44 +645,123 @@ def employer_view(candidate_id: int, task_id: int, db: Session = Depends(get_db)
     )
 
 
+# Event types whose payloads are listed in full on the recruiter dashboard
+DETAIL_EVENT_CODES = (AI_USED, LARGE_PASTE)
+PAGE_KEY_CHUNK = 1000
+
+CandidateSort = Literal["candidate", "email", "task", "first_activity", "last_activity", "edits", "runs", "ai_usage", "pastes"]
+
+
 @app.get("/recruiter/candidates")
-def recruiter_candidates(db: Session = Depends(get_db)):
-    candidate_ids = [c[0] for c in db.query(distinct(Event.candidate_id)).all()]
+def recruiter_candidates(
+    response: Response,
+    task_id: int | None = None,
+    submitted: bool | None = None,
+    email: str | None = None,
+    sort: CandidateSort = "candidate",
+    order: Literal["asc", "desc"] = "asc",
+    limit: int | None = Query(None, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db),
+):
+    event_buffer.try_flush()
+    summary = CandidateTaskMetrics
+    has_submission = (
+        select(Submission.id)
+        .where(Submission.candidate_id == summary.candidate_id, Submission.task_id == summary.task_id)
+        .exists()
+    )
+    rows = (
+        select(summary, Candidate.email, Task.title.label("task_title"), has_submission.label("submitted"))
+        .join(Candidate, Candidate.id == summary.candidate_id)
+        .join(Task, Task.id == summary.task_id)
+    )
+    if task_id is not None:
+        rows = rows.where(summary.task_id == task_id)
+    if submitted is not None:
+        rows = rows.where(has_submission if submitted else ~has_submission)
+    if email:
+        rows = rows.where(Candidate.email.contains(email.strip().lower()))
+    response.headers["X-Total-Count"] = str(db.scalar(select(func.count()).select_from(rows.subquery())))
+
+    sort_column = {
+        "candidate": summary.candidate_id,
+        "email": Candidate.email,
+        "task": Task.title,
+        "first_activity": summary.first_event_at,
+        "last_activity": summary.last_event_at,
+        "edits": summary.edit_count,
+        "runs": summary.run_count,
+        "ai_usage": summary.ai_usage_count,
+        "pastes": summary.large_paste_count,
+    }[sort]
+    rows = rows.order_by(
+        sort_column.desc() if order == "desc" else sort_column.asc(),
+        summary.candidate_id,
+        summary.task_id,
+    ).offset(offset)
+    if limit is not None:
+        rows = rows.limit(limit)
+    page = db.execute(rows).all()
+
+    # The AI prompts and pastes for the page come from one keyed fetch per
+    # PAGE_KEY_CHUNK pairs (a single query for any page within the limit).
+    keys = [(row.CandidateTaskMetrics.candidate_id, row.CandidateTaskMetrics.task_id) for row in page]
+    details_by_pair = {}
+    for i in range(0, len(keys), PAGE_KEY_CHUNK):
+        details = db.execute(
+            select(Event.candidate_id, Event.task_id, Event.event_code, Event.chars_added, Event.metadata_, Event.timestamp)
+            .where(tuple_(Event.candidate_id, Event.task_id).in_(keys[i:i + PAGE_KEY_CHUNK]))
+            .where(Event.event_code.in_(DETAIL_EVENT_CODES))
+            .order_by(Event.candidate_id, Event.task_id, Event.timestamp)
+        )
+        details_by_pair.update((key, list(group)) for key, group in groupby(details, key=lambda e: (e.candidate_id, e.task_id)))
+
     result = []
-    for cid in candidate_ids:
-        candidate = db.query(Candidate).filter(Candidate.id == cid).first()
-        if not candidate:
-            continue
-        task_ids = [t[0] for t in db.query(distinct(Event.task_id)).filter(Event.candidate_id == cid).all()]
-        for tid in task_ids:
-            task = db.query(Task).filter(Task.id == tid).first()
-            if not task:
-                continue
-            events = db.query(Event).filter(Event.candidate_id == cid, Event.task_id == tid).order_by(Event.timestamp).all()
-            submission = db.query(Submission).filter(Submission.candidate_id == cid, Submission.task_id == tid).first()
-            metrics_dict = compute_metrics(events)
-            insight = generate_insight(metrics_dict)
-            conclusion = generate_conclusion(metrics_dict, candidate.email, task.title)
-            result.append({
-                "id": cid,
-                "candidate_id": cid, 
-                "email": candidate.email, 
-                "task_id": tid, 
-                "task_title": task.title,
-                "metrics": metrics_dict, 
-                "insight": insight, 
-                "conclusion": conclusion,
-                "submitted": submission is not None,
-            })
+    for row in page:
+        metrics_row = row.CandidateTaskMetrics
+        pair_details = details_by_pair.get((metrics_row.candidate_id, metrics_row.task_id), [])
+        metrics_dict = metrics_from_state(metrics_row)
+        metrics_dict["ai_prompts"] = extract_ai_prompts(pair_details)
+        metrics_dict["paste_events"] = extract_paste_events(pair_details)
+        insight = generate_insight(metrics_dict)
+        conclusion = generate_conclusion(metrics_dict, row.email, row.task_title)
+        result.append({
+            "id": metrics_row.candidate_id,
+            "candidate_id": metrics_row.candidate_id,
+            "email": row.email,
+            "task_id": metrics_row.task_id,
+            "task_title": row.task_title,
+            "metrics": metrics_dict,
+            "insight": insight,
+            "conclusion": conclusion,
+            "submitted": bool(row.submitted),
+        })
     return result
 
 
-@app.post("/ai/chat", response_model=AiChatResponse)
-async def ai_chat(req: AiChatRequest):
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        return AiChatResponse(content="", error="OpenAI API key not configured")
+@app.get("/export/{dataset}")
+def export_dataset(
+    dataset: Literal["candidates", "metrics", "events"],
+    fmt: Literal["ndjson", "csv", "parquet", "arrow"] = Query("ndjson", alias="format"),
+    task_id: int | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    submitted: bool | None = None,
+    _: dict = Depends(require_recruiter),
+):
+    """Stream a whole dataset row by row; for analytics rather than the dashboard."""
+    if fmt in export.COLUMNAR_FORMATS and not export.columnar_available():
+        raise HTTPException(501, f"{fmt} exports need pyarrow installed on the server")
+    event_buffer.try_flush()
+    return StreamingResponse(
+        export.export(dataset, fmt, export.ExportFilters(task_id, since, until, submitted)),
+        media_type=export.MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{dataset}.{export.EXTENSIONS[fmt]}"'},
+    )
+
 
+def _chat_messages(req: AiChatRequest) -> list[dict]:
     system = f"""You are an AI assistant for a coding assessment. The ONLY topic you may discuss is the current task.
 
 Task: {req.task_title}
@@ -283,28 +776,61 @@ STRICT RULES:
 4. For off-topic messages (e.g. "hey", "hello", "what's the weather"), respond with ONLY: "I can only help with questions about the task. Try asking about the {req.task_title} requirements, Python syntax, or algorithms."
 5. Do NOT give complete solutions. Give hints and guidance only."""
 
-    messages = [{"role": "system", "content": system}] + [{"role": m.role, "content": m.content} for m in req.messages]
+    return [{"role": "system", "content": system}] + [{"role": m.role, "content": m.content} for m in req.messages]
+
+
+def _chat_cache_key(req: AiChatRequest) -> str:
+    messages = [{"role": m.role, "content": m.content} for m in req.messages]
+    return chat_cache_key(req.task_title, req.task_description, req.current_code, messages)
+
 
+async def _until_disconnected(request: Request):
+    while (await request.receive())["type"] != "http.disconnect":
+        pass
+
+
+@app.post("/ai/chat", response_model=AiChatResponse)
+async def ai_chat(req: AiChatRequest, request: Request):
+    completion = asyncio.ensure_future(cached_chat_completion(_chat_cache_key(req), _chat_messages(req)))
+    disconnected = asyncio.ensure_future(_until_disconnected(request))
     try:
-        import urllib.request
-        body = json.dumps({"model": "gpt-4o-mini", "messages": messages, "max_tokens": 500})
-        req_obj = urllib.request.Request(
-            "https://api.openai.com/v1/chat/completions",
-            data=body.encode(),
-            headers={
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {api_key}",
-            },
-            method="POST",
-        )
-        with urllib.request.urlopen(req_obj, timeout=60) as resp:
-            r = json.loads(resp.read().decode())
-        content = r["choices"][0]["message"].get("content", "") or ""
-        return AiChatResponse(content=content)
+        # Stop paying for a completion nobody is waiting for any more.
+        await asyncio.wait({completion, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        disconnected.cancel()
+    if not completion.done():
+        completion.cancel()
+        return AiChatResponse(content="", error="Client disconnected")
+    try:
+        return AiChatResponse(content=completion.result())
     except Exception as e:
         return AiChatResponse(content="", error=str(e))
 
 
+@app.post("/ai/chat/stream")
+async def ai_chat_stream(req: AiChatRequest):
+    """Server-sent events: ``{"content": ...}`` per chunk, ``{"error": ...}`` on
+    failure, then ``[DONE]``. The upstream request is cancelled if the browser
+    disconnects mid-stream."""
+    key, messages = _chat_cache_key(req), _chat_messages(req)
+
+    async def events():
+        try:
+            async for piece in cached_stream_chat_completion(key, messages):
+                yield f"data: {json.dumps({'content': piece})}\n\n"
+        except Exception as e:
+            yield f"data: {json.dumps({'error': str(e)})}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.get("/ai/cache")
+def ai_cache_stats():
+    """Hit rate of the AI reply cache and upstream calls it saved, for monitoring."""
+    return cache_stats()
+
+
 if __name__ == "__main__":
     import uvicorn
     init_db()
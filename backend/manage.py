@@ -0,0 +1,145 @@
+"""Maintenance commands. Run from the backend directory, e.g.
+
+    python manage.py backfill-metrics
+"""
+import argparse
+import json
+import signal
+import sys
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from dotenv import load_dotenv
+load_dotenv(Path(__file__).parent / ".env")
+
+from compaction import ARCHIVE_DIR, COMPACT_AFTER_DAYS, compact_events
+from database import SessionLocal, init_db
+from export import COLUMNAR_FORMATS, DATASETS, FORMATS, ExportFilters, columnar_available, export
+from grading import WORKERS, GradingWorkers
+from metrics import compute_metrics_bulk
+from metrics_store import load_event_columns, rebuild_metrics
+from query_plans import check_query_plans
+from runner import get_pool, shutdown_pool
+
+
+def backfill_metrics(args):
+    init_db()
+    db = SessionLocal()
+    try:
+        written = rebuild_metrics(db, batch_size=args.batch_size)
+        db.commit()
+    finally:
+        db.close()
+    print(f"Rebuilt {written} candidate_task_metrics rows")
+
+
+def cohort_metrics(args):
+    init_db()
+    db = SessionLocal()
+    try:
+        columns = load_event_columns(db, task_id=args.task_id)
+    finally:
+        db.close()
+    for (candidate_id, task_id), metrics in sorted(compute_metrics_bulk(columns).items()):
+        print(json.dumps({"candidate_id": candidate_id, "task_id": task_id, **metrics}))
+
+
+def compact(args):
+    init_db()
+    db = SessionLocal()
+    try:
+        report = compact_events(
+            db, older_than=timedelta(days=args.older_than_days), archive_dir=args.archive_dir, dry_run=args.dry_run,
+        )
+    finally:
+        db.close()
+    print(report.report())
+
+
+def export_data(args):
+    if args.format in COLUMNAR_FORMATS and not columnar_available():
+        raise SystemExit(f"{args.format} exports need pyarrow (pip install pyarrow)")
+    init_db()
+    filters = ExportFilters(args.task_id, args.since, args.until, args.submitted)
+    out = sys.stdout.buffer if args.output == "-" else open(args.output, "wb")
+    try:
+        for chunk in export(args.dataset, args.format, filters):
+            out.write(chunk)
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+
+
+def grading_worker(args):
+    init_db()
+    get_pool()
+    workers = GradingWorkers(count=args.workers)
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stopping.set())
+    workers.start()
+    print(f"Grading with {args.workers} workers; Ctrl-C to stop", file=sys.stderr)
+    try:
+        stopping.wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # In-flight jobs finish first; anything still queued waits for the next worker.
+        workers.stop()
+        shutdown_pool()
+
+
+def check_plans(args):
+    problems = check_query_plans()
+    for endpoint, statement, plan in problems:
+        print(f"{endpoint}: table scan\n  {' '.join(statement.split())}")
+        for step in plan:
+            print(f"    {step}")
+    if problems:
+        raise SystemExit(f"{len(problems)} queries regressed to a table scan")
+    print("All endpoint queries use indexes")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HireWithAI maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    backfill = commands.add_parser("backfill-metrics", help="rebuild candidate_task_metrics from the events table")
+    backfill.add_argument("--batch-size", type=int, default=10000, help="events fetched per round trip")
+    backfill.set_defaults(func=backfill_metrics)
+
+    cohort = commands.add_parser("cohort-metrics", help="print metrics for every candidate/task pair as JSON lines")
+    cohort.add_argument("--task-id", type=int, help="limit the report to one task")
+    cohort.set_defaults(func=cohort_metrics)
+
+    compaction = commands.add_parser("compact-events", help="roll up old code_edit events and archive the raw rows")
+    compaction.add_argument("--older-than-days", type=float, default=COMPACT_AFTER_DAYS,
+                            help="only compact events older than this")
+    compaction.add_argument("--archive-dir", default=ARCHIVE_DIR, help="where the gzipped raw events are written")
+    compaction.add_argument("--dry-run", action="store_true", help="report rows and bytes reclaimed without changing anything")
+    compaction.set_defaults(func=compact)
+
+    exporter = commands.add_parser("export", help="stream candidates, metrics or events to a file")
+    exporter.add_argument("dataset", choices=sorted(DATASETS))
+    exporter.add_argument("--format", choices=FORMATS, default="ndjson")
+    exporter.add_argument("--output", "-o", default="-", help="file to write (default: stdout)")
+    exporter.add_argument("--task-id", type=int)
+    exporter.add_argument("--since", type=datetime.fromisoformat, help="activity on or after this time (UTC)")
+    exporter.add_argument("--until", type=datetime.fromisoformat, help="activity before this time (UTC)")
+    exporter.add_argument("--submitted", action=argparse.BooleanOptionalAction, default=None,
+                          help="only submitted (or with --no-submitted, unsubmitted) candidate/task pairs")
+    exporter.set_defaults(func=export_data)
+
+    worker = commands.add_parser("grading-worker", help="grade queued submissions until interrupted")
+    worker.add_argument("--workers", type=int, default=WORKERS or 2, help="jobs graded in parallel")
+    worker.set_defaults(func=grading_worker)
+
+    plans = commands.add_parser("check-query-plans", help="fail if an endpoint query scans the events or submissions table")
+    plans.set_defaults(func=check_plans)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,54 @@
 """Compute workflow metrics from telemetry events."""
 import json
-from typing import Any
+from datetime import datetime, timedelta
+from typing import Any, Iterable
 
-EVENT_TYPES = [
-    "task_started", "code_edit", "code_run", "ai_used",
-    "tab_hidden", "tab_visible", "large_paste", "task_submitted",
-]
+import numpy as np
 
+from event_schema import AI_USED, CODE_EDIT, CODE_EDIT_ROLLUP, CODE_RUN, LARGE_PASTE, TAB_HIDDEN, TAB_VISIBLE
+from instrumentation import metrics_compute_seconds
 
-def compute_metrics(events: list) -> dict[str, Any]:
-    if not events:
+
+class MetricsState:
+    """In-memory running state with the same counters as CandidateTaskMetrics."""
+    __slots__ = (
+        "first_event_at", "last_event_at", "edit_count", "run_count", "ai_usage_count",
+        "large_paste_count", "linear_typing_edits", "refine_cycles", "last_was_run",
+        "hidden_since", "context_switch_seconds",
+    )
+
+    def __init__(self):
+        self.first_event_at = self.last_event_at = self.hidden_since = None
+        self.edit_count = self.run_count = self.ai_usage_count = self.large_paste_count = 0
+        self.linear_typing_edits = self.refine_cycles = 0
+        self.last_was_run = False
+        self.context_switch_seconds = 0.0
+
+
+@metrics_compute_seconds.timed(kind="single")
+def compute_metrics(events: Iterable) -> dict[str, Any]:
+    """Metrics for one candidate/task from its events in timestamp order.
+
+    Makes a single pass, so ``events`` can be any iterator (e.g. a ``yield_per``
+    query) and memory stays flat however long the session was.
+    """
+    state = MetricsState()
+    ai_prompts = []
+    paste_events = []
+    seen = False
+    for e in events:
+        seen = True
+        apply_row(state, e)
+        if e.event_code == AI_USED:
+            prompt = _ai_prompt(e)
+            if prompt:
+                ai_prompts.append(prompt)
+        elif e.event_code == LARGE_PASTE:
+            paste = _paste_event(e)
+            if paste:
+                paste_events.append(paste)
+
+    if not seen:
         return {
             "total_time_seconds": 0,
             "edit_count": 0,
@@ -25,101 +64,267 @@ def compute_metrics(events: list) -> dict[str, Any]:
             "paste_events": [],
         }
 
-    first_ts = events[0].timestamp
-    last_ts = events[-1].timestamp
-    total_time = (last_ts - first_ts).total_seconds() if first_ts and last_ts else 0
+    metrics = metrics_from_state(state)
+    metrics["ai_prompts"] = ai_prompts
+    metrics["paste_events"] = paste_events
+    return metrics
 
-    edit_count = sum(1 for e in events if e.event_type == "code_edit")
-    run_count = sum(1 for e in events if e.event_type == "code_run")
-    ai_usage_count = sum(1 for e in events if e.event_type == "ai_used")
-    large_paste_count = sum(1 for e in events if e.event_type == "large_paste")
 
-    # Edits per run ratio
-    edits_per_run = round(edit_count / run_count, 1) if run_count > 0 else 0.0
+def _ai_prompt(e) -> dict[str, Any] | None:
+    if not e.metadata_:
+        return None
+    try:
+        prompt = json.loads(e.metadata_).get("prompt", "")
+        if prompt:
+            return {
+                "prompt": prompt,
+                "timestamp": e.timestamp.isoformat() if e.timestamp else None
+            }
+    except:
+        pass
+    return None
 
-    # Refine cycles: edit -> run -> edit sequences
-    refine_cycles = 0
-    last_was_edit = False
-    last_was_run = False
-    for e in events:
-        if e.event_type == "code_edit":
-            if last_was_run:
-                refine_cycles += 1
-            last_was_edit = True
-            last_was_run = False
-        elif e.event_type == "code_run":
-            last_was_run = True
-            last_was_edit = False
-
-    # Context switching (time in tab_hidden state)
-    context_switch_seconds = 0.0
-    hidden_start = None
-    for e in events:
-        if e.event_type == "tab_hidden":
-            hidden_start = e.timestamp
-        elif e.event_type == "tab_visible" and hidden_start:
-            context_switch_seconds += (e.timestamp - hidden_start).total_seconds()
-            hidden_start = None
-
-    # Linear typing detection
-    linear_typing_edits = 0
-    for e in events:
-        if e.event_type == "code_edit" and e.metadata_:
-            try:
-                meta = json.loads(e.metadata_)
-                chars = meta.get("chars_added", 0)
-                if 1 <= chars <= 5:
-                    linear_typing_edits += 1
-            except:
-                pass
-
-    linear_typing_ratio = linear_typing_edits / edit_count if edit_count > 0 else 0.0
-
-    # Extract AI prompts
-    ai_prompts = []
-    for e in events:
-        if e.event_type == "ai_used" and e.metadata_:
-            try:
-                meta = json.loads(e.metadata_)
-                prompt = meta.get("prompt", "")
-                if prompt:
-                    ai_prompts.append({
-                        "prompt": prompt,
-                        "timestamp": e.timestamp.isoformat() if e.timestamp else None
-                    })
-            except:
-                pass
-
-    # Extract paste events with content
-    paste_events = []
-    for e in events:
-        if e.event_type == "large_paste" and e.metadata_:
-            try:
-                meta = json.loads(e.metadata_)
-                paste_events.append({
-                    "chars_added": meta.get("chars_added", 0),
-                    "content_preview": meta.get("content_preview", ""),
-                    "timestamp": e.timestamp.isoformat() if e.timestamp else None
-                })
-            except:
-                pass
 
+def _paste_event(e) -> dict[str, Any] | None:
+    if not e.metadata_ and e.chars_added is None:
+        return None
+    try:
+        meta = json.loads(e.metadata_) if e.metadata_ else {}
+        return {
+            "chars_added": e.chars_added or 0,
+            "content_preview": meta.get("content_preview", ""),
+            "timestamp": e.timestamp.isoformat() if e.timestamp else None
+        }
+    except:
+        return None
+
+
+def extract_ai_prompts(events) -> list[dict[str, Any]]:
+    prompts = (_ai_prompt(e) for e in events if e.event_code == AI_USED)
+    return [p for p in prompts if p]
+
+
+def extract_paste_events(events) -> list[dict[str, Any]]:
+    pastes = (_paste_event(e) for e in events if e.event_code == LARGE_PASTE)
+    return [p for p in pastes if p]
+
+
+def edit_chars(chars_added: int | None, metadata: str | None) -> float | None:
+    """A code_edit's chars_added: the column, or a count the column can't hold
+    exactly (e.g. 5.5), which is left in the event's JSON metadata."""
+    if chars_added is not None or not metadata:
+        return chars_added
+    try:
+        value = json.loads(metadata).get("chars_added")
+    except (ValueError, AttributeError):
+        return None
+    return value if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+
+
+def is_linear_edit(chars_added: float | None) -> bool:
+    """A small (1-5 char) edit, the signature of typing by hand."""
+    return chars_added is not None and 1 <= chars_added <= 5
+
+
+def apply_event(state, event_code: int, timestamp, chars_added: int | None = None):
+    """Fold one event into a running metrics state.
+
+    ``state`` is any object with the CandidateTaskMetrics counter attributes.
+    Events must be applied in timestamp order for the refine-cycle and
+    context-switch state machines to match compute_metrics.
+    """
+    if timestamp is not None:
+        if state.first_event_at is None or timestamp < state.first_event_at:
+            state.first_event_at = timestamp
+        if state.last_event_at is None or timestamp > state.last_event_at:
+            state.last_event_at = timestamp
+
+    if event_code == CODE_EDIT:
+        state.edit_count += 1
+        if state.last_was_run:
+            state.refine_cycles += 1
+        state.last_was_run = False
+        if is_linear_edit(chars_added):
+            state.linear_typing_edits += 1
+    elif event_code == CODE_RUN:
+        state.run_count += 1
+        state.last_was_run = True
+    elif event_code == AI_USED:
+        state.ai_usage_count += 1
+    elif event_code == LARGE_PASTE:
+        state.large_paste_count += 1
+    elif event_code == TAB_HIDDEN:
+        state.hidden_since = timestamp
+    elif event_code == TAB_VISIBLE and state.hidden_since:
+        state.context_switch_seconds += (timestamp - state.hidden_since).total_seconds()
+        state.hidden_since = None
+
+
+def apply_rollup(state, timestamp, ended_at, edit_count: int, linear_edits: int):
+    """Fold in a code_edit_rollup: ``edit_count`` consecutive edits from
+    ``timestamp`` to ``ended_at``, ``linear_edits`` of them linear typing."""
+    # Only the first edit of a run can follow a run event.
+    apply_event(state, CODE_EDIT, timestamp)
+    state.edit_count += edit_count - 1
+    state.linear_typing_edits += linear_edits
+    if ended_at is not None and (state.last_event_at is None or ended_at > state.last_event_at):
+        state.last_event_at = ended_at
+
+
+def apply_row(state, e):
+    """apply_event for an events row (anything with its columns), rollups included."""
+    if e.event_code == CODE_EDIT_ROLLUP:
+        apply_rollup(state, e.timestamp, e.ended_at, e.edit_count, e.linear_edits)
+    elif e.event_code == CODE_EDIT:
+        apply_event(state, CODE_EDIT, e.timestamp, edit_chars(e.chars_added, e.metadata_))
+    else:
+        apply_event(state, e.event_code, e.timestamp)
+
+
+def metrics_from_state(state) -> dict[str, Any]:
+    """Metrics dict (without prompt/paste details) for a running metrics state."""
+    first_ts = state.first_event_at
+    last_ts = state.last_event_at
+    edit_count = state.edit_count
+    run_count = state.run_count
     return {
-        "total_time_seconds": total_time,
+        "total_time_seconds": (last_ts - first_ts).total_seconds() if first_ts and last_ts else 0,
         "edit_count": edit_count,
         "run_count": run_count,
-        "refine_cycles": refine_cycles,
-        "edits_per_run": edits_per_run,
-        "linear_typing_ratio": round(linear_typing_ratio, 2),
-        "linear_typing_edits": linear_typing_edits,
-        "ai_usage_count": ai_usage_count,
-        "context_switch_seconds": round(context_switch_seconds, 1),
-        "large_paste_count": large_paste_count,
-        "ai_prompts": ai_prompts,
-        "paste_events": paste_events,
+        "refine_cycles": state.refine_cycles,
+        "edits_per_run": round(edit_count / run_count, 1) if run_count > 0 else 0.0,
+        "linear_typing_ratio": round(state.linear_typing_edits / edit_count if edit_count > 0 else 0.0, 2),
+        "linear_typing_edits": state.linear_typing_edits,
+        "ai_usage_count": state.ai_usage_count,
+        "context_switch_seconds": round(state.context_switch_seconds, 1),
+        "large_paste_count": state.large_paste_count,
+    }
+
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def event_columns(events: Iterable) -> dict[str, np.ndarray]:
+    """Load events into the columnar arrays compute_metrics_bulk expects.
+
+    ``events`` yields rows with candidate_id, task_id, event_code, timestamp,
+    chars_added, metadata_ and the rollup columns (edit_count, linear_edits,
+    ended_at).
+    Rollup rows carry their edit counts in the edit_count and linear_edits
+    arrays, which are 0 for every other row.
+    """
+    candidate_ids, task_ids, codes, timestamps, chars_added = [], [], [], [], []
+    edit_counts, linear_edits, ended = [], [], []
+    for e in events:
+        timestamp = (e.timestamp - _EPOCH) // _MICROSECOND
+        candidate_ids.append(e.candidate_id)
+        task_ids.append(e.task_id)
+        codes.append(e.event_code)
+        timestamps.append(timestamp)
+        chars = edit_chars(e.chars_added, e.metadata_) if e.event_code == CODE_EDIT else e.chars_added
+        chars_added.append(np.nan if chars is None else chars)
+        if e.event_code == CODE_EDIT_ROLLUP:
+            edit_counts.append(e.edit_count)
+            linear_edits.append(e.linear_edits)
+            ended.append((e.ended_at - _EPOCH) // _MICROSECOND)
+        else:
+            edit_counts.append(0)
+            linear_edits.append(0)
+            ended.append(timestamp)
+    return {
+        "candidate_id": np.array(candidate_ids, dtype=np.int64),
+        "task_id": np.array(task_ids, dtype=np.int64),
+        "type_code": np.array(codes, dtype=np.int16),
+        "timestamp": np.array(timestamps, dtype=np.int64),
+        "chars_added": np.array(chars_added, dtype=np.float64),
+        "edit_count": np.array(edit_counts, dtype=np.int64),
+        "linear_edits": np.array(linear_edits, dtype=np.int64),
+        "ended_at": np.array(ended, dtype=np.int64),
     }
 
 
+def _follows(pair_idx, codes, first: int, then: int, mask):
+    """Positions (within ``mask``) of a ``then`` event directly preceded, among
+    the masked events of the same pair, by a ``first`` event."""
+    pairs, kinds = pair_idx[mask], codes[mask]
+    hits = (kinds[1:] == then) & (kinds[:-1] == first) & (pairs[1:] == pairs[:-1])
+    return np.flatnonzero(hits) + 1
+
+
+@metrics_compute_seconds.timed(kind="bulk")
+def compute_metrics_bulk(columns: dict[str, np.ndarray]) -> dict[tuple[int, int], dict[str, Any]]:
+    """compute_metrics for every (candidate_id, task_id) pair at once.
+
+    Returns the EmployerMetrics fields plus edits_per_run, keyed by pair, with
+    the same values compute_metrics gives for each pair's events.
+    """
+    if len(columns["type_code"]) == 0:
+        return {}
+    order = np.lexsort((columns["timestamp"], columns["task_id"], columns["candidate_id"]))
+    candidate_ids = columns["candidate_id"][order]
+    task_ids = columns["task_id"][order]
+    codes = columns["type_code"][order]
+    timestamps = columns["timestamp"][order]
+    chars = columns["chars_added"][order]
+    rolled_edits = columns["edit_count"][order]
+    rolled_linear = columns["linear_edits"][order]
+    ended = columns["ended_at"][order]
+
+    starts = np.flatnonzero(np.r_[True, (candidate_ids[1:] != candidate_ids[:-1]) | (task_ids[1:] != task_ids[:-1])])
+    n_pairs = len(starts)
+    pair_idx = np.repeat(np.arange(n_pairs), np.diff(np.r_[starts, len(codes)]))
+
+    def count(mask):
+        return np.bincount(pair_idx[mask], minlength=n_pairs)
+
+    def total(weights):
+        return np.bincount(pair_idx, weights=weights, minlength=n_pairs).astype(np.int64)
+
+    edit, run, hidden, visible = CODE_EDIT, CODE_RUN, TAB_HIDDEN, TAB_VISIBLE
+    is_edit = codes == edit
+
+    edit_count = count(is_edit) + total(rolled_edits)
+    run_count = count(codes == run)
+    ai_usage_count = count(codes == AI_USED)
+    large_paste_count = count(codes == LARGE_PASTE)
+    linear_typing_edits = count(is_edit & (chars >= 1) & (chars <= 5)) + total(rolled_linear)
+
+    # Refine cycle: an edit whose previous edit/run event was a run. A rollup
+    # stands for a run of edits, so it counts as one edit here.
+    kinds = np.where(codes == CODE_EDIT_ROLLUP, edit, codes)
+    edit_or_run = (kinds == edit) | (codes == run)
+    refines = _follows(pair_idx, kinds, run, edit, edit_or_run)
+    refine_cycles = np.bincount(pair_idx[edit_or_run][refines], minlength=n_pairs)
+
+    # Time away: a tab_visible whose previous hidden/visible event was a tab_hidden
+    tab = (codes == hidden) | (codes == visible)
+    returns = _follows(pair_idx, codes, hidden, visible, tab)
+    tab_times = timestamps[tab]
+    away = (tab_times[returns] - tab_times[returns - 1]) / 1e6
+    context_switch_seconds = np.bincount(pair_idx[tab][returns], weights=away, minlength=n_pairs)
+
+    # A rollup ends after its own timestamp, so the last event to end may not be the last one.
+    total_time = (np.maximum.reduceat(ended, starts) - timestamps[starts]) / 1e6
+
+    result = {}
+    for i in range(n_pairs):
+        edits, runs, linear = int(edit_count[i]), int(run_count[i]), int(linear_typing_edits[i])
+        result[(int(candidate_ids[starts[i]]), int(task_ids[starts[i]]))] = {
+            "total_time_seconds": float(total_time[i]),
+            "edit_count": edits,
+            "run_count": runs,
+            "refine_cycles": int(refine_cycles[i]),
+            "edits_per_run": round(edits / runs, 1) if runs > 0 else 0.0,
+            "linear_typing_ratio": round(linear / edits if edits > 0 else 0.0, 2),
+            "linear_typing_edits": linear,
+            "ai_usage_count": int(ai_usage_count[i]),
+            "context_switch_seconds": round(float(context_switch_seconds[i]), 1),
+            "large_paste_count": int(large_paste_count[i]),
+        }
+    return result
+
+
 def generate_insight(metrics: dict[str, Any]) -> str:
     parts = []
     if metrics["edit_count"] > 20:
@@ -0,0 +1,108 @@
+"""Maintain the candidate_task_metrics summary table.
+
+Rows are updated in the same transaction that inserts their events, so reads
+are a single-row lookup instead of a replay of the whole event history.
+"""
+from itertools import groupby
+from typing import Any
+
+from sqlalchemy import and_, case, delete, select, tuple_
+from sqlalchemy.orm import Session
+
+from event_schema import CODE_EDIT
+from metrics import apply_event, apply_row, edit_chars, event_columns
+from models import CandidateTaskMetrics, Event
+
+# Everything apply_row and compute_metrics read from an event, besides metadata_.
+EVENT_METRIC_COLUMNS = (
+    Event.event_code, Event.timestamp, Event.chars_added, Event.edit_count, Event.linear_edits, Event.ended_at,
+)
+# metadata_ only where the metrics need it: code_edits whose chars_added stayed
+# in the JSON (see edit_chars). Selected in its place to keep replays lean.
+EDIT_METADATA = case(
+    (and_(Event.event_code == CODE_EDIT, Event.chars_added.is_(None)), Event.metadata_),
+).label("metadata_")
+
+
+def _new_row(candidate_id: int, task_id: int) -> CandidateTaskMetrics:
+    return CandidateTaskMetrics(
+        candidate_id=candidate_id, task_id=task_id,
+        edit_count=0, run_count=0, ai_usage_count=0, large_paste_count=0,
+        linear_typing_edits=0, refine_cycles=0, last_was_run=False, context_switch_seconds=0.0,
+    )
+
+
+def _replay(db: Session, candidate_id: int, task_id: int, row: CandidateTaskMetrics) -> CandidateTaskMetrics:
+    fresh = _new_row(candidate_id, task_id)
+    events = db.execute(
+        select(*EVENT_METRIC_COLUMNS, EDIT_METADATA)
+        .where(Event.candidate_id == candidate_id, Event.task_id == task_id)
+        .order_by(Event.timestamp)
+        .execution_options(yield_per=1000)
+    )
+    for e in events:
+        apply_row(fresh, e)
+    for column in CandidateTaskMetrics.__table__.columns:
+        setattr(row, column.key, getattr(fresh, column.key))
+    return row
+
+
+def update_metrics(db: Session, rows: list[dict[str, Any]]):
+    """Fold freshly inserted event rows into their summary rows.
+
+    A pair that receives an event older than its latest one is rebuilt from
+    the events table instead, since the state machines assume time order.
+    """
+    by_pair = sorted(rows, key=lambda r: (r["candidate_id"], r["task_id"], r["timestamp"]))
+    pairs = {(r["candidate_id"], r["task_id"]) for r in by_pair}
+    existing = {
+        (m.candidate_id, m.task_id): m
+        for m in db.scalars(
+            select(CandidateTaskMetrics)
+            .where(tuple_(CandidateTaskMetrics.candidate_id, CandidateTaskMetrics.task_id).in_(pairs))
+            .with_for_update()
+        )
+    }
+    for (candidate_id, task_id), events in groupby(by_pair, key=lambda r: (r["candidate_id"], r["task_id"])):
+        events = list(events)
+        row = existing.get((candidate_id, task_id))
+        if row is None:
+            # Replaying also picks up history recorded before the table existed.
+            db.add(_replay(db, candidate_id, task_id, _new_row(candidate_id, task_id)))
+            continue
+        if row.last_event_at and events[0]["timestamp"] < row.last_event_at:
+            _replay(db, candidate_id, task_id, row)
+            continue
+        for e in events:
+            chars_added = edit_chars(e.get("chars_added"), e.get("metadata_")) if e["event_code"] == CODE_EDIT else None
+            apply_event(row, e["event_code"], e["timestamp"], chars_added)
+    # Sessions here don't autoflush; make new rows visible to later lookups.
+    db.flush()
+
+
+def rebuild_metrics(db: Session, batch_size: int = 10000) -> int:
+    """Recompute every summary row from the events table; returns rows written."""
+    db.execute(delete(CandidateTaskMetrics))
+    events = db.execute(
+        select(Event.candidate_id, Event.task_id, *EVENT_METRIC_COLUMNS, EDIT_METADATA)
+        .order_by(Event.candidate_id, Event.task_id, Event.timestamp)
+        .execution_options(yield_per=batch_size)
+    )
+    written = 0
+    for (candidate_id, task_id), group in groupby(events, key=lambda e: (e.candidate_id, e.task_id)):
+        row = _new_row(candidate_id, task_id)
+        for e in group:
+            apply_row(row, e)
+        db.add(row)
+        written += 1
+        if written % 1000 == 0:
+            db.flush()
+    return written
+
+
+def load_event_columns(db: Session, task_id: int | None = None, batch_size: int = 10000):
+    """Columnar arrays of every event (optionally for one task), for compute_metrics_bulk."""
+    query = select(Event.candidate_id, Event.task_id, *EVENT_METRIC_COLUMNS, EDIT_METADATA)
+    if task_id is not None:
+        query = query.where(Event.task_id == task_id)
+    return event_columns(db.execute(query.order_by(Event.id).execution_options(yield_per=batch_size)))
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, SmallInteger, String, Text, DateTime, ForeignKey, Boolean, Float, Index
 from datetime import datetime
 from database import Base
 
@@ -25,6 +25,19 @@ class Task(Base):
     title = Column(String(255), nullable=False)
     description = Column(Text, nullable=False)
     expected_time = Column(Integer, nullable=False)
+    # Comma-separated function names the tests call, in order of preference.
+    entry_points = Column(String(255), nullable=True)
+    # JSON list of {"args": [...], "expected": ...}; kept as text so it can be
+    # shipped to the sandbox workers without re-encoding.
+    test_cases = Column(Text, nullable=True)
+    test_cases_version = Column(Integer, nullable=False, default=1, server_default="1")
+
+
+class EventType(Base):
+    """Names for Event.event_code; see event_schema for the built-in codes."""
+    __tablename__ = "event_types"
+    id = Column(SmallInteger, primary_key=True, autoincrement=False)
+    name = Column(String(64), unique=True, nullable=False)
 
 
 class Event(Base):
@@ -32,10 +45,23 @@ class Event(Base):
     id = Column(Integer, primary_key=True, index=True)
     candidate_id = Column(Integer, ForeignKey("candidates.id"), nullable=False)
     task_id = Column(Integer, ForeignKey("tasks.id"), nullable=False)
-    event_type = Column(String(64), nullable=False)
+    event_code = Column(SmallInteger, ForeignKey("event_types.id"), nullable=False)
+    # Payload fields read by the metrics, split out of the JSON.
+    chars_added = Column(Integer, nullable=True)
+    chars = Column(Integer, nullable=True)
+    # JSON for the remaining payload (AI prompts, paste previews); usually empty.
     metadata_ = Column(Text, nullable=True)
+    # code_edit_rollup rows only: edits rolled up, how many were linear typing,
+    # and the last one's timestamp (timestamp is the first's).
+    edit_count = Column(Integer, nullable=True)
+    linear_edits = Column(Integer, nullable=True)
+    ended_at = Column(DateTime, nullable=True)
     timestamp = Column(DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        Index("ix_events_candidate_task_timestamp", "candidate_id", "task_id", "timestamp"),
+    )
+
 
 class Submission(Base):
     __tablename__ = "submissions"
@@ -47,4 +73,56 @@ class Submission(Base):
     tests_passed = Column(Integer, nullable=True)
     tests_total = Column(Integer, nullable=True)
     test_results = Column(Text, nullable=True)
+    # Client-chosen key (the Idempotency-Key header); a retried POST /submit
+    # with the same key gets the original submission back.
+    idempotency_key = Column(String(64), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_submissions_candidate_task", "candidate_id", "task_id"),
+        Index("ix_submissions_candidate_idempotency_key", "candidate_id", "idempotency_key", unique=True),
+    )
+
+
+class GradingJob(Base):
+    """Runs a submission's tests; see grading for how workers claim them."""
+    __tablename__ = "grading_jobs"
+    id = Column(Integer, primary_key=True)
+    # One job per submission, so a submission is never graded twice.
+    submission_id = Column(Integer, ForeignKey("submissions.id"), unique=True, nullable=False)
+    # queued -> running -> done (tests ran, whatever the outcome) or failed
+    status = Column(String(16), nullable=False, default="queued")
+    attempts = Column(Integer, nullable=False, default=0)
+    # The worker holding a running job, and until when; an expired lease
+    # means the worker died and the job is claimed again.
+    worker = Column(String(128), nullable=True)
+    locked_until = Column(DateTime, nullable=True)
+    # The run error of a done job, or why a failed job gave up.
+    error = Column(Text, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_grading_jobs_status_id", "status", "id"),
+    )
+
+
+class CandidateTaskMetrics(Base):
+    """Running workflow metrics per (candidate, task), folded in as events arrive."""
+    __tablename__ = "candidate_task_metrics"
+    candidate_id = Column(Integer, ForeignKey("candidates.id"), primary_key=True)
+    task_id = Column(Integer, ForeignKey("tasks.id"), primary_key=True)
+    first_event_at = Column(DateTime, nullable=True)
+    last_event_at = Column(DateTime, nullable=True)
+    edit_count = Column(Integer, nullable=False, default=0)
+    run_count = Column(Integer, nullable=False, default=0)
+    ai_usage_count = Column(Integer, nullable=False, default=0)
+    large_paste_count = Column(Integer, nullable=False, default=0)
+    linear_typing_edits = Column(Integer, nullable=False, default=0)
+    refine_cycles = Column(Integer, nullable=False, default=0)
+    # Refine-cycle state: whether the latest edit/run event was a run
+    last_was_run = Column(Boolean, nullable=False, default=False)
+    # Start of the current tab_hidden stretch, if the tab is hidden
+    hidden_since = Column(DateTime, nullable=True)
+    context_switch_seconds = Column(Float, nullable=False, default=0.0)
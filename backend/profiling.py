@@ -0,0 +1,216 @@
+"""Opt-in per-request profiling for diagnosing slow endpoints on live traffic.
+
+A request is profiled when it carries an ``X-Profile-Token`` header matching
+PROFILE_TOKEN, or at random for a PROFILE_SAMPLE_RATE fraction of requests.
+Both are off by default. A profiled request gets:
+
+- a cProfile of its endpoint function, taken in whichever thread runs it
+  (sync endpoints run on the threadpool, so this is done by ProfiledRoute
+  rather than the middleware)
+- the number of SQL statements it issued and the time spent in them
+
+The last PROFILE_KEEP profiles are kept in memory and listed under
+/debug/profiles; the response carries an ``X-Profile-Id`` header pointing at
+its profile. For async endpoints the profile covers the event loop thread
+while the endpoint runs, so it can include other requests' work too.
+"""
+import cProfile
+import contextvars
+import functools
+import hmac
+import inspect
+import io
+import itertools
+import marshal
+import os
+import pstats
+import random
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any
+
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN") or None
+SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+KEEP = int(os.getenv("PROFILE_KEEP", "50"))
+# Functions listed in a profile's summary, by cumulative time.
+TOP_FUNCTIONS = 30
+# Requests under this prefix (the profile endpoints themselves) are never profiled.
+DEBUG_PREFIX = "/debug/"
+
+
+class RequestProfile:
+    def __init__(self, method: str, path: str):
+        self.id = next(_ids)
+        self.method = method
+        self.path = path
+        self.route: str | None = None
+        self.status: int | None = None
+        self.started_at = datetime.utcnow()
+        self.duration = 0.0
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.profiler = cProfile.Profile()
+        self._lock = threading.Lock()
+
+    def record_query(self, seconds: float):
+        with self._lock:
+            self.sql_count += 1
+            self.sql_seconds += seconds
+
+    def summary(self) -> dict[str, Any]:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "status": self.status,
+            "started_at": self.started_at.isoformat(),
+            "duration_ms": self.duration * 1000,
+            "sql_count": self.sql_count,
+            "sql_ms": self.sql_seconds * 1000,
+        }
+
+    def report(self) -> str:
+        out = io.StringIO()
+        try:
+            pstats.Stats(self.profiler, stream=out).sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+        except TypeError:
+            # Nothing was profiled (e.g. the request never reached an endpoint).
+            return ""
+        return out.getvalue()
+
+    def dump(self) -> bytes:
+        """The profile in the .prof format read by pstats, snakeviz and friends."""
+        self.profiler.create_stats()
+        return marshal.dumps(self.profiler.stats)
+
+
+_ids = itertools.count(1)
+_current: contextvars.ContextVar[RequestProfile | None] = contextvars.ContextVar("request_profile", default=None)
+_profiles: OrderedDict[int, RequestProfile] = OrderedDict()
+_profiles_lock = threading.Lock()
+
+
+def token_matches(value: str | None) -> bool:
+    return PROFILE_TOKEN is not None and value is not None and hmac.compare_digest(value, PROFILE_TOKEN)
+
+
+def _store(profile: RequestProfile):
+    with _profiles_lock:
+        _profiles[profile.id] = profile
+        while len(_profiles) > KEEP:
+            _profiles.popitem(last=False)
+
+
+def list_profiles() -> list[dict[str, Any]]:
+    with _profiles_lock:
+        return [p.summary() for p in reversed(_profiles.values())]
+
+
+def get_profile(profile_id: int) -> RequestProfile | None:
+    with _profiles_lock:
+        return _profiles.get(profile_id)
+
+
+def instrument_engine(engine):
+    """Count SQL statements (and time spent in them) per profiled request."""
+    @event.listens_for(engine, "before_cursor_execute")
+    def before(conn, cursor, statement, parameters, context, executemany):
+        if _current.get() is not None:
+            conn.info.setdefault("profile_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after(conn, cursor, statement, parameters, context, executemany):
+        profile = _current.get()
+        if profile is not None and conn.info.get("profile_query_start"):
+            profile.record_query(time.perf_counter() - conn.info["profile_query_start"].pop())
+
+
+# cProfile allows one active profiler per thread; overlapping async requests
+# on the event loop leave all but the first unprofiled.
+_active = threading.local()
+
+
+@contextmanager
+def _profiling():
+    profile = _current.get()
+    if profile is None or getattr(_active, "profile", None) is not None:
+        yield
+        return
+    _active.profile = profile
+    profile.profiler.enable()
+    try:
+        yield
+    finally:
+        profile.profiler.disable()
+        _active.profile = None
+
+
+def _profiled(call):
+    """Wrap an endpoint so it runs under the request's profiler, if any."""
+    if inspect.iscoroutinefunction(call):
+        @functools.wraps(call)
+        async def endpoint(*args, **kwargs):
+            with _profiling():
+                return await call(*args, **kwargs)
+    else:
+        @functools.wraps(call)
+        def endpoint(*args, **kwargs):
+            with _profiling():
+                return call(*args, **kwargs)
+    return endpoint
+
+
+class ProfiledRoute(APIRoute):
+    """APIRoute whose endpoint can be profiled; set as the app's route_class."""
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        super().__init__(path, endpoint, **kwargs)
+        # The request handler built above calls dependant.call at request time.
+        self.dependant.call = _profiled(self.dependant.call)
+
+
+class ProfilingMiddleware:
+    """ASGI middleware that decides which requests to profile and stores the results."""
+
+    def __init__(self, app):
+        self.app = app
+
+    def _wanted(self, scope) -> bool:
+        if scope["type"] != "http" or scope["path"].startswith(DEBUG_PREFIX):
+            return False
+        if PROFILE_TOKEN is not None:
+            for name, value in scope["headers"]:
+                if name == b"x-profile-token":
+                    return token_matches(value.decode("latin-1"))
+        return SAMPLE_RATE > 0 and random.random() < SAMPLE_RATE
+
+    async def __call__(self, scope, receive, send):
+        if not self._wanted(scope):
+            await self.app(scope, receive, send)
+            return
+        profile = RequestProfile(scope["method"], scope["path"])
+        reset = _current.set(profile)
+        start = time.perf_counter()
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                profile.status = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"x-profile-id", str(profile.id).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            _current.reset(reset)
+            profile.duration = time.perf_counter() - start
+            profile.route = getattr(scope.get("route"), "path", None)
+            _store(profile)
@@ -0,0 +1,105 @@
+"""Query-plan regression check for the API's hot queries.
+
+Builds a throwaway SQLite database, drives the endpoint handlers, the event
+ingestion path, the grading queue, the exports and compaction against it while
+recording every SELECT, UPDATE and DELETE they issue, then runs EXPLAIN QUERY
+PLAN on each one. Any plan that scans a hot table instead of searching an
+index is reported.
+"""
+import asyncio
+import re
+from datetime import datetime, timedelta
+
+from fastapi import Response
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+
+from database import Base, create_db_engine, migrate
+from compaction import compact_events
+from event_buffer import store_events
+import export
+import grading
+from models import Candidate, Submission
+
+# Statements whose plans are checked.
+CHECKED_STATEMENTS = ("SELECT", "UPDATE", "DELETE")
+# Tables that grow with traffic; a full scan of these is a regression.
+HOT_TABLES = ("events", "submissions", "grading_jobs")
+SCAN_RE = re.compile(r"^SCAN (%s)\b" % "|".join(HOT_TABLES))
+# Statements that read a whole table on purpose.
+FULL_READS = (
+    "SELECT count(*) AS count_1 FROM events",  # compaction's on-disk bytes per row
+)
+
+
+def _exercise(db):
+    import main
+
+    main.seed_task(db)
+    db.add(Candidate(email="plan@example.com", password_hash="x"))
+    db.commit()
+    start = datetime(2026, 1, 1)
+    rows = [
+        {"candidate_id": 1, "task_id": 1, "event_type": event_type, "metadata_": None, "timestamp": start + timedelta(seconds=i)}
+        for i, event_type in enumerate(["task_started", "code_edit", "code_run", "code_edit", "ai_used", "large_paste"])
+    ]
+    store_events(db, rows)
+    # An out-of-order event forces a replay from the events table.
+    store_events(db, [{**rows[1], "timestamp": start - timedelta(seconds=1)}])
+    db.add(Submission(candidate_id=1, task_id=1, final_code="", tests_passed=0, tests_total=0))
+    db.commit()
+    job_id, _ = grading.enqueue(db, 1, 1, "", None, idempotency_key="plan")
+
+    yield "GET /tasks", lambda: main.list_tasks(candidate_id=1, if_none_match=None, db=db)
+    yield "GET /tasks/{task_id}", lambda: main.get_task(1, if_none_match=None, db=db)
+    yield "GET /employer/{candidate_id}/{task_id}", lambda: main.employer_view(1, 1, db=db)
+    for params in ({}, {"task_id": 1, "submitted": True, "sort": "last_activity", "limit": 10}):
+        args = {"task_id": None, "submitted": None, "email": None, "sort": "candidate", "order": "asc", "limit": None, "offset": 0}
+        args.update(params)
+        yield "GET /recruiter/candidates", lambda: main.recruiter_candidates(Response(), db=db, **args)
+    yield "POST /submit (retry)", lambda: grading.enqueue(db, 1, 1, "", None, idempotency_key="plan")
+    yield "GET /grading/jobs/{job_id}", lambda: main.grading_job(job_id, db=db)
+    yield "grading worker (claim)", lambda: grading.claim_job(db, "plan")
+    # An unfiltered export reads every row by design; filtered ones must not.
+    for dataset in export.DATASETS:
+        for filters in (export.ExportFilters(task_id=1), export.ExportFilters(1, start, start + timedelta(days=1), True)):
+            yield f"GET /export/{dataset}", lambda: list(export.export(dataset, "ndjson", filters, lambda: db))
+    yield "manage.py compact-events", lambda: compact_events(db, older_than=timedelta(0), dry_run=True)
+
+
+def check_query_plans() -> list[tuple[str, str, list[str]]]:
+    """Return (endpoint, statement, plan) for every query that scans a hot table."""
+    engine = create_db_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    migrate(engine)
+    db = sessionmaker(bind=engine, autoflush=False)()
+
+    captured: list[tuple[str, str, object]] = []
+    current = ["setup"]
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(CHECKED_STATEMENTS) and not executemany:
+            captured.append((current[0], statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        for endpoint, call in _exercise(db):
+            current[0] = endpoint
+            result = call()
+            if asyncio.iscoroutine(result):
+                asyncio.run(result)
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+    problems = []
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        for endpoint, statement, parameters in captured:
+            plan = [row[3] for row in cursor.execute("EXPLAIN QUERY PLAN " + statement, parameters)]
+            if any(SCAN_RE.match(step) for step in plan) and " ".join(statement.split()) not in FULL_READS:
+                problems.append((endpoint, statement, plan))
+    finally:
+        raw.close()
+        db.close()
+    return problems
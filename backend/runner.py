@@ -1,125 +1,264 @@
 """Run submitted code against test cases."""
+import asyncio
+import hashlib
 import subprocess
 import tempfile
+import threading
 import json
 import os
+import shutil
+import signal
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 from typing import Any
 
-TASK_TEST_CASES = {
-    1: [  # FizzBuzz
-        {"args": [1], "expected": ["1"]},
-        {"args": [3], "expected": ["1", "2", "Fizz"]},
-        {"args": [5], "expected": ["1", "2", "Fizz", "4", "Buzz"]},
-        {"args": [15], "expected": ["1", "2", "Fizz", "4", "Buzz", "Fizz", "7", "8", "Fizz", "Buzz", "11", "Fizz", "13", "14", "FizzBuzz"]},
-        {"args": [16], "expected": ["1", "2", "Fizz", "4", "Buzz", "Fizz", "7", "8", "Fizz", "Buzz", "11", "Fizz", "13", "14", "FizzBuzz", "16"]},
-    ],
-    2: [  # Palindrome Checker
-        {"args": ["racecar"], "expected": True},
-        {"args": ["A man, a plan, a canal: Panama"], "expected": True},
-        {"args": ["hello"], "expected": False},
-        {"args": ["12321"], "expected": True},
-        {"args": ["not a palindrome"], "expected": False},
-    ],
-    3: [  # Fibonacci
-        {"args": [0], "expected": 0},
-        {"args": [1], "expected": 1},
-        {"args": [2], "expected": 1},
-        {"args": [5], "expected": 5},
-        {"args": [10], "expected": 55},
-    ],
-}
-
-RUNNER_SCRIPT = '''
+import task_registry
+from cache import LRUCache
+from instrumentation import runner_execution_seconds, runner_results, runner_spawn_seconds
+from task_registry import TaskSpec
+from worker_pool import WorkerPool
+
+# Number of pre-spawned sandbox workers; 0 falls back to a fresh interpreter per run.
+POOL_SIZE = int(os.getenv("RUNNER_POOL_SIZE", "4"))
+# Jobs a worker serves before it is replaced with a clean interpreter.
+POOL_MAX_JOBS = int(os.getenv("RUNNER_POOL_MAX_JOBS", "100"))
+# Executions allowed at once through the async API, and how many more may wait.
+MAX_CONCURRENCY = int(os.getenv("RUNNER_MAX_CONCURRENCY", str(POOL_SIZE or 4)))
+MAX_QUEUED = int(os.getenv("RUNNER_MAX_QUEUED", "16"))
+# Results remembered for identical code; 0 disables the cache. With a directory
+# set, results also persist on disk across restarts.
+CACHE_SIZE = int(os.getenv("RUNNER_CACHE_SIZE", "1024"))
+CACHE_DIR = os.getenv("RUNNER_CACHE_DIR") or None
+# Per-test-case limits for submissions run on the worker pool. Each case runs in
+# its own process with this much CPU and wall-clock time, up to CASE_PARALLELISM
+# at once; the submission as a whole still gets timeout_seconds.
+CASE_TIMEOUT_SECONDS = float(os.getenv("RUNNER_CASE_TIMEOUT_SECONDS", "2"))
+CASE_PARALLELISM = int(os.getenv("RUNNER_CASE_PARALLELISM", "2"))
+FAIL_FAST = os.getenv("RUNNER_FAIL_FAST", "false").lower() in ("1", "true", "yes")
+# Address-space limit for candidate code, in MB; 0 disables it.
+MEMORY_LIMIT_MB = int(os.getenv("RUNNER_MEMORY_LIMIT_MB", "512"))
+# Extra wall-clock time the pool allows a job beyond its budget for bookkeeping.
+JOB_GRACE_SECONDS = 2
+# Where sandbox working directories are created (e.g. /dev/shm for tmpfs);
+# defaults to the system temp directory.
+SANDBOX_DIR = os.getenv("RUNNER_SANDBOX_DIR") or None
+
+
+class RunnerBusy(Exception):
+    """Raised when the execution queue is full and the caller should retry later."""
+
+
+WORKER_SCRIPT = '''
+import inspect
+import io
 import json
+import os
+import select
+import shutil
+import signal
 import sys
-import re
+import tempfile
+import time
+import traceback
+
+try:
+    import resource
+except ImportError:
+    resource = None
 
-with open("solution.py", "r", encoding="utf-8") as f:
-    code = f.read()
+# Warm the imports candidates reach for most often.
+import collections, functools, itertools, math, re, string
 
-with open("test_cases.json", "r", encoding="utf-8") as f:
-    test_cases = json.load(f)
+JOB_CPU_GRACE_SECONDS = 5
+can_fork = hasattr(os, "fork")
 
-namespace = {}
-try:
-    exec(code, namespace)
-except Exception as e:
-    print(json.dumps({"error": f"Syntax/runtime error: {e}", "results": []}))
-    sys.exit(0)
-
-# Try to find the function based on common names or task-specific names
-fn = (
-    namespace.get("fizzbuzz") or 
-    namespace.get("fizz_buzz") or 
-    namespace.get("is_palindrome") or 
-    namespace.get("palindrome") or 
-    namespace.get("fibonacci") or 
-    namespace.get("fib")
-)
-
-if fn is None:
-    # Fallback: try to find any defined function if only one exists
+
+def find_function(namespace, entry_points):
+    for name in entry_points:
+        fn = namespace.get(name)
+        if callable(fn):
+            return fn
     functions = [v for k, v in namespace.items() if callable(v) and not k.startswith("__")]
     if len(functions) == 1:
-        fn = functions[0]
+        return functions[0]
+    return None
+
+
+def apply_limits(cpu_seconds=None, memory_mb=None):
+    if resource is None:
+        return
+    if cpu_seconds:
+        soft, hard = resource.getrlimit(resource.RLIMIT_CPU)
+        cpu = max(1, math.ceil(cpu_seconds))
+        if hard != resource.RLIM_INFINITY:
+            cpu = min(cpu, hard - 1)
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu + 1 if hard == resource.RLIM_INFINITY else hard))
+    if memory_mb:
+        limit = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
 
-if fn is None:
-    print(json.dumps({"error": "Function not found. Please ensure your function name matches the task (e.g., fizzbuzz, is_palindrome, or fibonacci).", "results": []}))
-    sys.exit(0)
 
-results = []
-for tc in test_cases:
+def run_case(fn, tc):
     args = tc["args"]
-    expected = tc["expected"]
     try:
         if isinstance(args, list):
             got = fn(*args)
         else:
             got = fn(args)
-        passed = got == expected
-        results.append({"input": args, "expected": expected, "got": got, "passed": passed, "error": None})
+        return {"got": got, "passed": got == tc["expected"], "error": None}
     except Exception as e:
-        results.append({"input": args, "expected": expected, "got": None, "passed": False, "error": str(e)})
+        return {"got": None, "passed": False, "error": str(e) or type(e).__name__}
 
-print(json.dumps({"error": None, "results": results}))
-'''
 
-RUN_CODE_SCRIPT = '''
-import sys
-with open("solution.py", "r", encoding="utf-8") as f:
-    code = f.read()
-namespace = {}
-try:
-    exec(code, namespace)
-except Exception as e:
-    import traceback
-    traceback.print_exc()
-    sys.exit(1)
-
-# Try to find the function
-fn = (
-    namespace.get("fizzbuzz") or 
-    namespace.get("fizz_buzz") or 
-    namespace.get("is_palindrome") or 
-    namespace.get("palindrome") or 
-    namespace.get("fibonacci") or 
-    namespace.get("fib")
-)
-
-if fn is None:
-    functions = [v for k, v in namespace.items() if callable(v) and not k.startswith("__")]
-    if len(functions) == 1:
-        fn = functions[0]
+def case_result(tc, outcome):
+    return {"input": tc["args"], "expected": tc["expected"], **outcome}
+
+
+def failed(error):
+    return {"got": None, "passed": False, "error": error}
+
+
+def start_case(fn, tc, limits):
+    r, w = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(r)
+        try:
+            apply_limits(cpu_seconds=limits.get("case_timeout"))
+            payload = json.dumps(run_case(fn, tc), default=repr).encode()
+            with os.fdopen(w, "wb") as f:
+                f.write(payload)
+        finally:
+            os._exit(0)
+    os.close(w)
+    return pid, r
+
+
+def finish_case(pid, payload):
+    _, status = os.waitpid(pid, 0)
+    if payload:
+        return json.loads(payload)
+    if os.WIFSIGNALED(status) and os.WTERMSIG(status) == signal.SIGXCPU:
+        return failed("CPU time limit exceeded")
+    if os.WIFSIGNALED(status):
+        return failed(f"Crashed (signal {os.WTERMSIG(status)})")
+    return failed("Exited without a result")
+
+
+def run_cases_forked(fn, test_cases, limits, deadline):
+    """Each case in its own child, up to ``parallel`` at once, each with its own
+    CPU and wall-clock limit. Returns (outcomes, incomplete)."""
+    case_timeout = limits.get("case_timeout") or None
+    parallel = max(1, limits.get("parallel") or 1)
+    fail_fast = limits.get("fail_fast")
+    outcomes = [None] * len(test_cases)
+    pending = collections.deque(range(len(test_cases)))
+    running = {}  # fd -> [index, pid, case deadline, chunks]
+    stopped = None
+    incomplete = False
+
+    def stop_all(reason):
+        for fd, (i, pid, _, _) in running.items():
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+            os.close(fd)
+            outcomes[i] = failed(reason)
+        running.clear()
+
+    while (pending and stopped is None) or running:
+        while pending and stopped is None and len(running) < parallel:
+            if time.monotonic() >= deadline:
+                stopped = "Not run: the submission's time budget ran out"
+                incomplete = True
+                break
+            i = pending.popleft()
+            pid, fd = start_case(fn, test_cases[i], limits)
+            case_deadline = min(deadline, time.monotonic() + case_timeout) if case_timeout else deadline
+            running[fd] = [i, pid, case_deadline, []]
+        if not running:
+            break
+
+        wait = max(0.0, min(entry[2] for entry in running.values()) - time.monotonic())
+        ready, _, _ = select.select(list(running), [], [], wait)
+        for fd in ready:
+            chunk = os.read(fd, 65536)
+            if chunk:
+                running[fd][3].append(chunk)
+                continue
+            os.close(fd)
+            i, pid, _, chunks = running.pop(fd)
+            outcomes[i] = finish_case(pid, b"".join(chunks))
+            if fail_fast and not outcomes[i]["passed"] and stopped is None:
+                stopped = "Not run: an earlier case failed"
+
+        now = time.monotonic()
+        for fd, (i, pid, case_deadline, _) in list(running.items()):
+            if now >= case_deadline:
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+                os.close(fd)
+                del running[fd]
+                if case_deadline >= deadline:
+                    outcomes[i] = failed("Stopped: the submission's time budget ran out")
+                else:
+                    outcomes[i] = failed(f"Timed out after {case_timeout:g}s")
+                incomplete = True
+                if fail_fast and stopped is None:
+                    stopped = "Not run: an earlier case failed"
+        if stopped is not None:
+            stop_all(stopped)
+
+    for i in pending:
+        outcomes[i] = failed(stopped)
+    return outcomes, incomplete
+
+
+def run_cases_inline(fn, test_cases, limits):
+    outcomes = []
+    for tc in test_cases:
+        if outcomes and limits.get("fail_fast") and not outcomes[-1]["passed"]:
+            outcomes.append(failed("Not run: an earlier case failed"))
+            continue
+        outcomes.append(run_case(fn, tc))
+    return outcomes, False
+
 
-if fn is not None:
+def run_tests(code, test_cases, entry_points, limits, deadline):
+    namespace = {}
     try:
-        # Task-specific default test for "Run" button
-        import inspect
-        sig = inspect.signature(fn)
-        params = list(sig.parameters.values())
-        
+        exec(code, namespace)
+    except Exception as e:
+        return {"error": f"Syntax/runtime error: {e}", "results": []}
+
+    fn = find_function(namespace, entry_points)
+    if fn is None:
+        hint = f" (e.g., {', '.join(entry_points)})" if entry_points else ""
+        return {"error": f"Function not found. Please ensure your function name matches the task{hint}.", "results": []}
+
+    if can_fork:
+        outcomes, incomplete = run_cases_forked(fn, test_cases, limits, deadline)
+    else:
+        outcomes, incomplete = run_cases_inline(fn, test_cases, limits)
+    results = [case_result(tc, outcome) for tc, outcome in zip(test_cases, outcomes)]
+    return {"error": None, "results": results, "incomplete": incomplete}
+
+
+def show_output(code, entry_points):
+    namespace = {}
+    try:
+        exec(code, namespace)
+    except Exception:
+        traceback.print_exc()
+        return
+
+    fn = find_function(namespace, entry_points)
+    if fn is None:
+        print("(Define your function to see output here)")
+        return
+    try:
+        params = list(inspect.signature(fn).parameters.values())
         if len(params) == 1:
-            # Try a reasonable default based on name
             name = fn.__name__.lower()
             if "palindrome" in name:
                 val = "racecar"
@@ -127,80 +266,425 @@ if fn is not None:
                 val = 10
             else:
                 val = 15
-            
             result = fn(val)
             print(f"Output for {fn.__name__}({repr(val)}):")
             print(result)
         else:
             print(f"(Function {fn.__name__} defined. Click Submit to run all tests.)")
-    except Exception as e:
-        import traceback
+    except Exception:
         traceback.print_exc()
-else:
-    print("(Define your function to see output here)")
-'''
 
 
-def run_tests(task_id: int, code: str, timeout_seconds: int = 10) -> dict[str, Any]:
-    test_cases = TASK_TEST_CASES.get(task_id, [])
-    if not test_cases:
-        return {"tests_passed": 0, "tests_total": 0, "results": [], "run_error": "No test cases for this task"}
-
-    with tempfile.TemporaryDirectory() as tmpdir:
-        solution_path = os.path.join(tmpdir, "solution.py")
-        tests_path = os.path.join(tmpdir, "test_cases.json")
-        runner_path = os.path.join(tmpdir, "runner.py")
-
-        with open(solution_path, "w", encoding="utf-8") as f:
-            f.write(code)
-        with open(tests_path, "w", encoding="utf-8") as f:
-            json.dump(test_cases, f)
-        with open(runner_path, "w", encoding="utf-8") as f:
-            f.write(RUNNER_SCRIPT)
+def run_code(code, entry_points):
+    stdout, stderr = io.StringIO(), io.StringIO()
+    sys.stdout, sys.stderr = stdout, stderr
+    try:
+        show_output(code, entry_points)
+    finally:
+        sys.stdout, sys.stderr = sys.__stdout__, sys.__stderr__
+    return {"stdout": stdout.getvalue(), "stderr": stderr.getvalue()}
+
 
+def handle(job):
+    limits = job.get("limits") or {}
+    deadline = time.monotonic() + (limits.get("budget") or 3600)
+    entry_points = job.get("entry_points") or ()
+    if job["mode"] == "tests":
+        return run_tests(job["code"], job["test_cases"], entry_points, limits, deadline)
+    return run_code(job["code"], entry_points)
+
+
+def run_forked(job, channels):
+    # Each job works in a directory of its own, removed afterwards, so nothing
+    # one job writes is there for the next to find.
+    workdir = tempfile.mkdtemp(prefix="job-", dir=os.getcwd())
+    r, w = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(r)
+        for channel in channels:
+            channel.close()
         try:
-            result = subprocess.run(
-                ["python", "runner.py"],
-                cwd=tmpdir,
-                capture_output=True,
-                text=True,
-                timeout=timeout_seconds,
+            os.chdir(workdir)
+            limits = job.get("limits") or {}
+            # Backstop only: the pool's wall-clock timeout fires first for any
+            # single-threaded job, and a timeout is reported (and not cached) as such.
+            budget = limits.get("budget")
+            apply_limits(
+                cpu_seconds=budget + JOB_CPU_GRACE_SECONDS if budget else None,
+                memory_mb=limits.get("memory_mb"),
             )
-            output = result.stdout.strip()
-            if not output:
-                return {"tests_passed": 0, "tests_total": len(test_cases), "results": [], "run_error": result.stderr or "No output"}
-            data = json.loads(output)
-            if data.get("error"):
-                return {"tests_passed": 0, "tests_total": len(test_cases), "results": [], "run_error": data["error"]}
-            results = data.get("results", [])
-            passed = sum(1 for r in results if r.get("passed"))
-            return {"tests_passed": passed, "tests_total": len(test_cases), "results": results, "run_error": None}
+            payload = json.dumps(handle(job), default=repr).encode()
+            with os.fdopen(w, "wb") as f:
+                f.write(payload)
+        finally:
+            os._exit(0)
+    os.close(w)
+    with os.fdopen(r, "rb") as f:
+        payload = f.read()
+    os.waitpid(pid, 0)
+    shutil.rmtree(workdir, ignore_errors=True)
+    return json.loads(payload) if payload else None
+
+
+def main():
+    # Keep private copies of the protocol pipes, then point fds 0/1 at devnull
+    # so candidate code can neither read jobs nor corrupt replies.
+    requests = os.fdopen(os.dup(0), "r", encoding="utf-8")
+    replies = os.fdopen(os.dup(1), "w", encoding="utf-8")
+    devnull = os.open(os.devnull, os.O_RDWR)
+    os.dup2(devnull, 0)
+    os.dup2(devnull, 1)
+    sys.stdin = open(os.devnull, "r")
+
+    for line in requests:
+        job = json.loads(line)
+        if can_fork:
+            result = run_forked(job, (requests, replies))
+        else:
+            try:
+                result = json.loads(json.dumps(handle(job), default=repr))
+            except BaseException:
+                result = None
+        # Without fork the job ran in this interpreter, so it must not be reused.
+        replies.write(json.dumps({"result": result, "recycle": not can_fork}) + "\\n")
+        replies.flush()
+
+
+main()
+'''
+# -I leaves the working directory (and PYTHON* variables) out of the harness's
+# sys.path, so candidates can't swap in their own copy of a module.
+HARNESS_COMMAND = [sys.executable, "-I", "-c", WORKER_SCRIPT]
+
+_pool: WorkerPool | None = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> WorkerPool | None:
+    global _pool
+    if POOL_SIZE <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = WorkerPool(
+                HARNESS_COMMAND, size=POOL_SIZE, max_jobs=POOL_MAX_JOBS, sandbox_dir=SANDBOX_DIR,
+            )
+        return _pool
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
+
+
+# Without the pool each run starts a fresh interpreter on the same harness and
+# hands it the job on stdin, so nothing but its own empty working directory is
+# written to disk per run, and that is removed once the run is over.
+def _cold_process_args(sandbox: str) -> dict[str, Any]:
+    return {
+        "cwd": sandbox,
+        "stdin": subprocess.PIPE,
+        "stdout": subprocess.PIPE,
+        "stderr": subprocess.PIPE,
+        # The harness forks per job and per case; a timeout takes the whole group down.
+        "start_new_session": os.name == "posix",
+    }
+
+
+def _kill_cold(proc):
+    try:
+        if os.name == "posix":
+            os.killpg(proc.pid, signal.SIGKILL)
+        else:
+            proc.kill()
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def _encode_job(job: dict[str, Any] | str) -> bytes:
+    return (job if isinstance(job, str) else json.dumps(job)).encode() + b"\n"
+
+
+def _cold_reply(stdout: bytes, stderr: bytes) -> dict[str, Any] | None:
+    line = stdout.strip()
+    if not line:
+        raise RuntimeError(stderr.decode(errors="replace").strip() or "No output")
+    return json.loads(line)["result"]
+
+
+def _run_cold(job: dict[str, Any] | str, timeout_seconds: float) -> dict[str, Any] | None:
+    """Run one job in a fresh harness process; None if the job's process died."""
+    sandbox = tempfile.mkdtemp(prefix="hirewithai-run-", dir=SANDBOX_DIR)
+    try:
+        with runner_spawn_seconds.time(kind="cold"):
+            proc = subprocess.Popen(HARNESS_COMMAND, **_cold_process_args(sandbox))
+        try:
+            stdout, stderr = proc.communicate(_encode_job(job), timeout=timeout_seconds)
         except subprocess.TimeoutExpired:
-            return {"tests_passed": 0, "tests_total": len(test_cases), "results": [], "run_error": "Timeout"}
-        except Exception as e:
-            return {"tests_passed": 0, "tests_total": len(test_cases), "results": [], "run_error": str(e)}
+            _kill_cold(proc)
+            proc.communicate()
+            raise
+    finally:
+        shutil.rmtree(sandbox, ignore_errors=True)
+    return _cold_reply(stdout, stderr)
+
+
+async def _run_cold_async(job: dict[str, Any] | str, timeout_seconds: float) -> dict[str, Any] | None:
+    sandbox = tempfile.mkdtemp(prefix="hirewithai-run-", dir=SANDBOX_DIR)
+    try:
+        with runner_spawn_seconds.time(kind="cold"):
+            proc = await asyncio.create_subprocess_exec(*HARNESS_COMMAND, **_cold_process_args(sandbox))
+        try:
+            stdout, stderr = await asyncio.wait_for(proc.communicate(_encode_job(job)), timeout_seconds)
+        except asyncio.TimeoutError:
+            _kill_cold(proc)
+            await proc.wait()
+            raise
+    finally:
+        shutil.rmtree(sandbox, ignore_errors=True)
+    return _cold_reply(stdout, stderr)
+
+
+def _tests_result(total: int, data: dict[str, Any]) -> dict[str, Any]:
+    if data.get("error"):
+        return {"tests_passed": 0, "tests_total": total, "results": [], "run_error": data["error"]}
+    results = data.get("results", [])
+    passed = sum(1 for r in results if r.get("passed"))
+    return {"tests_passed": passed, "tests_total": total, "results": results, "run_error": None}
+
+
+def _tests_error(total: int, message: str) -> dict[str, Any]:
+    return {"tests_passed": 0, "tests_total": total, "results": [], "run_error": message}
+
+
+result_cache = LRUCache(CACHE_SIZE, CACHE_DIR) if CACHE_SIZE > 0 else None
+# Cached results are only valid for the harness that produced them.
+_HARNESS_VERSION = hashlib.sha256(WORKER_SCRIPT.encode()).hexdigest()[:12]
+
+
+def normalize_code(code: str) -> str:
+    """Code as far as execution is concerned: line endings and whitespace at
+    the end of the file don't change what it does."""
+    return code.replace("\r\n", "\n").rstrip()
+
+
+def _job_limits(timeout_seconds: int) -> dict[str, Any]:
+    return {
+        "budget": timeout_seconds,
+        "case_timeout": CASE_TIMEOUT_SECONDS,
+        "parallel": CASE_PARALLELISM,
+        "fail_fast": FAIL_FAST,
+        "memory_mb": MEMORY_LIMIT_MB,
+    }
+
+
+def _cache_key(mode: str, task_id: int, spec: TaskSpec | None, code: str) -> str:
+    limits = json.dumps(_job_limits(0), sort_keys=True)
+    version = spec.version if spec is not None else "-"
+    parts = [_HARNESS_VERSION, limits, mode, str(task_id), version, normalize_code(code)]
+    return hashlib.sha256("\0".join(parts).encode()).hexdigest()
+
+
+def _cached(mode: str, key: str) -> dict[str, Any] | None:
+    result = result_cache.get(key) if result_cache is not None else None
+    if result is not None:
+        runner_results.inc(mode=mode, outcome="cached")
+    return result
+
+
+def _timed_execution(mode: str):
+    return runner_execution_seconds.time(mode=mode, path="pool" if POOL_SIZE > 0 else "cold")
+
+
+def _remember(key: str, result: dict[str, Any]) -> dict[str, Any]:
+    if result_cache is not None:
+        result_cache.set(key, result)
+    return result
+
+
+def _remember_tests(key: str, total: int, data: dict[str, Any]) -> dict[str, Any]:
+    result = _tests_result(total, data)
+    # A case that ran out of time might pass on a quieter machine; don't pin that.
+    return result if data.get("incomplete") else _remember(key, result)
+
+
+def _tests_job(code: str, spec: TaskSpec, timeout_seconds: int) -> str:
+    # The registry keeps test cases as JSON text; splice it in rather than
+    # decoding and re-encoding it for every run.
+    return '{"mode": "tests", "code": %s, "entry_points": %s, "limits": %s, "test_cases": %s}' % (
+        json.dumps(code), json.dumps(spec.entry_points), json.dumps(_job_limits(timeout_seconds)), spec.cases_json,
+    )
+
+
+def _code_job(code: str, entry_points: tuple[str, ...], timeout_seconds: int) -> dict[str, Any]:
+    return {"mode": "run", "code": code, "entry_points": entry_points, "limits": _job_limits(timeout_seconds)}
+
+
+def _code_result(data: dict[str, Any] | None) -> dict[str, Any]:
+    if data is None:
+        # As for tests: the job's process died without answering.
+        raise RuntimeError("No output")
+    return {"stdout": data.get("stdout", ""), "stderr": data.get("stderr", ""), "run_error": None}
+
+
+def _execute_tests(code: str, spec: TaskSpec, timeout_seconds: int) -> dict[str, Any]:
+    job = _tests_job(code, spec, timeout_seconds)
+    pool = get_pool()
+    if pool is not None:
+        data = pool.execute(job, timeout_seconds + JOB_GRACE_SECONDS)
+    else:
+        data = _run_cold(job, timeout_seconds + JOB_GRACE_SECONDS)
+    if data is None:
+        # The job's process died without answering; treat it like a timeout.
+        raise RuntimeError("No output")
+    return data
+
+
+def _execute_code(code: str, entry_points: tuple[str, ...], timeout_seconds: int) -> dict[str, Any]:
+    job = _code_job(code, entry_points, timeout_seconds)
+    pool = get_pool()
+    if pool is not None:
+        return _code_result(pool.execute(job, timeout_seconds))
+    return _code_result(_run_cold(job, timeout_seconds))
+
+
+# Only results the harness produced are cached. Timeouts and sandbox failures
+# (including a job process that died without answering) say nothing about the
+# code, so they return early and the next run retries.
+
+def run_tests(task_id: int, code: str, timeout_seconds: int = 10) -> dict[str, Any]:
+    spec = task_registry.get(task_id)
+    if spec is None or not spec.case_count:
+        return _tests_error(0, "No test cases for this task")
+
+    key = _cache_key("tests", task_id, spec, code)
+    cached = _cached("tests", key)
+    if cached is not None:
+        return cached
+    try:
+        with _timed_execution("tests"):
+            data = _execute_tests(code, spec, timeout_seconds)
+    except (subprocess.TimeoutExpired, TimeoutError):
+        runner_results.inc(mode="tests", outcome="timeout")
+        return _tests_error(spec.case_count, "Timeout")
+    except Exception as e:
+        runner_results.inc(mode="tests", outcome="error")
+        return _tests_error(spec.case_count, str(e))
+    runner_results.inc(mode="tests", outcome="ok")
+    return _remember_tests(key, spec.case_count, data)
 
 
 def run_code(task_id: int, code: str, timeout_seconds: int = 10) -> dict[str, Any]:
-    with tempfile.TemporaryDirectory() as tmpdir:
-        solution_path = os.path.join(tmpdir, "solution.py")
-        runner_path = os.path.join(tmpdir, "run_code.py")
+    spec = task_registry.get(task_id)
+    key = _cache_key("run", task_id, spec, code)
+    cached = _cached("run", key)
+    if cached is not None:
+        return cached
+    try:
+        with _timed_execution("run"):
+            result = _execute_code(code, spec.entry_points if spec else (), timeout_seconds)
+    except (subprocess.TimeoutExpired, TimeoutError):
+        runner_results.inc(mode="run", outcome="timeout")
+        return {"stdout": "", "stderr": "", "run_error": "Timeout"}
+    except Exception as e:
+        runner_results.inc(mode="run", outcome="error")
+        return {"stdout": "", "stderr": "", "run_error": str(e)}
+    runner_results.inc(mode="run", outcome="ok")
+    return _remember(key, result)
+
+
+# Pool jobs block on a pipe read, so they get their own threads rather than
+# competing with request handlers for the server's threadpool.
+_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENCY, thread_name_prefix="runner")
+_slots: asyncio.Semaphore | None = None
+_waiting = 0
 
-        with open(solution_path, "w", encoding="utf-8") as f:
-            f.write(code)
-        with open(runner_path, "w", encoding="utf-8") as f:
-            f.write(RUN_CODE_SCRIPT)
 
+@asynccontextmanager
+async def _execution_slot():
+    global _slots, _waiting
+    if _slots is None:
+        _slots = asyncio.Semaphore(MAX_CONCURRENCY)
+    if _slots.locked() and _waiting >= MAX_QUEUED:
+        raise RunnerBusy("Code execution queue is full")
+    _waiting += 1
+    try:
+        await _slots.acquire()
+    finally:
+        _waiting -= 1
+    try:
+        yield
+    finally:
+        _slots.release()
+
+
+async def _execute_tests_async(code: str, spec: TaskSpec, timeout_seconds: int) -> dict[str, Any]:
+    if get_pool() is not None:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_executor, _execute_tests, code, spec, timeout_seconds)
+    data = await _run_cold_async(_tests_job(code, spec, timeout_seconds), timeout_seconds + JOB_GRACE_SECONDS)
+    if data is None:
+        raise RuntimeError("No output")
+    return data
+
+
+async def _execute_code_async(code: str, entry_points: tuple[str, ...], timeout_seconds: int) -> dict[str, Any]:
+    if get_pool() is not None:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_executor, _execute_code, code, entry_points, timeout_seconds)
+    return _code_result(await _run_cold_async(_code_job(code, entry_points, timeout_seconds), timeout_seconds))
+
+
+async def run_tests_async(task_id: int, code: str, timeout_seconds: int = 10) -> dict[str, Any]:
+    """Async counterpart of run_tests; raises RunnerBusy when the queue is full.
+
+    Cache hits return straight away without waiting for an execution slot.
+    """
+    spec = task_registry.get(task_id)
+    if spec is None or not spec.case_count:
+        return _tests_error(0, "No test cases for this task")
+
+    key = _cache_key("tests", task_id, spec, code)
+    cached = _cached("tests", key)
+    if cached is not None:
+        return cached
+    async with _execution_slot():
         try:
-            result = subprocess.run(
-                ["python", "run_code.py"],
-                cwd=tmpdir,
-                capture_output=True,
-                text=True,
-                timeout=timeout_seconds,
-            )
-            return {"stdout": result.stdout, "stderr": result.stderr, "run_error": None}
-        except subprocess.TimeoutExpired:
+            with _timed_execution("tests"):
+                data = await _execute_tests_async(code, spec, timeout_seconds)
+        except (asyncio.TimeoutError, TimeoutError):
+            runner_results.inc(mode="tests", outcome="timeout")
+            return _tests_error(spec.case_count, "Timeout")
+        except Exception as e:
+            runner_results.inc(mode="tests", outcome="error")
+            return _tests_error(spec.case_count, str(e))
+    runner_results.inc(mode="tests", outcome="ok")
+    return _remember_tests(key, spec.case_count, data)
+
+
+async def run_code_async(task_id: int, code: str, timeout_seconds: int = 10) -> dict[str, Any]:
+    """Async counterpart of run_code; raises RunnerBusy when the queue is full.
+
+    Cache hits return straight away without waiting for an execution slot.
+    """
+    spec = task_registry.get(task_id)
+    key = _cache_key("run", task_id, spec, code)
+    cached = _cached("run", key)
+    if cached is not None:
+        return cached
+    async with _execution_slot():
+        try:
+            with _timed_execution("run"):
+                result = await _execute_code_async(code, spec.entry_points if spec else (), timeout_seconds)
+        except (asyncio.TimeoutError, TimeoutError):
+            runner_results.inc(mode="run", outcome="timeout")
             return {"stdout": "", "stderr": "", "run_error": "Timeout"}
         except Exception as e:
+            runner_results.inc(mode="run", outcome="error")
             return {"stdout": "", "stderr": "", "run_error": str(e)}
+    runner_results.inc(mode="run", outcome="ok")
+    return _remember(key, result)
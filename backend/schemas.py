@@ -1,6 +1,10 @@
-from pydantic import BaseModel
+import math
+
+from pydantic import BaseModel, Field, field_validator
 from typing import Optional, Any
 
+from event_schema import INT_MAX, INT_MIN, NUMERIC_FIELDS, column_int
+
 
 class LoginRequest(BaseModel):
     email: str
@@ -16,13 +20,65 @@ class LoginResponse(BaseModel):
     candidate_id: int | None = None
     email: str
     role: str
+    token: str | None = None
+
+
+class TaskTestCase(BaseModel):
+    args: list[Any]
+    expected: Any
+
+
+class TaskRequest(BaseModel):
+    title: str
+    description: str
+    expected_time: int
+    entry_points: list[str]
+    test_cases: list[TaskTestCase]
 
 
 class EventRequest(BaseModel):
-    candidate_id: int
-    task_id: int
-    event_type: str
+    candidate_id: int = Field(ge=1, le=INT_MAX)
+    task_id: int = Field(ge=1, le=INT_MAX)
+    event_type: str = Field(min_length=1, max_length=64)
     metadata: Optional[dict[str, Any]] = None
+    # Milliseconds between the event happening and the request being sent,
+    # so batched events keep their real (server-clock) timestamps.
+    age_ms: Optional[int] = Field(None, le=10**12)
+
+    @field_validator("event_type")
+    @classmethod
+    def _not_rollup(cls, value: str) -> str:
+        if value == "code_edit_rollup":
+            raise ValueError("code_edit_rollup events are only written by compaction")
+        return value
+
+    @field_validator("metadata")
+    @classmethod
+    def _numeric_fields_fit(cls, value: Optional[dict[str, Any]]) -> Optional[dict[str, Any]]:
+        for field in NUMERIC_FIELDS:
+            number = (value or {}).get(field)
+            if not isinstance(number, (int, float)) or isinstance(number, bool) or column_int(number) is not None:
+                continue
+            if isinstance(number, float) and not math.isfinite(number):
+                # NaN and infinity can't be echoed back in a JSON error, and
+                # carry no information anyway.
+                value = {k: v for k, v in value.items() if k != field}
+            elif not INT_MIN <= number <= INT_MAX:
+                raise ValueError(f"{field} must fit a 32-bit integer")
+            # Fractions are kept in metadata_ as sent.
+        return value
+
+
+class EventBatchRequest(BaseModel):
+    # Each shaped as an EventRequest; they are validated one by one, so an
+    # invalid event is rejected on its own instead of failing the batch.
+    events: list[Any]
+
+
+class EventStreamFrame(BaseModel):
+    """One message on the /ws/events socket; acknowledged with the same seq."""
+    seq: int
+    events: list[Any]
 
 
 class SubmitRequest(BaseModel):
@@ -32,10 +88,14 @@ class SubmitRequest(BaseModel):
     reflection: Optional[str] = None
 
 
-class SubmitResponse(BaseModel):
+class GradingJobResponse(BaseModel):
+    job_id: int
     submission_id: int
-    tests_passed: int
-    tests_total: int
+    # queued, running, done or failed; the test fields are set once done.
+    status: str
+    attempts: int = 0
+    tests_passed: Optional[int] = None
+    tests_total: Optional[int] = None
     run_error: Optional[str] = None
     results: list[dict[str, Any]] = []
 
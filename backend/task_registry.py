@@ -0,0 +1,160 @@
+"""In-memory registry of the tasks: the public catalog, and each task's test
+cases and entry points.
+
+Both are loaded from the database on first use. The task endpoints call
+invalidate() whenever a task changes; other processes (more API workers,
+`manage.py grading-worker`) notice within TASK_REVALIDATE_SECONDS, after which
+a spec is checked against the task's test_cases_version (one scalar query) and
+the catalog is reloaded. Unknown tasks are not remembered. Test cases are
+held as JSON text, so they can be spliced into sandbox jobs without being
+re-encoded on every run; the catalog keeps its response bodies pre-serialized
+along with their ETags.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import NamedTuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import Task
+
+
+class TaskSpec(NamedTuple):
+    task_id: int
+    entry_points: tuple[str, ...]
+    cases_json: str
+    case_count: int
+    # Changes whenever the test cases or entry points do; part of result cache keys.
+    version: str
+
+    @property
+    def test_cases(self) -> list:
+        return json.loads(self.cases_json)
+
+
+class CatalogEntry(NamedTuple):
+    task: dict
+    body: bytes
+    etag: str
+
+
+class Catalog(NamedTuple):
+    tasks: list[dict]
+    body: bytes
+    etag: str
+    by_id: dict[int, CatalogEntry]
+
+
+# How long a process trusts what it loaded before looking for changes made
+# through another process.
+REVALIDATE_SECONDS = float(os.getenv("TASK_REVALIDATE_SECONDS", "5"))
+
+# task id -> (spec, the test_cases_version it was loaded at, when last checked)
+_specs: dict[int, tuple[TaskSpec, int, float]] = {}
+_catalog: Catalog | None = None
+_catalog_loaded_at = 0.0
+_generation = 0
+_lock = threading.Lock()
+
+
+def parse_entry_points(value: str | None) -> tuple[str, ...]:
+    return tuple(name.strip() for name in (value or "").split(",") if name.strip())
+
+
+def _load(task_id: int) -> tuple[TaskSpec, int] | None:
+    db = SessionLocal()
+    try:
+        task = db.get(Task, task_id)
+    finally:
+        db.close()
+    if task is None or not task.test_cases:
+        return None
+    cases = json.loads(task.test_cases)
+    cases_json = json.dumps(cases, separators=(",", ":"))
+    entry_points = parse_entry_points(task.entry_points)
+    digest = hashlib.sha256(f"{cases_json}\0{','.join(entry_points)}".encode()).hexdigest()[:12]
+    spec = TaskSpec(task_id, entry_points, cases_json, len(cases), f"{task.test_cases_version}-{digest}")
+    return spec, task.test_cases_version
+
+
+def _current_version(task_id: int) -> int | None:
+    db = SessionLocal()
+    try:
+        return db.scalar(select(Task.test_cases_version).where(Task.id == task_id))
+    finally:
+        db.close()
+
+
+def get(task_id: int) -> TaskSpec | None:
+    """The task's spec, or None if it doesn't exist or has no test cases."""
+    now = time.monotonic()
+    with _lock:
+        cached = _specs.get(task_id)
+        generation = _generation
+    if cached is not None:
+        spec, version, checked_at = cached
+        if now - checked_at < REVALIDATE_SECONDS:
+            return spec
+        # The test cases only change together with their version.
+        if _current_version(task_id) == version:
+            with _lock:
+                if generation == _generation:
+                    _specs[task_id] = (spec, version, now)
+            return spec
+    loaded = _load(task_id)
+    with _lock:
+        # Don't keep a spec loaded before an invalidate() that raced with us.
+        if generation == _generation:
+            if loaded is None:
+                _specs.pop(task_id, None)
+            else:
+                _specs[task_id] = (*loaded, now)
+    return loaded[0] if loaded is not None else None
+
+
+def _serialize(value) -> tuple[bytes, str]:
+    # Same separators as FastAPI's JSON responses.
+    body = json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode()
+    return body, f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+
+
+def _load_catalog(db: Session) -> Catalog:
+    tasks = [
+        {"id": t.id, "title": t.title, "description": t.description, "expected_time": t.expected_time}
+        for t in db.query(Task.id, Task.title, Task.description, Task.expected_time).order_by(Task.id)
+    ]
+    by_id = {task["id"]: CatalogEntry(task, *_serialize(task)) for task in tasks}
+    return Catalog(tasks, *_serialize(tasks), by_id)
+
+
+def catalog(db: Session) -> Catalog:
+    """Public fields of every task, read through ``db`` on a cache miss."""
+    global _catalog, _catalog_loaded_at
+    now = time.monotonic()
+    with _lock:
+        if _catalog is not None and now - _catalog_loaded_at < REVALIDATE_SECONDS:
+            return _catalog
+        generation = _generation
+    loaded = _load_catalog(db)
+    with _lock:
+        if generation == _generation:
+            _catalog, _catalog_loaded_at = loaded, now
+    return loaded
+
+
+def invalidate(task_id: int | None = None):
+    """Forget one task (or all of them) so the next run reloads it. The
+    catalog is always reloaded."""
+    global _generation, _catalog
+    with _lock:
+        _generation += 1
+        _catalog = None
+        if task_id is None:
+            _specs.clear()
+        else:
+            _specs.pop(task_id, None)
@@ -0,0 +1,14 @@
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# Importing the app opens DATABASE_URL and reads the session secret; keep
+# both away from a developer's own files.
+_scratch = tempfile.mkdtemp(prefix="hirewithai-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_scratch, 'test.db')}")
+os.environ.setdefault("SESSION_SECRET", "test-secret")
+os.environ.setdefault("AUTH_HASH_WORKERS", "0")
+os.environ.setdefault("GRADING_WORKERS", "0")
@@ -0,0 +1,7 @@
+from query_plans import check_query_plans
+
+
+def test_endpoint_queries_use_indexes():
+    problems = check_query_plans()
+    assert problems == [], "\n".join(f"{endpoint}: {' '.join(statement.split())}\n  {plan}"
+                                     for endpoint, statement, plan in problems)
@@ -0,0 +1,150 @@
+"""Pool of pre-spawned sandbox worker processes.
+
+Each worker is a long-lived interpreter running a harness script that reads one
+JSON job per line on stdin and answers with one JSON line on stdout. Workers are
+recycled after a fixed number of jobs, and killed and replaced when a job
+overruns its timeout.
+"""
+import json
+import os
+import queue
+import shutil
+import signal
+import subprocess
+import tempfile
+import threading
+from typing import Any
+
+from instrumentation import runner_spawn_seconds
+
+
+class WorkerDied(RuntimeError):
+    pass
+
+
+class _Worker:
+    def __init__(self, command: list[str], sandbox_dir: str | None = None):
+        # The harness gives each job a directory of its own inside this one and
+        # removes it afterwards; whatever a killed job leaves goes with the worker.
+        self.sandbox = tempfile.mkdtemp(prefix="hirewithai-worker-", dir=sandbox_dir)
+        self.proc = subprocess.Popen(
+            command,
+            cwd=self.sandbox,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            start_new_session=os.name == "posix",
+        )
+        self.jobs = 0
+        self.replies: queue.Queue = queue.Queue()
+        threading.Thread(target=self._read_replies, daemon=True).start()
+
+    def _read_replies(self):
+        for line in self.proc.stdout:
+            self.replies.put(line)
+        self.replies.put(None)
+
+    def alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def request(self, job: dict[str, Any] | str, timeout: float) -> dict[str, Any]:
+        line = job if isinstance(job, str) else json.dumps(job)
+        try:
+            self.proc.stdin.write(line.encode() + b"\n")
+            self.proc.stdin.flush()
+        except (BrokenPipeError, OSError):
+            raise WorkerDied("Sandbox worker exited unexpectedly")
+        line = self.replies.get(timeout=timeout)
+        if line is None:
+            raise WorkerDied("Sandbox worker exited unexpectedly")
+        self.jobs += 1
+        return json.loads(line)
+
+    def kill(self):
+        if self.alive():
+            try:
+                if os.name == "posix":
+                    # The worker forks a child per job; take the whole group down.
+                    os.killpg(self.proc.pid, signal.SIGKILL)
+                else:
+                    self.proc.kill()
+            except (ProcessLookupError, PermissionError):
+                pass
+        self.proc.wait()
+        for stream in (self.proc.stdin, self.proc.stdout):
+            try:
+                stream.close()
+            except OSError:
+                pass
+        shutil.rmtree(self.sandbox, ignore_errors=True)
+
+
+class WorkerPool:
+    def __init__(self, command: list[str], size: int = 4, max_jobs: int = 100, sandbox_dir: str | None = None):
+        self.command = command
+        self.sandbox_dir = sandbox_dir
+        self.size = size
+        self.max_jobs = max_jobs
+        self._idle: queue.Queue = queue.Queue()
+        self._workers: set[_Worker] = set()
+        self._lock = threading.Lock()
+        self._closed = False
+        for _ in range(size):
+            self._idle.put(self._spawn())
+
+    def _spawn(self) -> _Worker:
+        with runner_spawn_seconds.time(kind="pool_worker"):
+            worker = _Worker(self.command, self.sandbox_dir)
+        with self._lock:
+            self._workers.add(worker)
+        return worker
+
+    def _retire(self, worker: _Worker):
+        with self._lock:
+            self._workers.discard(worker)
+        worker.kill()
+
+    def _release(self, worker: _Worker):
+        if self._closed:
+            self._retire(worker)
+            return
+        if worker.jobs >= self.max_jobs or not worker.alive():
+            self._retire(worker)
+            worker = self._spawn()
+        self._idle.put(worker)
+
+    def execute(self, job: dict[str, Any] | str, timeout: float) -> dict[str, Any] | None:
+        """Run a job on an idle worker, returning the harness result.
+
+        ``job`` is a dict, or the same already encoded as a single line of JSON.
+
+        Raises TimeoutError if no reply arrives within ``timeout`` seconds; the
+        worker is killed and replaced so a runaway job cannot leak into the next.
+        """
+        if self._closed:
+            raise RuntimeError("Worker pool is shut down")
+        worker = self._idle.get()
+        if not worker.alive():
+            self._retire(worker)
+            worker = self._spawn()
+        try:
+            reply = worker.request(job, timeout)
+        except queue.Empty:
+            self._retire(worker)
+            self._release(self._spawn())
+            raise TimeoutError("Timeout")
+        except Exception:
+            self._retire(worker)
+            self._release(self._spawn())
+            raise
+        if reply.get("recycle"):
+            worker.jobs = self.max_jobs
+        self._release(worker)
+        return reply.get("result")
+
+    def shutdown(self):
+        self._closed = True
+        with self._lock:
+            workers = list(self._workers)
+        for worker in workers:
+            self._retire(worker)
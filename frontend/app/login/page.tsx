@@ -24,7 +24,7 @@ export default function LoginPage() {
     setLoading(true);
     try {
       const res = await login(email.trim(), password);
-      setCandidate({ candidate_id: res.candidate_id!, email: res.email });
+      setCandidate({ candidate_id: res.candidate_id!, email: res.email, token: res.token });
       window.location.href = "/dashboard";
     } catch (e) {
       setError(e instanceof Error ? e.message : "Login failed");
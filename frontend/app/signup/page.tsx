@@ -20,7 +20,7 @@ export default function SignupPage() {
     setLoading(true);
     try {
       const res = await signup(email.trim(), password);
-      setCandidate({ candidate_id: res.candidate_id!, email: res.email });
+      setCandidate({ candidate_id: res.candidate_id!, email: res.email, token: res.token });
       window.location.href = "/dashboard";
     } catch (e) {
       setError(e instanceof Error ? e.message : "Sign up failed");
@@ -4,7 +4,7 @@ import { useParams } from "next/navigation";
 import dynamic from "next/dynamic";
 import Link from "next/link";
 import { getUser } from "@/lib/storage";
-import { getTask, logEvent, runCode, aiChat, type Task } from "@/lib/api";
+import { getTask, logEvent, flushEvents, runCode, aiChatStream, AiChatError, type Task } from "@/lib/api";
 
 const MonacoEditor = dynamic(() => import("@monaco-editor/react"), { 
   ssr: false, 
@@ -75,13 +75,21 @@ export default function TaskWorkspacePage() {
       
       if (document.hidden) {
         logEvent(candidateRef.current.candidate_id, taskId, "tab_hidden");
+        // The page may be frozen or closed while hidden, so send telemetry now
+        flushEvents(true);
       } else {
         logEvent(candidateRef.current.candidate_id, taskId, "tab_visible");
       }
     };
+    const handlePageHide = () => { flushEvents(true); };
 
     document.addEventListener("visibilitychange", handleVisibilityChange);
-    return () => document.removeEventListener("visibilitychange", handleVisibilityChange);
+    window.addEventListener("pagehide", handlePageHide);
+    return () => {
+      document.removeEventListener("visibilitychange", handleVisibilityChange);
+      window.removeEventListener("pagehide", handlePageHide);
+      flushEvents();
+    };
   }, [taskId]);
 
   const handleEditorChange = useCallback((value: string | undefined) => {
@@ -132,11 +140,16 @@ export default function TaskWorkspacePage() {
     if (candidateRef.current) {
       logEvent(candidateRef.current.candidate_id, taskId, "ai_used", { prompt: userPrompt });
     }
+    let reply = "";
     try {
-      const res = await aiChat(task.title, task.description, newMessages, code);
-      setMessages([...newMessages, { role: "assistant", content: res.error ? `Error: ${res.error}` : res.content }]);
-    } catch {
-      setMessages([...newMessages, { role: "assistant", content: "Failed to get AI response. Please try again." }]);
+      await aiChatStream(task.title, task.description, newMessages, code, (chunk) => {
+        reply += chunk;
+        setMessages([...newMessages, { role: "assistant", content: reply }]);
+      });
+      if (!reply) setMessages([...newMessages, { role: "assistant", content: "" }]);
+    } catch (e) {
+      const content = e instanceof AiChatError ? `Error: ${e.message}` : "Failed to get AI response. Please try again.";
+      setMessages([...newMessages, { role: "assistant", content: reply ? `${reply}\n\n${content}` : content }]);
     } finally {
       setAiLoading(false);
     }
@@ -395,7 +408,7 @@ export default function TaskWorkspacePage() {
                     {m.content}
                   </div>
                 ))}
-                {aiLoading && (
+                {aiLoading && messages[messages.length - 1]?.role !== "assistant" && (
                   <div style={{ 
                     padding: "var(--space-3) var(--space-4)", 
                     borderRadius: "var(--radius-lg)", 
@@ -1,6 +1,6 @@
 const API = "/api";
 
-export type AuthResponse = { candidate_id: number | null; email: string; role: "candidate" | "recruiter" };
+export type AuthResponse = { candidate_id: number | null; email: string; role: "candidate" | "recruiter"; token?: string | null };
 export type Task = { id: number; title: string; description: string; expected_time: number; submitted?: boolean; tests_passed?: number | null; tests_total?: number | null };
 
 export async function signup(email: string, password: string): Promise<AuthResponse> {
@@ -31,58 +31,187 @@ export async function login(email: string, password: string): Promise<AuthRespon
 
 export async function getTasks(candidateId?: number): Promise<Task[]> {
   const url = candidateId != null ? `${API}/tasks?candidate_id=${candidateId}` : `${API}/tasks`;
-  const res = await fetch(url, { cache: "no-store" });
+  // Revalidate with the server's ETag on every load; unchanged lists come back as 304s.
+  const res = await fetch(url, { cache: "no-cache" });
   if (!res.ok) throw new Error("Failed to fetch tasks");
   return res.json();
 }
 
 export async function getTask(taskId: number): Promise<Task> {
-  const res = await fetch(`${API}/tasks/${taskId}`);
+  const res = await fetch(`${API}/tasks/${taskId}`, { cache: "no-cache" });
   if (!res.ok) throw new Error("Failed to fetch task");
   return res.json();
 }
 
-export async function logEvent(candidateId: number, taskId: number, eventType: string, metadata?: Record<string, unknown>) {
-  await fetch(`${API}/events`, {
-    method: "POST",
-    headers: { "Content-Type": "application/json" },
-    body: JSON.stringify({ candidate_id: candidateId, task_id: taskId, event_type: eventType, metadata }),
-  });
+type QueuedEvent = { candidate_id: number; task_id: number; event_type: string; metadata?: Record<string, unknown>; at: number };
+
+const EVENT_FLUSH_INTERVAL_MS = 2000;
+// Frames on an open socket are cheap, so events go out sooner.
+const EVENT_SOCKET_FLUSH_INTERVAL_MS = 250;
+const EVENT_SOCKET_RETRY_MS = 5000;
+const EVENT_BATCH_MAX = 100;
+let eventQueue: QueuedEvent[] = [];
+let flushTimer: ReturnType<typeof setTimeout> | null = null;
+
+// Telemetry goes over one WebSocket (/ws/events) while it is open, and over
+// POST /events/batch otherwise. Frames stay in `unacked` until the server
+// acknowledges them; if the socket drops they are queued again for HTTP.
+let eventSocket: WebSocket | null = null;
+let eventSocketOpen = false;
+let eventSocketRetryAt = 0;
+let nextFrameSeq = 1;
+const unacked = new Map<number, QueuedEvent[]>();
+
+function eventSocketUrl() {
+  return process.env.NEXT_PUBLIC_EVENTS_WS_URL
+    || `${window.location.protocol === "https:" ? "wss" : "ws"}://${window.location.host}${API}/ws/events`;
 }
 
-export async function submit(candidateId: number, taskId: number, finalCode: string, reflection: string) {
-  const res = await fetch(`${API}/submit`, {
-    method: "POST",
-    headers: { "Content-Type": "application/json" },
-    body: JSON.stringify({ candidate_id: candidateId, task_id: taskId, final_code: finalCode, reflection }),
-  });
+function openEventSocket() {
+  if (eventSocket || typeof WebSocket === "undefined" || Date.now() < eventSocketRetryAt) return;
+  const socket = new WebSocket(eventSocketUrl());
+  eventSocket = socket;
+  socket.onopen = () => {
+    eventSocketOpen = true;
+    if (eventQueue.length) void flushEvents();
+  };
+  socket.onmessage = (message) => {
+    // Every valid event of the frame is stored by the time it is acknowledged.
+    // Invalid events (listed in `rejected`) and unreadable frames are
+    // acknowledged too; resending them wouldn't help.
+    const { ack } = JSON.parse(message.data);
+    unacked.delete(ack);
+  };
+  socket.onclose = () => {
+    eventSocket = null;
+    eventSocketOpen = false;
+    eventSocketRetryAt = Date.now() + EVENT_SOCKET_RETRY_MS;
+    const pending = Array.from(unacked.values()).flat();
+    unacked.clear();
+    if (pending.length) {
+      eventQueue = pending.concat(eventQueue);
+      void flushEvents();
+    }
+  };
+}
+
+export function logEvent(candidateId: number, taskId: number, eventType: string, metadata?: Record<string, unknown>) {
+  openEventSocket();
+  eventQueue.push({ candidate_id: candidateId, task_id: taskId, event_type: eventType, metadata, at: Date.now() });
+  if (eventQueue.length >= EVENT_BATCH_MAX) {
+    void flushEvents();
+  } else if (!flushTimer) {
+    const interval = eventSocketOpen ? EVENT_SOCKET_FLUSH_INTERVAL_MS : EVENT_FLUSH_INTERVAL_MS;
+    flushTimer = setTimeout(() => { flushTimer = null; void flushEvents(); }, interval);
+  }
+}
+
+// Send queued telemetry, EVENT_BATCH_MAX events per frame or request. Use
+// keepalive when the page may be going away; that always goes over HTTP,
+// which outlives the page.
+export async function flushEvents(keepalive = false) {
+  if (flushTimer) { clearTimeout(flushTimer); flushTimer = null; }
+  while (eventQueue.length) {
+    const batch = eventQueue.splice(0, EVENT_BATCH_MAX);
+    if (!(await sendEvents(batch, keepalive))) break;
+  }
+}
+
+// False if the batch couldn't be delivered and went back on the queue.
+async function sendEvents(batch: QueuedEvent[], keepalive: boolean): Promise<boolean> {
+  const now = Date.now();
+  const events = batch.map(({ at, ...e }) => ({ ...e, age_ms: now - at }));
+  if (eventSocket && eventSocketOpen && !keepalive) {
+    const seq = nextFrameSeq++;
+    unacked.set(seq, batch);
+    eventSocket.send(JSON.stringify({ seq, events }));
+    return true;
+  }
+  try {
+    const res = await fetch(`${API}/events/batch`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ events }),
+      keepalive,
+    });
+    if (res.status >= 500) throw new Error("Event ingestion failed");
+    // The server stores every valid event and skips only the ones it lists
+    // in `rejected`, so nothing is resent after a 200.
+    return true;
+  } catch {
+    // Keep the original timestamps and retry with the next flush
+    eventQueue = batch.concat(eventQueue);
+    return false;
+  }
+}
+
+export type GradingJob = {
+  job_id: number;
+  submission_id: number;
+  status: "queued" | "running" | "done" | "failed";
+  attempts: number;
+  tests_passed: number | null;
+  tests_total: number | null;
+  run_error: string | null;
+  results: { input: unknown; expected: unknown; actual: unknown; passed: boolean }[];
+};
+
+const SUBMIT_RETRIES = 3;
+const GRADING_POLL_MS = 1000;
+
+async function postSubmission(body: Record<string, unknown>, key: string): Promise<Response> {
+  for (let attempt = 1; ; attempt++) {
+    try {
+      return await fetch(`${API}/submit`, {
+        method: "POST",
+        headers: { "Content-Type": "application/json", "Idempotency-Key": key },
+        body: JSON.stringify(body),
+      });
+    } catch (e) {
+      if (attempt >= SUBMIT_RETRIES) throw e;
+    }
+  }
+}
+
+// Queue the submission for grading, then poll the job until it finishes. The
+// Idempotency-Key makes retried POSTs return the original job instead of a new one.
+async function submitAndWait(body: Record<string, unknown>): Promise<GradingJob> {
+  await flushEvents();
+  const res = await postSubmission(body, crypto.randomUUID());
   if (!res.ok) throw new Error("Submit failed");
-  return res.json();
+  let job: GradingJob = await res.json();
+  while (job.status === "queued" || job.status === "running") {
+    await new Promise((resolve) => setTimeout(resolve, GRADING_POLL_MS));
+    const poll = await fetch(`${API}/grading/jobs/${job.job_id}`, { cache: "no-store" }).catch(() => null);
+    if (poll?.ok) job = await poll.json();
+  }
+  if (job.status === "failed") throw new Error(job.run_error || "Grading failed, please submit again");
+  return job;
+}
+
+export async function submit(candidateId: number, taskId: number, finalCode: string, reflection: string) {
+  return submitAndWait({ candidate_id: candidateId, task_id: taskId, final_code: finalCode, reflection });
 }
 
 export async function submitCode(candidateId: number, taskId: number, code: string): Promise<{ passed: number; total: number; details: string }> {
-  const res = await fetch(`${API}/submit`, {
-    method: "POST",
-    headers: { "Content-Type": "application/json" },
-    body: JSON.stringify({ candidate_id: candidateId, task_id: taskId, final_code: code, reflection: "" }),
-  });
-  if (!res.ok) throw new Error("Submit failed");
-  const data = await res.json();
+  const data = await submitAndWait({ candidate_id: candidateId, task_id: taskId, final_code: code, reflection: "" });
   // Transform response to match frontend expectations
   const details = data.run_error 
     ? `Error: ${data.run_error}` 
-    : data.results?.map((r: { input: unknown; expected: unknown; actual: unknown; passed: boolean }) => 
+    : data.results?.map((r) => 
         `Input: ${JSON.stringify(r.input)} → ${r.passed ? '✓' : '✗'} ${r.passed ? '' : `Expected: ${JSON.stringify(r.expected)}, Got: ${JSON.stringify(r.actual)}`}`
       ).join('\n') || '';
-  return { passed: data.tests_passed, total: data.tests_total, details };
+  return { passed: data.tests_passed ?? 0, total: data.tests_total ?? 0, details };
 }
 
 export async function runCode(candidateId: number, taskId: number, code: string) {
+  await flushEvents();
   const res = await fetch(`${API}/run`, {
     method: "POST",
     headers: { "Content-Type": "application/json" },
     body: JSON.stringify({ candidate_id: candidateId, task_id: taskId, code }),
   });
+  if (res.status === 429) throw new Error("Too many runs in progress, please try again in a moment");
   if (!res.ok) throw new Error("Run failed");
   return res.json();
 }
@@ -93,8 +222,21 @@ export async function getEmployerView(candidateId: number, taskId: number) {
   return res.json();
 }
 
-export async function getRecruiterCandidates() {
-  const res = await fetch(`${API}/recruiter/candidates`, { cache: "no-store" });
+export type CandidateQuery = {
+  task_id?: number;
+  submitted?: boolean;
+  email?: string;
+  sort?: "candidate" | "email" | "task" | "first_activity" | "last_activity" | "edits" | "runs" | "ai_usage" | "pastes";
+  order?: "asc" | "desc";
+  limit?: number;
+  offset?: number;
+};
+
+export async function getRecruiterCandidates(query: CandidateQuery = {}) {
+  const params = new URLSearchParams();
+  Object.entries(query).forEach(([k, v]) => { if (v !== undefined) params.set(k, String(v)); });
+  const qs = params.toString();
+  const res = await fetch(`${API}/recruiter/candidates${qs ? `?${qs}` : ""}`, { cache: "no-store" });
   if (!res.ok) throw new Error("Failed to load candidates");
   return res.json();
 }
@@ -111,3 +253,39 @@ export async function aiChat(taskTitle: string, taskDescription: string, message
   if (!res.ok) throw new Error("AI chat failed");
   return res.json();
 }
+
+/** Error reported by the AI provider, as opposed to a failed request. */
+export class AiChatError extends Error {}
+
+/** Streams the assistant's reply, calling onChunk with each piece as it arrives. */
+export async function aiChatStream(
+  taskTitle: string,
+  taskDescription: string,
+  messages: { role: string; content: string }[],
+  currentCode: string | undefined,
+  onChunk: (text: string) => void,
+) {
+  const res = await fetch(`${API}/ai/chat/stream`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ task_title: taskTitle, task_description: taskDescription, messages, current_code: currentCode }),
+  });
+  if (!res.ok || !res.body) throw new Error("AI chat failed");
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  for (;;) {
+    const { done, value } = await reader.read();
+    if (done) return;
+    buffer += decoder.decode(value, { stream: true });
+    const frames = buffer.split("\n\n");
+    buffer = frames.pop() ?? "";
+    for (const frame of frames) {
+      const data = frame.replace(/^data: ?/, "");
+      if (data === "[DONE]") return;
+      const msg = JSON.parse(data);
+      if (msg.error) throw new AiChatError(msg.error);
+      if (msg.content) onChunk(msg.content);
+    }
+  }
+}
@@ -1,6 +1,6 @@
 const USER_KEY = "hirewithai_user";
 
-export type StoredUser = { role: "candidate"; candidate_id: number; email: string } | { role: "recruiter" };
+export type StoredUser = { role: "candidate"; candidate_id: number; email: string; token?: string } | { role: "recruiter" };
 
 export function getUser(): StoredUser | null {
   if (typeof window === "undefined") return null;
@@ -16,12 +16,12 @@ export function getUser(): StoredUser | null {
 
 export function getCandidate() {
   const u = getUser();
-  return u?.role === "candidate" ? { candidate_id: u.candidate_id, email: u.email } : null;
+  return u?.role === "candidate" ? { candidate_id: u.candidate_id, email: u.email, token: u.token } : null;
 }
 
-export function setCandidate(c: { candidate_id: number; email: string }) {
+export function setCandidate(c: { candidate_id: number; email: string; token?: string | null }) {
   if (typeof window === "undefined") return;
-  localStorage.setItem(USER_KEY, JSON.stringify({ role: "candidate", ...c }));
+  localStorage.setItem(USER_KEY, JSON.stringify({ role: "candidate", candidate_id: c.candidate_id, email: c.email, token: c.token ?? undefined }));
 }
 
 export function setRecruiter() {